@@ -18,21 +18,37 @@
 #           file_name
 #           database_name
 #           sql
+#           latitude_column
+#           longitude_column
+#           coordinate_scale
+#           partition_cell_size
 #
 #       Class Methods:
 #
 #           __init__(self, file_name, database_name, sql)
-#           get_data(self, use_cache = True, cache_data = True)
-#           _load_data(self, use_cache = True, cache_data = True)
+#           get_data(self, use_cache = True, cache_data = True, bbox = None, polygon = None)
+#           _load_data(self, use_cache = True, cache_data = True, bbox = None, polygon = None)
 #           _pre_preparation(self, df)
+#           _partition_directory(self)
+#           _partitions_current(self)
+#           _partition_keys(self, df)
+#           _write_partitions(self, df)
+#           _read_partitions(self, bbox, polygon)
+#           _filter_region(self, df, bbox, polygon)
+#
+#       Functions:
+#
+#           points_in_polygon(latitude, longitude, polygon)
 #
 #
 ################################################################################
 
 import os
+import shutil
+import numpy as np
 import pandas as pd
 
-from get_db_url import get_db_url
+from instrument import instrumented
 
 ################################################################################
 
@@ -40,6 +56,10 @@ class Acquire:
     '''
         A data acquisition class that can be used for acquiring data and cacheing it in 
         a csv file.
+
+        If partition_cell_size is set the cache is also written as a directory of 
+        csv files, one per latitude/longitude grid cell, so that a region of the 
+        data can be loaded by reading only the cells that intersect it.
         
         Instance Methods
         ----------------
@@ -49,6 +69,12 @@ class Acquire:
         _pre_preparation: Return DataFrame
     '''
 
+    # Spatial partitioning is disabled unless a child class sets these fields.
+    latitude_column = None
+    longitude_column = None
+    coordinate_scale = 1
+    partition_cell_size = None
+
     ################################################################################
 
     def __init__(self, file_name: str = '', database_name: str = '', sql: str = '') -> None:
@@ -71,7 +97,14 @@ class Acquire:
 
     ################################################################################
 
-    def get_data(self, use_cache: bool = True, cache_data: bool = True) -> pd.DataFrame:
+    @instrumented
+    def get_data(
+        self,
+        use_cache: bool = True,
+        cache_data: bool = True,
+        bbox: tuple[float] = None,
+        polygon: list[tuple[float]] = None
+    ) -> pd.DataFrame:
         '''
             Acquire the data from either the database or csv file and perform 
             any pre preparation transformations that are defined.
@@ -87,17 +120,32 @@ class Acquire:
             cache_data: bool, default True
                 If True the dataset will be cached in a csv file.
 
+            bbox: tuple[float], default None
+                A bounding box (min_latitude, min_longitude, max_latitude, 
+                max_longitude) in degrees. If provided only rows inside the 
+                box are returned.
+
+            polygon: list[tuple[float]], default None
+                A list of (latitude, longitude) vertices in degrees. If 
+                provided only rows inside the polygon are returned.
+
             Returns
             -------
             DataFrame: A Pandas DataFrame containing data from the source provided.
         '''
 
-        df = self._load_data(use_cache, cache_data)
+        df = self._load_data(use_cache, cache_data, bbox, polygon)
         return self._pre_preparation(df)
 
     ################################################################################
 
-    def _load_data(self, use_cache: bool = True, cache_data: bool = True) -> pd.DataFrame:
+    def _load_data(
+        self,
+        use_cache: bool = True,
+        cache_data: bool = True,
+        bbox: tuple[float] = None,
+        polygon: list[tuple[float]] = None
+    ) -> pd.DataFrame:
         '''
             Return a dataframe containing data from the database defined by 
             self.database_name.
@@ -107,6 +155,11 @@ class Acquire:
             Otherwise, the data will be read from the .csv file. The filename is 
             defined by self.file_name.
 
+            If spatial partitioning is enabled, the partitioned cache is up to 
+            date with the .csv file, and a bbox or polygon is given, only the 
+            partitions intersecting the region are read. Without a region the 
+            .csv file is always read, so the rows keep the order of the cache.
+
             Parameters
             ----------
             use_cache: bool, default True
@@ -118,24 +171,53 @@ class Acquire:
             cache_data: bool, default True
                 If True the dataset will be cached in a csv file.
 
+            bbox: tuple[float], default None
+                A bounding box (min_latitude, min_longitude, max_latitude, 
+                max_longitude) in degrees.
+
+            polygon: list[tuple[float]], default None
+                A list of (latitude, longitude) vertices in degrees.
+
             Returns
             -------
             DataFrame: A Pandas DataFrame containing data from the source provided.
         '''
 
+        partitioned = self.partition_cell_size is not None
+        region = bbox is not None or polygon is not None
+
+        # If a region is requested and the partitioned cache is current, read 
+        # only the partitions we need
+        if partitioned and region and use_cache and self._partitions_current():
+            return self._read_partitions(bbox, polygon)
+
         # If the file is cached, read from the .csv file
         if os.path.exists(self.file_name) and use_cache:
-            return pd.read_csv(self.file_name)
+            df = pd.read_csv(self.file_name)
+
+            # Build the partitioned cache from an existing .csv cache
+            if partitioned and cache_data and not self._partitions_current():
+                self._write_partitions(df)
         
         # Otherwise read from the mysql database
         else:
+            # Imported here so the cached data can be read without database 
+            # credentials.
+            from get_db_url import get_db_url
+
             df = pd.read_sql(self.sql, get_db_url(self.database_name))
 
-            # Cache the data in a .csv file, if that is what we want
+            # Cache the data in a .csv file, if that is what we want. Any 
+            # partitions of the old cache are replaced or removed.
             if cache_data:
                 df.to_csv(self.file_name, index = False)
 
-            return df
+                if partitioned:
+                    self._write_partitions(df)
+                else:
+                    shutil.rmtree(self._partition_directory(), ignore_errors = True)
+
+        return self._filter_region(df, bbox, polygon)
 
     ################################################################################
 
@@ -156,4 +238,192 @@ class Acquire:
             DataFrame: The acquired DataFrame with any defined transformations.
         '''
 
-        return df
\ No newline at end of file
+        return df
+
+    ################################################################################
+
+    def _partition_directory(self) -> str:
+        '''
+            Return the name of the directory holding the partitioned cache. 
+            For a file_name of zillow.csv this is zillow_partitions.
+        '''
+
+        return os.path.splitext(self.file_name)[0] + '_partitions'
+
+    ################################################################################
+
+    def _partitions_current(self) -> bool:
+        '''
+            Return True if the partitioned cache exists and was written after 
+            the .csv cache was last modified.
+        '''
+
+        directory = self._partition_directory()
+        if not os.path.isdir(directory):
+            return False
+
+        return not os.path.exists(self.file_name) or os.path.getmtime(directory) >= os.path.getmtime(self.file_name)
+
+    ################################################################################
+
+    def _partition_keys(self, df: pd.DataFrame) -> tuple[np.ndarray]:
+        '''
+            Return the grid row and grid column of the cell containing each 
+            row of df.
+        '''
+
+        latitude = df[self.latitude_column].to_numpy(dtype = np.float64) / self.coordinate_scale
+        longitude = df[self.longitude_column].to_numpy(dtype = np.float64) / self.coordinate_scale
+
+        return (
+            np.floor(latitude / self.partition_cell_size).astype(np.int64),
+            np.floor(longitude / self.partition_cell_size).astype(np.int64)
+        )
+
+    ################################################################################
+
+    def _write_partitions(self, df: pd.DataFrame) -> None:
+        '''
+            Write df to the partitioned cache, one csv file per grid cell. The 
+            partitions are written to a temporary directory first so that an 
+            interrupted write never leaves a partial cache behind.
+        '''
+
+        directory = self._partition_directory()
+        temporary_directory = directory + '.tmp'
+        shutil.rmtree(temporary_directory, ignore_errors = True)
+        os.makedirs(temporary_directory)
+
+        rows, columns = self._partition_keys(df)
+        for (row, column), partition in df.groupby([rows, columns], sort = False):
+            partition.to_csv(os.path.join(temporary_directory, f'{row}_{column}.csv'), index = False)
+
+        shutil.rmtree(directory, ignore_errors = True)
+        os.replace(temporary_directory, directory)
+
+    ################################################################################
+
+    def _read_partitions(self, bbox: tuple[float] = None, polygon: list[tuple[float]] = None) -> pd.DataFrame:
+        '''
+            Read the partitions of the partitioned cache that intersect bbox 
+            and polygon and return the rows inside the region.
+        '''
+
+        directory = self._partition_directory()
+        bounds = _region_bounds(bbox, polygon)
+        size = self.partition_cell_size
+
+        file_names = []
+        for file_name in sorted(os.listdir(directory)):
+            row, column = map(int, os.path.splitext(file_name)[0].split('_'))
+
+            # Skip every cell that lies completely outside the region.
+            if bounds is not None:
+                min_latitude, min_longitude, max_latitude, max_longitude = bounds
+                if (
+                    (row + 1) * size < min_latitude or row * size > max_latitude or
+                    (column + 1) * size < min_longitude or column * size > max_longitude
+                ):
+                    continue
+
+            file_names.append(os.path.join(directory, file_name))
+
+        # Return an empty frame with the columns of the cache when no cell 
+        # intersects the region.
+        if not file_names:
+            templates = [os.path.join(directory, file_name) for file_name in os.listdir(directory)]
+            if not templates and os.path.exists(self.file_name):
+                templates = [self.file_name]
+
+            return pd.read_csv(templates[0], nrows = 0) if templates else pd.DataFrame()
+
+        df = pd.concat([pd.read_csv(file_name) for file_name in file_names], ignore_index = True)
+        return self._filter_region(df, bbox, polygon)
+
+    ################################################################################
+
+    def _filter_region(self, df: pd.DataFrame, bbox: tuple[float] = None, polygon: list[tuple[float]] = None) -> pd.DataFrame:
+        '''
+            Return the rows of df located inside bbox and polygon. If neither 
+            is provided df is returned unchanged.
+        '''
+
+        if bbox is None and polygon is None:
+            return df
+
+        if self.latitude_column is None or self.longitude_column is None:
+            raise ValueError('latitude_column and longitude_column must be set to filter by region.')
+
+        latitude = df[self.latitude_column].to_numpy(dtype = np.float64) / self.coordinate_scale
+        longitude = df[self.longitude_column].to_numpy(dtype = np.float64) / self.coordinate_scale
+
+        mask = np.ones(len(df), dtype = bool)
+        if bbox is not None:
+            min_latitude, min_longitude, max_latitude, max_longitude = bbox
+            mask &= (latitude >= min_latitude) & (latitude <= max_latitude)
+            mask &= (longitude >= min_longitude) & (longitude <= max_longitude)
+        if polygon is not None:
+            mask &= points_in_polygon(latitude, longitude, polygon)
+
+        return df[mask].reset_index(drop = True)
+
+################################################################################
+
+@instrumented
+def points_in_polygon(latitude: np.ndarray, longitude: np.ndarray, polygon: list[tuple[float]]) -> np.ndarray:
+    '''
+        Return a boolean array indicating which points are inside a polygon 
+        using the even-odd ray casting rule. The loop runs over the edges of 
+        the polygon and every point is tested at once for each edge.
+
+        Parameters
+        ----------
+        latitude: ndarray
+            The latitudes of the points in degrees.
+
+        longitude: ndarray
+            The longitudes of the points in degrees.
+
+        polygon: list[tuple[float]]
+            A list of (latitude, longitude) vertices in degrees.
+
+        Returns
+        -------
+        ndarray: A boolean array, True where the point is inside the polygon.
+    '''
+
+    vertices = np.asarray(polygon, dtype = np.float64)
+    inside = np.zeros(len(latitude), dtype = bool)
+
+    for (y1, x1), (y2, x2) in zip(vertices, np.roll(vertices, -1, axis = 0)):
+        crosses = (y1 > latitude) != (y2 > latitude)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            x_intersect = x1 + (latitude - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (longitude < x_intersect)
+
+    return inside
+
+################################################################################
+
+def _region_bounds(bbox: tuple[float] = None, polygon: list[tuple[float]] = None) -> tuple[float]:
+    '''
+        Return the bounding box of the intersection of bbox and the bounding 
+        box of polygon, or None if neither is provided.
+    '''
+
+    boxes = []
+    if bbox is not None:
+        boxes.append(tuple(bbox))
+    if polygon is not None:
+        vertices = np.asarray(polygon, dtype = np.float64)
+        boxes.append((*vertices.min(axis = 0), *vertices.max(axis = 0)))
+
+    if not boxes:
+        return None
+
+    return (
+        max(box[0] for box in boxes),
+        max(box[1] for box in boxes),
+        min(box[2] for box in boxes),
+        min(box[3] for box in boxes)
+    )
@@ -0,0 +1,164 @@
+################################################################################
+#
+#
+#
+#       _feature_cache.py
+#
+#       Description: This file contains a FeatureCache class used for sharing
+#           feature matrices between Model instances. Each matrix is built
+#           once per (DataFrame, features, transform) and handed to every
+#           model that asks for it.
+#
+#       Class:
+#
+#           FeatureCache
+#
+#       Class Fields:
+#
+#           None
+#
+#       Class Methods:
+#
+#           __init__(self)
+#           get(self, df, features, transform = None)
+#           get_target(self, df, target)
+#           clear(self)
+#           _build(self, df, features, transform)
+#           _evict(self, frame_id)
+#
+#
+################################################################################
+
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+
+from sklearn.preprocessing import PolynomialFeatures
+
+################################################################################
+
+class FeatureCache:
+    '''
+        A cache of contiguous float64 feature matrices keyed by the identity
+        of the DataFrame they were built from, the feature list, and the
+        transform applied to them. Entries for a DataFrame are dropped when
+        the DataFrame is garbage collected.
+
+        The cache assumes the feature columns of a DataFrame are not modified
+        in place after a matrix has been built from them. Call clear if they
+        are.
+
+        A transform is either None for the raw features or a tuple of
+        ('polynomial', degree, interaction_only, include_bias) for a
+        PolynomialFeatures expansion. Expansions are built from the cached
+        raw matrix.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        get: Returns ndarray
+        get_target: Returns ndarray
+        clear: Returns None
+    '''
+
+    ################################################################################
+
+    def __init__(self) -> None:
+        self._matrices = {}
+        self._finalizers = {}
+        self._lock = threading.RLock()
+
+    ################################################################################
+
+    def __getstate__(self) -> dict:
+        # The cached matrices are tied to DataFrames in this process, so a
+        # pickled cache (for example one sent to a worker) starts out empty.
+        return {}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()
+
+    ################################################################################
+
+    def get(self, df: pd.DataFrame, features: list[str], transform: tuple = None) -> np.ndarray:
+        '''
+            Return the feature matrix of df for the features and transform,
+            building it if it is not cached yet.
+
+            Parameters
+            ----------
+            df: DataFrame
+                The DataFrame containing the features.
+
+            features: list[str]
+                The feature columns, in order.
+
+            transform: tuple, default None
+                None for the raw features, or ('polynomial', degree,
+                interaction_only, include_bias).
+
+            Returns
+            -------
+            ndarray: A C contiguous float64 matrix. It must not be modified.
+        '''
+
+        frame_id = id(df)
+        key = (frame_id, len(df), tuple(features), transform)
+
+        with self._lock:
+            matrix = self._matrices.get(key)
+        if matrix is not None:
+            return matrix
+
+        matrix = self._build(df, features, transform)
+
+        with self._lock:
+            if frame_id not in self._finalizers:
+                self._finalizers[frame_id] = weakref.finalize(df, self._evict, frame_id)
+            self._matrices[key] = matrix
+
+        return matrix
+
+    ################################################################################
+
+    def get_target(self, df: pd.DataFrame, target: str) -> np.ndarray:
+        '''
+            Return the target column of df as a float64 array.
+        '''
+
+        return self.get(df, [target])[:, 0]
+
+    ################################################################################
+
+    def clear(self) -> None:
+        '''
+            Remove every cached matrix.
+        '''
+
+        with self._lock:
+            for finalizer in self._finalizers.values():
+                finalizer.detach()
+            self._matrices.clear()
+            self._finalizers.clear()
+
+    ################################################################################
+
+    def _build(self, df: pd.DataFrame, features: list[str], transform: tuple) -> np.ndarray:
+        if transform is None:
+            matrix = np.ascontiguousarray(df[features].to_numpy(dtype = np.float64))
+        else:
+            _, degree, interaction_only, include_bias = transform
+            poly = PolynomialFeatures(degree, interaction_only = interaction_only, include_bias = include_bias)
+            matrix = np.ascontiguousarray(poly.fit_transform(self.get(df, features)))
+
+        matrix.flags.writeable = False
+        return matrix
+
+    ################################################################################
+
+    def _evict(self, frame_id: int) -> None:
+        with self._lock:
+            self._finalizers.pop(frame_id, None)
+            for key in [key for key in self._matrices if key[0] == frame_id]:
+                del self._matrices[key]
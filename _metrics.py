@@ -0,0 +1,234 @@
+################################################################################
+#
+#
+#
+#       _metrics.py
+#
+#       Description: This file contains a RegressionMetrics class that computes
+#           the regression error metrics used in evaluate.py (SSE, ESS, TSS,
+#           MSE, and RMSE) from a handful of running sums. Each batch of
+#           predictions is reduced in one vectorized pass, constant
+#           predictions such as a baseline are handled without building an
+#           array of the constant, and two instances can be merged so that
+#           metrics can be computed over streamed or parallel predictions.
+#
+#       Class:
+#
+#           RegressionMetrics
+#
+#       Class Fields:
+#
+#           weight
+#           sum_actual
+#           sse
+#           shift
+#           sum_shifted
+#           sum_shifted_squares
+#
+#       Class Methods:
+#
+#           __init__(self)
+#           update(self, actual, predictions, weights = None)
+#           merge(self, other)
+#           result(self)
+#           _reshift(self, shift)
+#
+#       Functions:
+#
+#           regression_metrics(actual, predictions, weights = None)
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+
+################################################################################
+
+class RegressionMetrics:
+    '''
+        Accumulates the sums needed for the regression error metrics.
+
+        The SSE is accumulated directly. The ESS, the sum of squared
+        differences between the predictions and the overall mean of the
+        actual values, is recovered at the end from sums of the predictions
+        taken about a fixed shift (the mean of the first batch), which keeps
+        it accurate without knowing the overall mean up front.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        update: Returns RegressionMetrics
+        merge: Returns RegressionMetrics
+        result: Returns Series
+    '''
+
+    ################################################################################
+
+    def __init__(self) -> None:
+        self.weight = 0.0
+        self.sum_actual = 0.0
+        self.sse = 0.0
+        self.shift = None
+        self.sum_shifted = 0.0
+        self.sum_shifted_squares = 0.0
+
+    ################################################################################
+
+    def update(self, actual, predictions, weights = None) -> 'RegressionMetrics':
+        '''
+            Add a batch of actual values and predictions.
+
+            Parameters
+            ----------
+            actual: Series | ndarray
+                The actual values of the batch.
+
+            predictions: ndarray | float
+                The predictions for the batch, or a single number for a
+                constant prediction such as a baseline.
+
+            weights: ndarray, default None
+                Optional sample weights.
+
+            Returns
+            -------
+            RegressionMetrics: The updated instance.
+        '''
+
+        actual = np.asarray(actual, dtype = np.float64)
+        if len(actual) == 0:
+            return self
+
+        constant = np.ndim(predictions) == 0
+        predictions = float(predictions) if constant else np.asarray(predictions, dtype = np.float64)
+
+        if weights is None:
+            weight = float(len(actual))
+            sum_actual = actual.sum()
+        else:
+            weights = np.asarray(weights, dtype = np.float64)
+            weight = weights.sum()
+            sum_actual = weights @ actual
+
+        if self.shift is None:
+            self.shift = sum_actual / weight
+
+        if constant:
+            # sum w (a - c)^2 = sum w (a - s)^2 - 2 (c - s) sum w (a - s) + (c - s)^2 sum w,
+            # taken about the shift s so that large actual values do not
+            # cancel.
+            centered = actual - self.shift
+            shifted = predictions - self.shift
+            if weights is None:
+                sum_centered, sum_squares = centered.sum(), centered @ centered
+            else:
+                sum_centered, sum_squares = weights @ centered, (weights * centered) @ centered
+            sse = sum_squares - 2 * shifted * sum_centered + shifted ** 2 * weight
+            sum_shifted = shifted * weight
+            sum_shifted_squares = shifted ** 2 * weight
+        else:
+            residuals = actual - predictions
+            shifted = predictions - self.shift
+            if weights is None:
+                sse = residuals @ residuals
+                sum_shifted = shifted.sum()
+                sum_shifted_squares = shifted @ shifted
+            else:
+                sse = (weights * residuals) @ residuals
+                sum_shifted = weights @ shifted
+                sum_shifted_squares = (weights * shifted) @ shifted
+
+        self.weight += weight
+        self.sum_actual += sum_actual
+        self.sse += max(sse, 0.0)
+        self.sum_shifted += sum_shifted
+        self.sum_shifted_squares += sum_shifted_squares
+
+        return self
+
+    ################################################################################
+
+    def merge(self, other: 'RegressionMetrics') -> 'RegressionMetrics':
+        '''
+            Add the sums of another instance, for example one that was
+            accumulated over a different chunk or in another process.
+        '''
+
+        if other.shift is None:
+            return self
+
+        if self.shift is None:
+            self.shift = other.shift
+
+        sum_shifted, sum_shifted_squares = other._reshift(self.shift)
+
+        self.weight += other.weight
+        self.sum_actual += other.sum_actual
+        self.sse += other.sse
+        self.sum_shifted += sum_shifted
+        self.sum_shifted_squares += sum_shifted_squares
+
+        return self
+
+    ################################################################################
+
+    def result(self) -> pd.Series:
+        '''
+            Return the SSE, ESS, TSS, MSE, and RMSE as a pandas Series.
+        '''
+
+        if self.weight == 0:
+            raise ValueError('No predictions have been added.')
+
+        # sum (p - mean)^2 with p - mean = (p - shift) - (mean - shift)
+        offset = self.sum_actual / self.weight - self.shift
+        ess = self.sum_shifted_squares - 2 * offset * self.sum_shifted + offset ** 2 * self.weight
+        mse = self.sse / self.weight
+
+        return pd.Series({
+            'SSE' : self.sse,
+            'ESS' : max(ess, 0.0),
+            'TSS' : self.sse + max(ess, 0.0),
+            'MSE' : mse,
+            'RMSE' : np.sqrt(mse)
+        })
+
+    ################################################################################
+
+    def _reshift(self, shift: float) -> tuple[float]:
+        '''
+            Return sum_shifted and sum_shifted_squares taken about a
+            different shift.
+        '''
+
+        delta = self.shift - shift
+        return (
+            self.sum_shifted + delta * self.weight,
+            self.sum_shifted_squares + 2 * delta * self.sum_shifted + delta ** 2 * self.weight
+        )
+
+################################################################################
+
+def regression_metrics(actual, predictions, weights = None) -> pd.Series:
+    '''
+        Return the SSE, ESS, TSS, MSE, and RMSE of a set of predictions, 
+        computed in one pass.
+    
+        Parameters
+        ----------
+        actual: Series
+            A pandas series containing the actual values from a dataset.
+
+        predictions: Array | float
+            A numpy array containing the predictions from a regression model, 
+            or a single number for a constant prediction.
+
+        weights: Array, default None
+            Optional sample weights.
+    
+        Returns
+        -------
+        Series: A pandas series of floats containing the metric scores.
+    '''
+
+    return RegressionMetrics().update(actual, predictions, weights).result()
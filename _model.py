@@ -11,6 +11,7 @@
 #       Class:
 #
 #           Model
+#           ClusterModel
 #
 #       Class Fields:
 #
@@ -20,6 +21,8 @@
 #
 #           __init__(self)
 #           make_predictions(self, df)
+#           _split_pipeline(self)
+#           _transform(self)
 #
 #
 ################################################################################
@@ -28,6 +31,7 @@ import numpy as np
 import pandas as pd
 
 from sklearn.linear_model import LinearRegression, TweedieRegressor
+from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import PolynomialFeatures
 
 from sklearn.metrics import mean_squared_error, r2_score
@@ -38,14 +42,96 @@ class Model:
 
     ################################################################################
 
-    def __init__(self, model, train, features, target):
+    def __init__(self, model, train, features, target, cache = None):
         self.model = model
         self.features = features
         self.target = target
+        self.cache = cache
 
-        self.model.fit(train[self.features], train[self.target])
+        if self.cache is None:
+            self.model.fit(train[self.features], train[self.target])
+        else:
+            # The polynomial step only needs the number of features to fit, 
+            # the expansion itself comes from the cache.
+            head, tail = self._split_pipeline()
+            if head is not None:
+                head.fit(self.cache.get(train, self.features))
+
+            tail.fit(self.cache.get(train, self.features, self._transform()), self.cache.get_target(train, self.target))
 
     ################################################################################
 
     def make_predictions(self, df):
-        return self.model.predict(df[self.features])    
\ No newline at end of file
+        if self.cache is None:
+            return self.model.predict(df[self.features])
+
+        _, tail = self._split_pipeline()
+        return tail.predict(self.cache.get(df, self.features, self._transform()))
+
+    ################################################################################
+
+    def _split_pipeline(self):
+        '''
+            Split a pipeline starting with PolynomialFeatures into the 
+            polynomial step and the rest of the pipeline. Any other model is 
+            returned as (None, model).
+        '''
+
+        if isinstance(self.model, Pipeline) and isinstance(self.model[0], PolynomialFeatures):
+            return self.model[0], self.model[1:]
+
+        return None, self.model
+
+    ################################################################################
+
+    def _transform(self):
+        '''
+            Return the FeatureCache transform matching the polynomial step of 
+            the model, or None if it has none.
+        '''
+
+        head, _ = self._split_pipeline()
+        if head is None:
+            return None
+
+        return ('polynomial', head.degree, head.interaction_only, head.include_bias)
+
+################################################################################
+
+class ClusterModel:
+    '''
+        Keeps one fitted Model per cluster and routes each row of a 
+        DataFrame to the model of its cluster. Predictions are made with one 
+        batched predict call per cluster and scattered back into place.
+    '''
+
+    ################################################################################
+
+    def __init__(self, models, cluster_column = 'cluster', fallback = None):
+        self.models = models
+        self.cluster_column = cluster_column
+        self.fallback = fallback
+
+        any_model = next(iter(models.values()))
+        self.features = any_model.features
+        self.target = any_model.target
+
+    ################################################################################
+
+    def make_predictions(self, df):
+        clusters = df[self.cluster_column].to_numpy()
+        predictions = np.empty(len(df))
+
+        # Group the row positions by cluster so each model sees one batch.
+        labels, inverse = np.unique(clusters, return_inverse = True)
+        order = np.argsort(inverse, kind = 'stable')
+        bounds = np.cumsum(np.bincount(inverse, minlength = len(labels)))[:-1]
+
+        for label, rows in zip(labels, np.split(order, bounds)):
+            model = self.models.get(label, self.fallback)
+            if model is None:
+                raise KeyError(f'No model was trained for cluster {label}.')
+
+            predictions[rows] = model.make_predictions(df.iloc[rows])
+
+        return predictions
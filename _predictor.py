@@ -0,0 +1,206 @@
+################################################################################
+#
+#
+#
+#       _predictor.py
+#
+#       Description: This file contains a CompiledModel class that evaluates a
+#           fitted linear, tweedie, or polynomial Model with plain NumPy. The
+#           polynomial terms are precomputed as arrays of feature indices so
+#           that a prediction is a handful of array operations on a float
+#           array, without sklearn's validation and pipeline dispatch. This
+#           file does not import sklearn.
+#
+#       Class:
+#
+#           CompiledModel
+#
+#       Class Fields:
+#
+#           features
+#           target
+#           link
+#           intercept
+#           linear_coef
+#           term_indices
+#           term_coefs
+#
+#       Class Methods:
+#
+#           __init__(self, features, target, coef, intercept, powers = None, link = 'identity')
+#           predict(self, X)
+#           make_predictions(self, df)
+#           arrays(self)
+#
+#       Functions:
+#
+#           compile_model(model)
+#
+#
+################################################################################
+
+import numpy as np
+
+################################################################################
+
+class CompiledModel:
+    '''
+        A minimal NumPy evaluator for a fitted linear model on polynomial
+        terms of its features.
+
+        The terms are split by degree. Degree one terms are folded into one
+        coefficient vector over the raw features, and the terms of each
+        higher degree d are described by an (n_terms, d) array of the feature
+        indices that are multiplied together.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        predict: Returns ndarray
+        make_predictions: Returns ndarray
+        arrays: Returns dict
+    '''
+
+    ################################################################################
+
+    def __init__(
+        self,
+        features: list[str],
+        target: str,
+        coef: np.ndarray,
+        intercept: float,
+        powers: np.ndarray = None,
+        link: str = 'identity'
+    ) -> None:
+        '''
+            Parameters
+            ----------
+            features: list[str]
+                The features the model was fit on, in order.
+
+            target: str
+                The target variable.
+
+            coef: ndarray
+                The coefficient of each term.
+
+            intercept: float
+                The intercept.
+
+            powers: ndarray, default None
+                The (n_terms, n_features) exponents of each term, as in
+                PolynomialFeatures.powers_. If None every feature is a term.
+
+            link: str, default 'identity'
+                The link function, either 'identity' or 'log'.
+        '''
+
+        if link not in ('identity', 'log'):
+            raise ValueError(f'Unsupported link function {link}.')
+
+        n_features = len(features)
+        coef = np.asarray(coef, dtype = np.float64)
+        if powers is None:
+            powers = np.eye(n_features)
+        powers = np.asarray(powers, dtype = np.int64)
+
+        self.features = list(features)
+        self.target = target
+        self.link = link
+        self.coef = coef
+        self.powers = powers
+
+        degrees = powers.sum(axis = 1)
+
+        # A constant term (include_bias = True) is added to the intercept.
+        self.intercept = float(intercept) + coef[degrees == 0].sum()
+
+        self.linear_coef = np.zeros(n_features)
+        linear_terms = degrees == 1
+        self.linear_coef[powers[linear_terms].argmax(axis = 1)] += coef[linear_terms]
+
+        self.term_indices = []
+        self.term_coefs = []
+        for degree in np.unique(degrees[degrees > 1]):
+            terms = degrees == degree
+            # Repeat each feature index by its exponent, e.g. x0^2 x1 -> [0, 0, 1].
+            indices = np.array([np.repeat(np.arange(n_features), row) for row in powers[terms]])
+            self.term_indices.append(indices)
+            self.term_coefs.append(np.ascontiguousarray(coef[terms]))
+
+    ################################################################################
+
+    def predict(self, X) -> np.ndarray:
+        '''
+            Return the predictions for a (n, len(features)) float array, or
+            a single row of len(features) values, in the order of
+            self.features.
+        '''
+
+        X = np.asarray(X, dtype = np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        predictions = X @ self.linear_coef
+        for indices, coefs in zip(self.term_indices, self.term_coefs):
+            predictions += X[:, indices].prod(axis = 2) @ coefs
+        predictions += self.intercept
+
+        return np.exp(predictions) if self.link == 'log' else predictions
+
+    ################################################################################
+
+    def make_predictions(self, df) -> np.ndarray:
+        return self.predict(df[self.features].to_numpy(dtype = np.float64))
+
+    ################################################################################
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        '''
+            Return the arrays the model can be rebuilt from.
+        '''
+
+        return {
+            'coef' : self.coef,
+            'intercept' : np.array([self.intercept - self.coef[self.powers.sum(axis = 1) == 0].sum()]),
+            'powers' : self.powers
+        }
+
+################################################################################
+
+def compile_model(model) -> CompiledModel:
+    '''
+        Compile a fitted Model whose estimator is a LinearRegression, a
+        TweedieRegressor, or a PolynomialFeatures -> linear model pipeline.
+        The estimator is inspected by its attributes so that sklearn does not
+        need to be imported.
+
+        Parameters
+        ----------
+        model: Model
+            A fitted Model.
+
+        Returns
+        -------
+        CompiledModel: An evaluator that gives the same predictions as
+            model.make_predictions.
+    '''
+
+    estimator = model.model
+    powers = None
+
+    steps = getattr(estimator, 'steps', None)
+    if steps is not None:
+        if len(steps) != 2 or not hasattr(steps[0][1], 'powers_'):
+            raise ValueError('Only PolynomialFeatures -> estimator pipelines can be compiled.')
+        powers = steps[0][1].powers_
+        estimator = steps[1][1]
+
+    if not hasattr(estimator, 'coef_') or np.ndim(estimator.coef_) != 1:
+        raise ValueError(f'{type(estimator).__name__} cannot be compiled.')
+
+    link = 'identity'
+    if type(estimator).__name__ == 'TweedieRegressor':
+        link = estimator.link if estimator.link != 'auto' else ('identity' if estimator.power <= 0 else 'log')
+
+    return CompiledModel(model.features, model.target, estimator.coef_, estimator.intercept_, powers, link)
@@ -6,6 +6,10 @@
 #
 #       Description: Description
 #
+#       Variables:
+#
+#           drop_columns
+#
 #       Class:
 #
 #           AcquireZillow
@@ -15,6 +19,11 @@
 #           file_name
 #           database_name
 #           sql
+#           latitude_column
+#           longitude_column
+#           coordinate_scale
+#           partition_cell_size
+#           drop_columns
 #
 #       Class Methods:
 #
@@ -23,7 +32,7 @@
 #
 #       Inherited Methods:
 #
-#           get_data(self, use_cache = True, cache_data = True)
+#           get_data(self, use_cache = True, cache_data = True, bbox = None, polygon = None)
 #
 #
 ################################################################################
@@ -34,6 +43,21 @@ from _acquire import Acquire
 
 ################################################################################
 
+# The id columns removed by _pre_preparation.
+drop_columns = [
+    'heatingorsystemtypeid',
+    'storytypeid',
+    'propertylandusetypeid',
+    'buildingclasstypeid',
+    'architecturalstyletypeid',
+    'airconditioningtypeid',
+    'typeconstructiontypeid',
+    'id',
+    'parcelid'
+]
+
+################################################################################
+
 class AcquireZillow(Acquire):
 
     ################################################################################
@@ -43,6 +67,16 @@ class AcquireZillow(Acquire):
         
         self.file_name = 'zillow.csv'
         self.database_name = 'zillow'
+
+        # Coordinates are stored as integer micro degrees. The cache is 
+        # partitioned into 0.05 degree (roughly 5 km) grid cells.
+        self.latitude_column = 'latitude'
+        self.longitude_column = 'longitude'
+        self.coordinate_scale = 1e6
+        self.partition_cell_size = 0.05
+
+        self.drop_columns = drop_columns
+
         self.sql = '''
             SELECT
                 properties_2017.*,
@@ -81,17 +115,5 @@ class AcquireZillow(Acquire):
     ################################################################################
 
     def _pre_preparation(self, df: pd.DataFrame) -> pd.DataFrame:
-        drop_columns = [
-            'heatingorsystemtypeid',
-            'storytypeid',
-            'propertylandusetypeid',
-            'buildingclasstypeid',
-            'architecturalstyletypeid',
-            'airconditioningtypeid',
-            'typeconstructiontypeid',
-            'id',
-            'parcelid'
-        ]
-
-        df = df.drop(columns = drop_columns)
+        df = df.drop(columns = self.drop_columns)
         return df
\ No newline at end of file
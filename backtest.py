@@ -0,0 +1,307 @@
+################################################################################
+#
+#
+#
+#       backtest.py
+#
+#       Description: This file contains a backtesting engine for the models
+#           built by create_models. split_data splits the properties at
+#           random, so it cannot show how a model degrades as the market
+#           moves. Here the properties are ordered by transactiondate and
+#           each model is retrained and scored over a sequence of windows,
+#           always trained on earlier months and scored on the following
+#           months. Windows are either expanding (every earlier month) or
+#           rolling (a fixed number of the most recent months).
+#
+#           The window level preprocessing (scaling and cluster assignment)
+#           is fit once per window and shared by every model. The rows are
+#           placed in shared memory once, in date order, so every window is
+#           a slice of them, and each worker scales its window and adds the
+#           cluster dummies from the window's labels before fitting. The
+#           (model, window) pairs are trained in a process pool.
+#
+#       Variables:
+#
+#           window_types
+#
+#       Functions:
+#
+#           make_windows(dates, window = 'expanding', train_months = 3, test_months = 1)
+#           prepare_windows(df, windows, columns, k = 4, random_seed = 24)
+#           backtest(df, dates, specs = None, target = 'logerror', window = 'expanding', train_months = 3, test_months = 1, k = 4, random_seed = 24, n_jobs = 1)
+#           _fit_window(label, estimator, features, target, window)
+#
+#
+################################################################################
+
+import os
+import numpy as np
+import pandas as pd
+
+from sklearn.base import clone
+from sklearn.cluster import KMeans
+from threadpoolctl import threadpool_limits
+
+from model import estimators, feature_sets, establish_baseline
+from preprocessing import scalers
+from scheduler import map_jobs
+from prepare import cluster_columns
+
+################################################################################
+
+window_types = ('expanding', 'rolling')
+
+################################################################################
+
+def make_windows(
+    dates: pd.Series,
+    window: str = 'expanding',
+    train_months: int = 3,
+    test_months: int = 1
+) -> tuple:
+    '''
+        Split the rows into backtest windows by the month of their
+        transaction date.
+
+        Parameters
+        ----------
+        dates: Series
+            The transaction date of each row.
+
+        window: str, default 'expanding'
+            Either 'expanding', where each window trains on every month
+            before its test months, or 'rolling', where each window trains
+            on the train_months months before them.
+
+        train_months: int, default 3
+            The number of months in the first training window, and in every
+            training window if window is 'rolling'.
+
+        test_months: int, default 1
+            The number of months scored by each window. Consecutive windows
+            move forward by this many months.
+
+        Returns
+        -------
+        tuple: The row positions in date order, and for each window a dict
+            of its train and test row positions, the (start, split, end) of
+            its rows within the date order, and its first and last test
+            month.
+    '''
+
+    if window not in window_types:
+        raise ValueError(f'window must be one of {window_types}, not {window}.')
+
+    months = pd.to_datetime(dates).dt.to_period('M').to_numpy()
+    periods = np.unique(months)
+
+    # Order the rows by date once so every window is a contiguous slice.
+    order = np.argsort(months, kind = 'stable')
+    bounds = np.searchsorted(months[order], periods, side = 'left').tolist() + [len(order)]
+
+    windows = []
+    for start in range(train_months, len(periods), test_months):
+        first = 0 if window == 'expanding' else start - train_months
+        end = min(start + test_months, len(periods))
+
+        windows.append({
+            'train' : order[bounds[first]:bounds[start]],
+            'test' : order[bounds[start]:bounds[end]],
+            'rows' : (bounds[first], bounds[start], bounds[end]),
+            'test_start' : str(periods[start]),
+            'test_end' : str(periods[end - 1])
+        })
+
+    return order, windows
+
+################################################################################
+
+def prepare_windows(
+    df: pd.DataFrame,
+    windows: list[dict],
+    columns: list[str],
+    k: int = 4,
+    random_seed: int = 24
+) -> list[dict]:
+    '''
+        Run the window level preprocessing once for each window. For each
+        window a MinMaxScaler is fit on the columns of the window's training
+        rows and a KMeans model on their scaled cluster_columns, as in
+        prepare_and_split, and every row of the window is assigned a
+        cluster.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The rows in date order.
+
+        windows: list[dict]
+            The windows from make_windows.
+
+        columns: list[str]
+            The columns to scale. They must include cluster_columns.
+
+        k: int, default 4
+            The number of KMeans clusters.
+
+        random_seed: int, default 24
+            The seed for KMeans.
+
+        Returns
+        -------
+        list[dict]: The (start, split, end) of the rows of each window, its
+            fitted scaler, and the cluster label of each of its rows.
+    '''
+
+    positions = [columns.index(column) for column in cluster_columns]
+    prepared = []
+
+    for window in windows:
+        start, split, end = window['rows']
+        rows = df.iloc[start:end]
+
+        scaler = scalers['MinMaxScaler']().fit(rows.iloc[:split - start][columns])
+        scaled = scaler.transform(rows[columns])[:, positions]
+        kmeans = KMeans(n_clusters = k, random_state = random_seed).fit(scaled[:split - start])
+
+        prepared.append({'rows' : window['rows'], 'scaler' : scaler, 'labels' : kmeans.predict(scaled)})
+
+    return prepared
+
+################################################################################
+
+def backtest(
+    df: pd.DataFrame,
+    dates: pd.Series,
+    specs: list[tuple] = None,
+    target: str = 'logerror',
+    window: str = 'expanding',
+    train_months: int = 3,
+    test_months: int = 1,
+    k: int = 4,
+    random_seed: int = 24,
+    n_jobs: int = 1
+) -> tuple[pd.DataFrame]:
+    '''
+        Backtest a list of models over time and return the RMSE of each
+        model in each window, next to the baseline, along with the per
+        (model, window) results.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The prepared dataset from prepare_for_model. It must not be
+            scaled or clustered yet.
+
+        dates: Series
+            The transaction date of each property, aligned to df by index,
+            for example the transactiondate column of the acquired data.
+            Its index must be unique.
+
+        specs: list[tuple], default None
+            A list of (label, estimator, features) tuples. Defaults to the
+            eight models of create_models, labeled as in evaluate_models.
+
+        target: str, default 'logerror'
+            The target variable.
+
+        window: str, default 'expanding'
+            Either 'expanding' or 'rolling'. See make_windows.
+
+        train_months: int, default 3
+            The number of months in the first training window, and in every
+            training window if window is 'rolling'.
+
+        test_months: int, default 1
+            The number of months scored by each window.
+
+        k: int, default 4
+            The number of KMeans clusters fit in each window.
+
+        random_seed: int, default 24
+            The seed for KMeans.
+
+        n_jobs: int, default 1
+            The number of worker processes. If None the number of cores is
+            used. If 1 the models are fit one after another in the current
+            process.
+
+        Returns
+        -------
+        tuple(DataFrame): The RMSE of the baseline and each model, one row
+            per window labeled by its test months, and the per (model,
+            window) results.
+    '''
+
+    if specs is None:
+        specs = [
+            (f'{name}_{feature_set}', estimator, features)
+            for feature_set, features in feature_sets.items()
+            for name, estimator in estimators.items()
+        ]
+
+    if not dates.index.is_unique:
+        raise ValueError('dates must have a unique index so that each row of df gets one date.')
+
+    order, windows = make_windows(dates.loc[df.index], window, train_months, test_months)
+    if not windows:
+        raise ValueError(f'The data spans too few months for {train_months} training months.')
+
+    # Every feature and clustering column is scaled per window, as
+    # evaluate_models sees them after scale_data, but the target is not.
+    dummies = [f'cluster_{cluster}' for cluster in range(1, k)]
+    scaled_columns = list(dict.fromkeys(
+        column for _, _, features in specs for column in [*features, *cluster_columns] if column not in dummies
+    ))
+
+    # The rows are ordered by date once and every window is a slice of them.
+    ordered = df.iloc[order][[*scaled_columns, target]]
+    prepared = prepare_windows(ordered, windows, scaled_columns, k, random_seed)
+
+    jobs = [(label, clone(estimator), features, target, index) for label, estimator, features in specs for index in range(len(windows))]
+    n_jobs = min(n_jobs or os.cpu_count(), len(jobs))
+
+    results = map_jobs(_fit_window, jobs, n_jobs, ordered, values = {'windows' : prepared, 'k' : k})
+
+    # The baseline of each window is chosen from its training rows as in 
+    # establish_baseline.
+    y = ordered[target].to_numpy(dtype = np.float64)
+    for index, window in enumerate(windows):
+        start, split, end = window['rows']
+        baseline = establish_baseline(y[start:split]).iloc[0]
+        results.append({'model' : 'baseline', 'window' : index, 'RMSE' : np.sqrt(np.mean((y[split:end] - baseline) ** 2))})
+
+    window_results = pd.DataFrame(results)
+    window_results['test_start'] = [windows[index]['test_start'] for index in window_results.window]
+    window_results['train_rows'] = [len(windows[index]['train']) for index in window_results.window]
+    window_results['test_rows'] = [len(windows[index]['test']) for index in window_results.window]
+
+    summary = window_results.pivot(index = 'test_start', columns = 'model', values = 'RMSE')
+    summary = summary[['baseline', *(label for label, _, _ in specs)]]
+    summary.columns.name = None
+
+    return summary, window_results
+
+################################################################################
+
+_worker_state = {}
+
+def _fit_window(label: str, estimator, features: list[str], target: str, window: int) -> dict:
+    prepared = _worker_state['windows'][window]
+    start, split, end = prepared['rows']
+    rows = _worker_state['df'].iloc[start:end]
+
+    # Scale the window and add its cluster dummies. Only this window's rows
+    # are copied.
+    scaler = prepared['scaler']
+    X = pd.DataFrame(scaler.transform(rows[scaler.feature_names_in_]), columns = scaler.feature_names_in_)
+    clusters = prepared['labels'][:, None] == np.arange(1, _worker_state['k'])
+    X = X.assign(**{f'cluster_{cluster}' : clusters[:, cluster - 1] for cluster in range(1, _worker_state['k'])})[features]
+    y = rows[target].to_numpy()
+
+    # Limit each fit to one thread so that the fits do not compete for cores.
+    with threadpool_limits(1):
+        estimator.fit(X.iloc[:split - start], y[:split - start])
+        predictions = estimator.predict(X.iloc[split - start:])
+
+    return {'model' : label, 'window' : window, 'RMSE' : np.sqrt(np.mean((y[split - start:] - predictions) ** 2))}
@@ -0,0 +1,121 @@
+################################################################################
+#
+#
+#
+#       import_time.py
+#
+#       Description: This file contains a benchmark of the cold start import
+#           time of the project modules. Each import runs in a fresh Python
+#           process, so nothing is shared between measurements, and the
+#           benchmark reports whether the import pulled in matplotlib or
+#           seaborn along with the peak memory of the process.
+#
+#           To compare two versions of the code, check the older version out
+#           into a separate directory (for example with git worktree add) and
+#           pass it with --path:
+#
+#               python benchmarks/import_time.py
+#               python benchmarks/import_time.py --path ../zillow-before
+#
+#       Variables:
+#
+#           default_modules
+#
+#       Functions:
+#
+#           measure_import(module, path, repeat = 5)
+#           main()
+#
+#
+################################################################################
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+################################################################################
+
+# The modules imported by the prepare and model path of a batch job, followed
+# by the modules that also contain plotting functions.
+default_modules = [
+    'prepare',
+    'model',
+    'clustering',
+    'evaluate',
+    'explore'
+]
+
+# Run in the child process. The peak resident memory is reported in kilobytes
+# on Linux.
+_child = '''
+import sys, time, json, resource
+start_time = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start_time
+print(json.dumps({{
+    'seconds' : seconds,
+    'matplotlib' : 'matplotlib' in sys.modules,
+    'seaborn' : 'seaborn' in sys.modules,
+    'peak_memory_mb' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+}}))
+'''
+
+################################################################################
+
+def measure_import(module: str, path: str, repeat: int = 5) -> dict:
+    '''
+        Import a module in repeat fresh processes with path as the working
+        directory and return the median import time, the peak memory, and
+        whether matplotlib and seaborn were loaded.
+    '''
+
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', _child.format(module = module)],
+            cwd = path,
+            capture_output = True,
+            text = True,
+            check = True
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    return {
+        'module' : module,
+        'median_seconds' : statistics.median(run['seconds'] for run in runs),
+        'min_seconds' : min(run['seconds'] for run in runs),
+        'peak_memory_mb' : statistics.median(run['peak_memory_mb'] for run in runs),
+        'matplotlib' : runs[0]['matplotlib'],
+        'seaborn' : runs[0]['seaborn']
+    }
+
+################################################################################
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Measure the cold start import time of the project modules.')
+    parser.add_argument('modules', nargs = '*', default = default_modules, help = 'The modules to import.')
+    parser.add_argument('--path', default = os.path.dirname(os.path.dirname(os.path.abspath(__file__))), help = 'The checkout to import from.')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'The number of fresh processes per module.')
+    parser.add_argument('--json', default = None, help = 'A file to write the results to.')
+    args = parser.parse_args()
+
+    results = [measure_import(module, args.path, args.repeat) for module in args.modules]
+
+    print(f"{'module':<12} {'median s':>9} {'min s':>8} {'peak MB':>8}  matplotlib  seaborn")
+    for result in results:
+        print(
+            f"{result['module']:<12} {result['median_seconds']:>9.3f} {result['min_seconds']:>8.3f} "
+            f"{result['peak_memory_mb']:>8.1f}  {str(result['matplotlib']):<10}  {result['seaborn']}"
+        )
+
+    if args.json is not None:
+        with open(args.json, 'w') as file:
+            json.dump({'path' : os.path.abspath(args.path), 'results' : results}, file, indent = 4)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+################################################################################
+#
+#
+#
+#       run.py
+#
+#       Description: This file contains a benchmark suite for the stages of the
+#           acquisition, preparation, exploration, and modeling pipeline. Each
+#           stage is run on synthetic Zillow data at several sizes and its
+#           wall time and peak traced memory are recorded. The results are
+#           written to a JSON file per version in benchmarks/results so two
+#           versions can be compared for regressions:
+#
+#               python benchmarks/run.py run --sizes 10000 100000
+#               python benchmarks/run.py compare results/a1b2c3d.json results/e4f5a6b.json
+#
+#           As in asv, the inputs of each stage are set up before it is timed
+#           and the setup is shared by every stage at a given size.
+#
+#       Variables:
+#
+#           default_sizes
+#           stages
+#
+#       Functions:
+#
+#           setup_inputs(n_rows, directory)
+#           measure(function, inputs, repeat = 3)
+#           run_benchmarks(sizes = default_sizes, stage_names = None, repeat = 3)
+#           compare_results(old, new, threshold = 0.1)
+#           main()
+#           _version()
+#
+#
+################################################################################
+
+import os
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import tempfile
+import tracemalloc
+import contextlib
+import statistics
+import subprocess
+import pandas as pd
+
+# Import the project modules from the repository root.
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository)
+
+import explore
+from acquire import AcquireZillow
+from prepare import prepare_for_model, prepare_and_split
+from preprocessing import split_data, scale_data, remove_outliers
+from clustering import create_clusters
+from model import establish_baseline, create_models, evaluate_models
+
+from synthetic import make_zillow
+
+################################################################################
+
+default_sizes = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Each stage is a function of the inputs built by setup_inputs.
+stages = {
+    'get_data' : lambda inputs: inputs['acquire'].get_data(),
+    'prepare_for_model' : lambda inputs: prepare_for_model(inputs['acquired']),
+    'split_data' : lambda inputs: split_data(inputs['prepared']),
+    'scale_data' : lambda inputs: scale_data(*inputs['split'], inputs['scale_columns']),
+    'remove_outliers' : lambda inputs: remove_outliers(inputs['train_scaled'], 1.5, ['square_feet', 'tax_assessed_value']),
+    'create_clusters' : lambda inputs: create_clusters(inputs['train_scaled'], ['property_age', 'square_feet', 'lot_size'], 4),
+    'create_models' : lambda inputs: create_models(inputs['train_no_outliers']),
+    'evaluate_models' : lambda inputs: evaluate_models(inputs['baseline'], inputs['models'], inputs['train_scaled'], inputs['validate_scaled'], 'logerror'),
+    'run_stats_test_for_tax_value' : lambda inputs: explore.run_stats_test_for_tax_value(inputs['train']),
+    'run_stats_test_for_zip_codes' : lambda inputs: explore.run_stats_test_for_zip_codes(inputs['train']),
+    'run_stats_test_for_square_feet' : lambda inputs: explore.run_stats_test_for_square_feet(inputs['train']),
+    'run_stats_test_for_clusters' : lambda inputs: explore.run_stats_test_for_clusters(inputs['train'])
+}
+
+################################################################################
+
+def setup_inputs(n_rows: int, directory: str) -> dict:
+    '''
+        Build the inputs of every stage for n_rows of synthetic data, as the
+        final report notebook would. The csv cache read by get_data is
+        written to directory.
+    '''
+
+    acquire = AcquireZillow()
+    acquire.file_name = os.path.join(directory, 'zillow.csv')
+
+    # Time the plain csv cache read rather than the one off partitioning.
+    acquire.partition_cell_size = None
+
+    make_zillow(n_rows).to_csv(acquire.file_name, index = False)
+    acquired = acquire.get_data()
+
+    prepared = prepare_for_model(acquired)
+    split = split_data(prepared)
+    scale_columns = split[0].drop(columns = ['logerror', 'yearbuilt_binned']).columns
+
+    train, validate, test = prepare_and_split(acquired)
+    train_scaled, validate_scaled, _ = scale_data(train, validate, test, train.drop(columns = ['logerror', 'yearbuilt_binned']).columns)
+    train_no_outliers = remove_outliers(train_scaled, 1.5, ['square_feet', 'tax_assessed_value'])
+
+    return {
+        'acquire' : acquire,
+        'acquired' : acquired,
+        'prepared' : prepared,
+        'split' : split,
+        'scale_columns' : scale_columns,
+        'train' : train,
+        'train_scaled' : train_scaled,
+        'validate_scaled' : validate_scaled,
+        'train_no_outliers' : train_no_outliers,
+        'baseline' : establish_baseline(train['logerror']),
+        'models' : create_models(train_no_outliers)
+    }
+
+################################################################################
+
+def measure(function, inputs: dict, repeat: int = 3) -> dict:
+    '''
+        Time repeat calls of function(inputs), then make one more call under
+        tracemalloc to find its peak memory. Tracing slows the call down, so
+        it is kept out of the timings. Only the current process is traced,
+        so memory used by worker processes (create_models with n_jobs > 1) is
+        not included. Output printed by the stage is discarded.
+    '''
+
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            function(inputs)
+            times.append(time.perf_counter() - start_time)
+
+        tracemalloc.start()
+        try:
+            function(inputs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'min_seconds' : min(times),
+        'median_seconds' : statistics.median(times),
+        'peak_memory_mb' : peak / 2 ** 20
+    }
+
+################################################################################
+
+def run_benchmarks(sizes: list[int] = default_sizes, stage_names: list[str] = None, repeat: int = 3) -> list[dict]:
+    '''
+        Run the stages at each size and return one result per (stage, size).
+
+        Parameters
+        ----------
+        sizes: list[int], default default_sizes
+            The numbers of synthetic rows.
+
+        stage_names: list[str], default None
+            The stages to run. Defaults to every stage in stages.
+
+        repeat: int, default 3
+            The number of timed calls of each stage.
+
+        Returns
+        -------
+        list[dict]: The stage, size, timings, and peak memory of each run.
+    '''
+
+    stage_names = stage_names or list(stages)
+    results = []
+
+    for n_rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            start_time = time.perf_counter()
+            inputs = setup_inputs(n_rows, directory)
+            print(f'{n_rows:>10,} rows: setup {time.perf_counter() - start_time:.1f}s', flush = True)
+
+            for name in stage_names:
+                result = {'stage' : name, 'n_rows' : n_rows, **measure(stages[name], inputs, repeat)}
+                results.append(result)
+
+                print(
+                    f"{'':>16}{name:<32} {result['median_seconds']:>9.3f}s {result['peak_memory_mb']:>9.1f} MB",
+                    flush = True
+                )
+
+    return results
+
+################################################################################
+
+def compare_results(old: dict, new: dict, threshold: float = 0.1) -> pd.DataFrame:
+    '''
+        Compare two result files and return the ratio of the new to the old
+        median time and peak memory for every (stage, size) in both. Ratios
+        above 1 + threshold are flagged as regressions.
+    '''
+
+    columns = ['stage', 'n_rows', 'median_seconds', 'peak_memory_mb']
+    merged = pd.merge(
+        pd.DataFrame(old['results'])[columns],
+        pd.DataFrame(new['results'])[columns],
+        on = ['stage', 'n_rows'],
+        suffixes = ('_old', '_new')
+    )
+
+    merged['time_ratio'] = merged.median_seconds_new / merged.median_seconds_old
+    merged['memory_ratio'] = merged.peak_memory_mb_new / merged.peak_memory_mb_old
+    merged['regression'] = (merged.time_ratio > 1 + threshold) | (merged.memory_ratio > 1 + threshold)
+
+    return merged
+
+################################################################################
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmark the pipeline stages on synthetic data.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    run = commands.add_parser('run', help = 'Run the benchmarks and save the results.')
+    run.add_argument('--sizes', type = int, nargs = '+', default = default_sizes, help = 'The numbers of rows.')
+    run.add_argument('--stages', nargs = '+', default = None, choices = list(stages), help = 'The stages to run.')
+    run.add_argument('--repeat', type = int, default = 3, help = 'The number of timed calls of each stage.')
+    run.add_argument('--label', default = None, help = 'The result file name. Defaults to the git commit.')
+    run.add_argument('--output-directory', default = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results'))
+
+    compare = commands.add_parser('compare', help = 'Compare two result files.')
+    compare.add_argument('old', help = 'The result file of the earlier version.')
+    compare.add_argument('new', help = 'The result file of the later version.')
+    compare.add_argument('--threshold', type = float, default = 0.1, help = 'The relative slowdown flagged as a regression.')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        version = _version()
+        results = run_benchmarks(args.sizes, args.stages, args.repeat)
+
+        os.makedirs(args.output_directory, exist_ok = True)
+        path = os.path.join(args.output_directory, f'{args.label or version}.json')
+        with open(path, 'w') as file:
+            json.dump({
+                'version' : version,
+                'timestamp' : datetime.datetime.now().isoformat(timespec = 'seconds'),
+                'python' : platform.python_version(),
+                'machine' : platform.machine(),
+                'cpu_count' : os.cpu_count(),
+                'results' : results
+            }, file, indent = 4)
+
+        print(f'Results written to {path}')
+    else:
+        with open(args.old) as old, open(args.new) as new:
+            comparison = compare_results(json.load(old), json.load(new), args.threshold)
+
+        print(comparison.to_string(index = False, float_format = '{:.3f}'.format))
+
+        if comparison.regression.any():
+            sys.exit(1)
+
+################################################################################
+
+def _version() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd = repository,
+            capture_output = True,
+            text = True,
+            check = True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unversioned'
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
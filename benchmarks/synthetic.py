@@ -0,0 +1,117 @@
+################################################################################
+#
+#
+#
+#       synthetic.py
+#
+#       Description: This file contains a generator of synthetic Zillow data
+#           shaped like the result of the AcquireZillow SQL query. It has the
+#           columns the preparation pipeline uses, the id columns
+#           AcquireZillow drops, and sparse columns that the 80% threshold in
+#           prepare_for_model drops, so every stage of the pipeline does its
+#           usual work without access to the database.
+#
+#       Variables:
+#
+#           land_use_types
+#
+#       Functions:
+#
+#           make_zillow(n_rows, random_seed = 24)
+#           _sparse(rng, values, fill_rate)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+
+################################################################################
+
+# The propertylandusedesc values and their approximate shares in the 2017
+# transactions. The multi unit types are removed by prepare_for_model.
+land_use_types = {
+    'Single Family Residential' : 0.70,
+    'Condominium' : 0.20,
+    'Duplex' : 0.04,
+    'Planned Unit Development' : 0.03,
+    'Quadruplex (4 Units, Any Combination)' : 0.01,
+    'Townhouse' : 0.01,
+    'Mobile Home' : 0.01
+}
+
+################################################################################
+
+def make_zillow(n_rows: int, random_seed: int = 24) -> pd.DataFrame:
+    '''
+        Return n_rows of synthetic Zillow data with the columns of the
+        AcquireZillow query (before _pre_preparation).
+
+        Parameters
+        ----------
+        n_rows: int
+            The number of rows.
+
+        random_seed: int, default 24
+            The seed of the generator.
+
+        Returns
+        -------
+        DataFrame: The synthetic data.
+    '''
+
+    rng = np.random.default_rng(random_seed)
+
+    square_feet = np.round(rng.lognormal(7.4, 0.4, n_rows))
+    bedrooms = np.clip(np.round(square_feet / 600 + rng.normal(0, 0.8, n_rows)), 0, 8)
+    bathrooms = np.clip(np.round(2 * (bedrooms * 0.7 + rng.normal(0, 0.5, n_rows))) / 2, 0, 8)
+    year_built = np.clip(np.round(rng.normal(1962, 22, n_rows)), 1880, 2016)
+    tax_value = np.round(square_feet * rng.lognormal(5.3, 0.6, n_rows))
+
+    # Zip codes from the LA, Orange, and Ventura county range, with one in
+    # ten drawn from the non average zip codes used by prepare_for_model.
+    zip_codes = rng.integers(95982, 97345, n_rows).astype(np.float64)
+    non_average = rng.random(n_rows) < 0.1
+    zip_codes[non_average] = rng.choice([96095.0, 96985.0, 96522.0, 96045.0, 96415.0, 96152.0], non_average.sum())
+
+    df = pd.DataFrame({
+        'id' : np.arange(n_rows),
+        'parcelid' : np.arange(10_000_000, 10_000_000 + n_rows),
+        'airconditioningtypeid' : _sparse(rng, np.ones(n_rows), 0.3),
+        'architecturalstyletypeid' : _sparse(rng, np.full(n_rows, 7.0), 0.003),
+        'bathroomcnt' : bathrooms,
+        'bedroomcnt' : bedrooms,
+        'buildingclasstypeid' : _sparse(rng, np.full(n_rows, 4.0), 0.001),
+        'calculatedfinishedsquarefeet' : _sparse(rng, square_feet, 0.995),
+        'fips' : rng.choice([6037.0, 6059.0, 6111.0], n_rows, p = [0.65, 0.27, 0.08]),
+        'garagecarcnt' : _sparse(rng, rng.integers(0, 4, n_rows).astype(np.float64), 0.33),
+        'heatingorsystemtypeid' : _sparse(rng, np.full(n_rows, 2.0), 0.63),
+        'latitude' : np.round(rng.uniform(33.34, 34.82, n_rows) * 1e6),
+        'longitude' : np.round(rng.uniform(-119.45, -117.55, n_rows) * 1e6),
+        'lotsizesquarefeet' : _sparse(rng, np.round(rng.lognormal(8.9, 0.7, n_rows)), 0.89),
+        'poolcnt' : _sparse(rng, np.ones(n_rows), 0.21),
+        'propertylandusetypeid' : np.full(n_rows, 261.0),
+        'regionidzip' : _sparse(rng, zip_codes, 0.9995),
+        'storytypeid' : _sparse(rng, np.full(n_rows, 7.0), 0.0006),
+        'typeconstructiontypeid' : _sparse(rng, np.full(n_rows, 6.0), 0.003),
+        'yearbuilt' : _sparse(rng, year_built, 0.997),
+        'taxvaluedollarcnt' : _sparse(rng, tax_value, 0.9999),
+        'taxamount' : _sparse(rng, np.round(tax_value * 0.012, 2), 0.9999),
+        'logerror' : rng.standard_t(3, n_rows) * 0.05 + 0.017,
+        'transactiondate' : (np.datetime64('2017-01-01') + rng.integers(0, 365, n_rows).astype('timedelta64[D]')).astype(str),
+        'propertylandusedesc' : rng.choice(list(land_use_types), n_rows, p = list(land_use_types.values()))
+    })
+
+    return df
+
+################################################################################
+
+def _sparse(rng: np.random.Generator, values: np.ndarray, fill_rate: float) -> np.ndarray:
+    '''
+        Return values with about 1 - fill_rate of them replaced by NaN.
+    '''
+
+    values = values.astype(np.float64)
+    values[rng.random(len(values)) >= fill_rate] = np.nan
+
+    return values
@@ -0,0 +1,167 @@
+################################################################################
+#
+#
+#
+#       bootstrap.py
+#
+#       Description: This file contains a bootstrap engine for comparing the
+#           RMSE of several models on the same dataset. Resamples are drawn in
+#           blocks, each block is turned into a matrix of row counts, and the
+#           RMSE of every model on every resample in the block comes from a
+#           single matrix product with the squared errors. Blocks run in a
+#           process pool with independent seeds.
+#
+#       Variables:
+#
+#           None
+#
+#       Functions:
+#
+#           bootstrap_rmse(actual, predictions, baseline = 'baseline', n_resamples = 2_000, confidence = 0.95, block_size = None, block_memory_mb = 64, random_seed = 24, n_jobs = 1)
+#           resample_counts(n_rows, n_resamples, rng)
+#           _bootstrap_block(n_resamples, seed)
+#
+#
+################################################################################
+
+import os
+import numpy as np
+import pandas as pd
+
+from threadpoolctl import threadpool_limits
+
+from scheduler import map_jobs
+
+################################################################################
+
+def bootstrap_rmse(
+    actual,
+    predictions: dict,
+    baseline: str = 'baseline',
+    n_resamples: int = 2_000,
+    confidence: float = 0.95,
+    block_size: int = None,
+    block_memory_mb: float = 64,
+    random_seed: int = 24,
+    n_jobs: int = 1
+) -> pd.DataFrame:
+    '''
+        Bootstrap the RMSE of every model and the paired difference between
+        each model's RMSE and the baseline's RMSE, and return percentile
+        confidence intervals for both.
+
+        Every model is scored on the same resamples, so the differences are
+        paired and much tighter than the intervals of the RMSEs themselves.
+
+        Parameters
+        ----------
+        actual: Series | ndarray
+            The actual values of the target.
+
+        predictions: dict
+            The predictions of each model keyed by label. A value may be a
+            single number for a constant prediction such as a baseline.
+
+        baseline: str, default 'baseline'
+            The label in predictions that differences are taken against.
+
+        n_resamples: int, default 2_000
+            The number of bootstrap resamples.
+
+        confidence: float, default 0.95
+            The confidence level of the intervals.
+
+        block_size: int, default None
+            The number of resamples drawn at once. Each block holds a
+            (block_size, n_rows) float64 matrix of counts. If None it is the
+            largest size whose matrix fits in block_memory_mb.
+
+        block_memory_mb: float, default 64
+            The memory budget of a block's matrix of counts when block_size
+            is None. Each worker holds one block at a time.
+
+        random_seed: int, default 24
+            The seed from which every block's seed is spawned. The results
+            do not depend on n_jobs.
+
+        n_jobs: int, default 1
+            The number of worker processes. If None the number of cores is
+            used. If 1 the blocks are run in the current process.
+
+        Returns
+        -------
+        DataFrame: One row per model with the RMSE, its interval
+            (RMSE_lower, RMSE_upper), the difference from the baseline RMSE,
+            its interval (difference_lower, difference_upper), and
+            p_better, the share of resamples where the model beat the
+            baseline.
+    '''
+
+    if baseline not in predictions:
+        raise ValueError(f'{baseline} is not one of the labels in predictions.')
+
+    actual = np.asarray(actual, dtype = np.float64)
+    labels = list(predictions)
+
+    # One row of squared errors per model; constants are broadcast here once.
+    squared_errors = np.empty((len(labels), len(actual)))
+    for row, label in enumerate(labels):
+        squared_errors[row] = (actual - np.asarray(predictions[label], dtype = np.float64)) ** 2
+
+    if block_size is None:
+        block_size = max(int(block_memory_mb * 2 ** 20) // (8 * len(actual)), 1)
+
+    block_sizes = [min(block_size, n_resamples - start) for start in range(0, n_resamples, block_size)]
+    seeds = np.random.SeedSequence(random_seed).spawn(len(block_sizes))
+    n_jobs = min(n_jobs or os.cpu_count(), len(block_sizes))
+
+    blocks = map_jobs(_bootstrap_block, list(zip(block_sizes, seeds)), n_jobs, values = {'squared_errors' : squared_errors})
+
+    # (n_resamples, n_models)
+    rmse = np.vstack(blocks)
+    differences = rmse - rmse[:, [labels.index(baseline)]]
+
+    tail = (1 - confidence) / 2 * 100
+    rmse_lower, rmse_upper = np.percentile(rmse, [tail, 100 - tail], axis = 0)
+    difference_lower, difference_upper = np.percentile(differences, [tail, 100 - tail], axis = 0)
+
+    point = np.sqrt(squared_errors.mean(axis = 1))
+
+    return pd.DataFrame({
+        'RMSE' : point,
+        'RMSE_lower' : rmse_lower,
+        'RMSE_upper' : rmse_upper,
+        'difference' : point - point[labels.index(baseline)],
+        'difference_lower' : difference_lower,
+        'difference_upper' : difference_upper,
+        'p_better' : (differences < 0).mean(axis = 0)
+    }, index = labels)
+
+################################################################################
+
+def resample_counts(n_rows: int, n_resamples: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+        Draw n_resamples bootstrap resamples of n_rows rows and return how
+        many times each row appears in each one as a (n_resamples, n_rows)
+        matrix.
+    '''
+
+    # The counts are drawn one resample at a time into the float64 matrix,
+    # so the only full size array is the matrix itself.
+    counts = np.empty((n_resamples, n_rows))
+    for resample in range(n_resamples):
+        counts[resample] = np.bincount(rng.integers(0, n_rows, size = n_rows), minlength = n_rows)
+
+    return counts
+
+################################################################################
+
+_worker_state = {}
+
+def _bootstrap_block(n_resamples: int, seed: np.random.SeedSequence) -> np.ndarray:
+    squared_errors = _worker_state['squared_errors']
+    counts = resample_counts(squared_errors.shape[1], n_resamples, np.random.default_rng(seed))
+
+    # Limit each block to one thread so that the blocks do not compete for cores.
+    with threadpool_limits(1):
+        return np.sqrt(counts @ squared_errors.T / squared_errors.shape[1])
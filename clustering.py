@@ -14,20 +14,33 @@
 #       Functions:
 #
 #           plot_kmeans_inertia(df, columns, k_range)
-#           create_clusters(df, columns, k)
+#           create_clusters(df, columns, k, random_seed = 24, n_runs = 1, n_jobs = None)
+#           fit_kmeans_ensemble(X, k, n_runs = 10, random_seed = 24, n_jobs = None)
+#           assign_clusters(X, centroids)
+#           _align_labels(reference, centroids, labels)
+#           _fit_kmeans(k, random_seed)
 #
 #
 ################################################################################
 
+import os
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
 
 from sklearn.cluster import KMeans
+from threadpoolctl import threadpool_limits
+
+from instrument import instrumented
+from scheduler import map_jobs
 
 ################################################################################
 
+@instrumented
 def plot_kmeans_inertia(df: pd.DataFrame, columns: list[str], k_range: tuple[int]) -> None:
+    import matplotlib.pyplot as plt
+
     inertias = {}
 
     for k in range(k_range[0], k_range[1]):
@@ -40,13 +53,137 @@ def plot_kmeans_inertia(df: pd.DataFrame, columns: list[str], k_range: tuple[int
 
 ################################################################################
 
-def create_clusters(df: pd.DataFrame, columns: list[str], k: int, random_seed = 24) -> pd.DataFrame:
+@instrumented
+def create_clusters(
+    df: pd.DataFrame,
+    columns: list[str],
+    k: int,
+    random_seed = 24,
+    n_runs: int = 1,
+    n_jobs: int = None
+) -> pd.DataFrame:
+    '''
+        Add a cluster column to a copy of df. If n_runs is greater than one 
+        an ensemble of KMeans models is fit and the consensus cluster is used 
+        along with a cluster_stability column holding the proportion of runs 
+        that agree with the consensus.
+    '''
+
     df_copy = df.copy()
-    
-    kmeans = KMeans(n_clusters = k, random_state = random_seed)
-    kmeans.fit(df_copy[columns])
 
-    df_copy['cluster'] = kmeans.predict(df_copy[columns])
+    if n_runs > 1:
+        labels, stability, _ = fit_kmeans_ensemble(df_copy[columns], k, n_runs, random_seed, n_jobs)
+        df_copy['cluster'] = labels
+        df_copy['cluster_stability'] = stability
+    else:
+        kmeans = KMeans(n_clusters = k, random_state = random_seed)
+        kmeans.fit(df_copy[columns])
+
+        df_copy['cluster'] = kmeans.predict(df_copy[columns])
+
     df_copy.cluster = df_copy.cluster.astype('category')
 
-    return df_copy
\ No newline at end of file
+    return df_copy
+
+################################################################################
+
+@instrumented
+def fit_kmeans_ensemble(
+    X: pd.DataFrame,
+    k: int,
+    n_runs: int = 10,
+    random_seed: int = 24,
+    n_jobs: int = None
+) -> tuple[np.ndarray]:
+    '''
+        Fit n_runs KMeans models with different seeds in a process pool, 
+        align their labels to the first run by matching centroids with the 
+        Hungarian algorithm, and return the consensus of the aligned labels.
+
+        Each run uses a single initialization and a single thread, so with 
+        one run per core the ensemble takes about as long as one default fit.
+    
+        Parameters
+        ----------
+        X: DataFrame
+            The data to cluster.
+
+        k: int
+            The number of clusters.
+
+        n_runs: int, default 10
+            The number of KMeans models to fit. The seeds used are 
+            random_seed, random_seed + 1, and so on.
+
+        random_seed: int, default 24
+            The seed of the first run, which the other runs are aligned to.
+
+        n_jobs: int, default None
+            The number of worker processes. If None the number of cores is 
+            used. If 1 the runs are fit in the current process.
+    
+        Returns
+        -------
+        tuple: The consensus label of each row, the proportion of runs that 
+            agree with the consensus for each row, and the (k, n_features) 
+            array of centroids averaged over the aligned runs.
+    '''
+
+    X = np.ascontiguousarray(X, dtype = np.float64)
+    seeds = [random_seed + run for run in range(n_runs)]
+    n_jobs = min(n_jobs or os.cpu_count(), n_runs)
+
+    # The data is sent to each worker once rather than once per run.
+    runs = map_jobs(_fit_kmeans, [(k, seed) for seed in seeds], n_jobs, values = {'X' : X})
+
+    reference = runs[0][0]
+    votes = np.zeros((X.shape[0], k), dtype = np.int32)
+    centroids = np.zeros_like(reference)
+    rows = np.arange(X.shape[0])
+
+    for run_centroids, run_labels in runs:
+        aligned_centroids, aligned_labels = _align_labels(reference, run_centroids, run_labels)
+        votes[rows, aligned_labels] += 1
+        centroids += aligned_centroids
+
+    return votes.argmax(axis = 1), votes.max(axis = 1) / n_runs, centroids / n_runs
+
+################################################################################
+
+@instrumented
+def assign_clusters(X: pd.DataFrame, centroids: np.ndarray) -> np.ndarray:
+    '''
+        Return the index of the nearest centroid for each row of X.
+    '''
+
+    return cdist(np.asarray(X, dtype = np.float64), centroids, 'sqeuclidean').argmin(axis = 1)
+
+################################################################################
+
+def _align_labels(reference: np.ndarray, centroids: np.ndarray, labels: np.ndarray) -> tuple[np.ndarray]:
+    '''
+        Relabel a KMeans run so that each of its clusters takes the label of 
+        the reference centroid it is matched to. The matching minimizes the 
+        total squared distance between matched centroids.
+    '''
+
+    reference_index, run_index = linear_sum_assignment(cdist(reference, centroids, 'sqeuclidean'))
+
+    mapping = np.empty(len(run_index), dtype = np.int64)
+    mapping[run_index] = reference_index
+
+    aligned_centroids = np.empty_like(centroids)
+    aligned_centroids[reference_index] = centroids[run_index]
+
+    return aligned_centroids, mapping[labels]
+
+################################################################################
+
+_worker_state = {}
+
+def _fit_kmeans(k: int, random_seed: int) -> tuple[np.ndarray]:
+    # Limit each run to one thread so that the runs do not compete for cores.
+    with threadpool_limits(1):
+        kmeans = KMeans(n_clusters = k, n_init = 1, random_state = random_seed).fit(_worker_state['X'])
+
+    return kmeans.cluster_centers_, kmeans.labels_
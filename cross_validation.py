@@ -0,0 +1,214 @@
+################################################################################
+#
+#
+#
+#       cross_validation.py
+#
+#       Description: This file contains a K-fold cross validation engine for
+#           the models built by create_models. Fold indices and fold level
+#           preprocessing (scaling and cluster assignment) are computed once
+#           and shared by every model. The rows are placed in shared memory
+#           once, each fold keeps only its scaler and the cluster label of
+#           every row, and each worker scales its fold's rows and adds the
+#           cluster dummies before fitting. The (model, fold) pairs are
+#           trained in a process pool.
+#
+#       Variables:
+#
+#           None
+#
+#       Functions:
+#
+#           make_folds(n_rows, n_folds = 5, random_seed = 24)
+#           prepare_folds(df, folds, columns, k = 4, random_seed = 24)
+#           cross_validate(df, specs = None, target = 'logerror', n_folds = 5, k = 4, random_seed = 24, n_jobs = 1)
+#           _fit_fold(label, estimator, features, target, fold)
+#
+#
+################################################################################
+
+import os
+import numpy as np
+import pandas as pd
+
+from sklearn.base import clone
+from sklearn.cluster import KMeans
+from sklearn.model_selection import KFold
+from threadpoolctl import threadpool_limits
+
+from model import estimators, feature_sets, establish_baseline
+from preprocessing import scalers
+from scheduler import map_jobs
+from prepare import cluster_columns
+
+################################################################################
+
+def make_folds(n_rows: int, n_folds: int = 5, random_seed: int = 24) -> list[tuple[np.ndarray]]:
+    '''
+        Return the (train positions, held out positions) of each fold.
+    '''
+
+    return list(KFold(n_folds, shuffle = True, random_state = random_seed).split(np.empty(n_rows)))
+
+################################################################################
+
+def prepare_folds(
+    df: pd.DataFrame,
+    folds: list[tuple[np.ndarray]],
+    columns: list[str],
+    k: int = 4,
+    random_seed: int = 24
+) -> tuple:
+    '''
+        Run the fold level preprocessing once for each fold. For each fold a
+        MinMaxScaler is fit on the columns of the fold's training rows and a
+        KMeans model on their scaled cluster_columns, as in
+        prepare_and_split, and every row of df is assigned a cluster.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The prepared dataset.
+
+        folds: list[tuple[ndarray]]
+            The folds from make_folds.
+
+        columns: list[str]
+            The columns to scale. They must include cluster_columns.
+
+        k: int, default 4
+            The number of KMeans clusters.
+
+        random_seed: int, default 24
+            The seed for KMeans.
+
+        Returns
+        -------
+        tuple: The fitted scaler of each fold and the cluster label of every
+            row of df in each fold, as an (n_folds, n_rows) array.
+    '''
+
+    positions = [columns.index(column) for column in cluster_columns]
+    fitted = []
+    labels = np.empty((len(folds), len(df)), dtype = np.int32)
+
+    for fold, (train_index, _) in enumerate(folds):
+        scaler = scalers['MinMaxScaler']().fit(df.iloc[train_index][columns])
+        scaled = scaler.transform(df[columns])[:, positions]
+        kmeans = KMeans(n_clusters = k, random_state = random_seed).fit(scaled[train_index])
+
+        fitted.append(scaler)
+        labels[fold] = kmeans.predict(scaled)
+
+    return fitted, labels
+
+################################################################################
+
+def cross_validate(
+    df: pd.DataFrame,
+    specs: list[tuple] = None,
+    target: str = 'logerror',
+    n_folds: int = 5,
+    k: int = 4,
+    random_seed: int = 24,
+    n_jobs: int = 1
+) -> tuple[pd.DataFrame]:
+    '''
+        Cross validate a list of models and return the mean and standard
+        deviation of the held out RMSE of each one, along with the RMSE of
+        each (model, fold) pair.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The prepared dataset from prepare_for_model, for example train
+            and validate combined. It must not be scaled or clustered yet.
+
+        specs: list[tuple], default None
+            A list of (label, estimator, features) tuples. Defaults to the
+            eight models of create_models, labeled as in evaluate_models.
+
+        target: str, default 'logerror'
+            The target variable.
+
+        n_folds: int, default 5
+            The number of folds.
+
+        k: int, default 4
+            The number of KMeans clusters fit in each fold.
+
+        random_seed: int, default 24
+            The seed for the fold assignment and KMeans.
+
+        n_jobs: int, default 1
+            The number of worker processes. If None the number of cores is
+            used. If 1 the models are fit one after another in the current
+            process.
+
+        Returns
+        -------
+        tuple(DataFrame): A summary with RMSE_mean and RMSE_std per model,
+            including the baseline, and the per fold results.
+    '''
+
+    if specs is None:
+        specs = [
+            (f'{name}_{feature_set}', estimator, features)
+            for feature_set, features in feature_sets.items()
+            for name, estimator in estimators.items()
+        ]
+
+    # Every feature and clustering column is scaled per fold, as
+    # evaluate_models sees them after scale_data, but the target is not. The
+    # cluster dummies are built by the workers from labels, so only the
+    # other columns are shared.
+    dummies = [f'cluster_{cluster}' for cluster in range(1, k)]
+    scaled_columns = list(dict.fromkeys(
+        column for _, _, features in specs for column in [*features, *cluster_columns] if column not in dummies
+    ))
+
+    folds = make_folds(len(df), n_folds, random_seed)
+    fitted, labels = prepare_folds(df, folds, scaled_columns, k, random_seed)
+    jobs = [(label, clone(estimator), features, target, fold) for label, estimator, features in specs for fold in range(n_folds)]
+    n_jobs = min(n_jobs or os.cpu_count(), len(jobs))
+
+    values = {'folds' : folds, 'scalers' : fitted, 'labels' : labels, 'dummies' : dummies}
+    results = map_jobs(_fit_fold, jobs, n_jobs, df, [*scaled_columns, target], values)
+
+    # The baseline of each fold is chosen from its training rows as in 
+    # establish_baseline.
+    y = df[target].to_numpy(dtype = np.float64)
+    for fold, (train_index, test_index) in enumerate(folds):
+        baseline = establish_baseline(y[train_index]).iloc[0]
+        results.append({'model' : 'baseline', 'fold' : fold, 'RMSE' : np.sqrt(np.mean((y[test_index] - baseline) ** 2))})
+
+    fold_results = pd.DataFrame(results)
+    summary = fold_results.groupby('model', sort = False).RMSE.agg(RMSE_mean = 'mean', RMSE_std = 'std')
+    summary = pd.concat([summary.loc[['baseline']], summary.drop(index = 'baseline')])
+
+    return summary, fold_results
+
+################################################################################
+
+_worker_state = {}
+
+def _fit_fold(label: str, estimator, features: list[str], target: str, fold: int) -> dict:
+    train_index, test_index = _worker_state['folds'][fold]
+    df = _worker_state['df']
+
+    # Scale the rows with this fold's scaler and add its cluster dummies.
+    scaler = _worker_state['scalers'][fold]
+    X = pd.DataFrame(scaler.transform(df[scaler.feature_names_in_]), columns = scaler.feature_names_in_)
+    clusters = _worker_state['labels'][fold]
+    X = X.assign(**{
+        feature : clusters == cluster
+        for cluster, feature in enumerate(_worker_state['dummies'], start = 1) if feature in features
+    })[features]
+    y = df[target].to_numpy()
+
+    # Limit each fit to one thread so that the fits do not compete for cores.
+    with threadpool_limits(1):
+        estimator.fit(X.iloc[train_index], y[train_index])
+        predictions = estimator.predict(X.iloc[test_index])
+
+    return {'model' : label, 'fold' : fold, 'RMSE' : np.sqrt(np.mean((y[test_index] - predictions) ** 2))}
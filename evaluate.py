@@ -13,9 +13,9 @@
 #
 #       Functions:
 #
-#           plot_residuals(actual, predictions)
-#           regression_errors(actual, predictions, print_results = True)
-#           baseline_mean_errors(actual, baseline, print_results = True)
+#           plot_residuals(actual, predictions, backend = 'scatter')
+#           regression_errors(actual, predictions, print_results = True, weights = None)
+#           baseline_mean_errors(actual, baseline, print_results = True, weights = None)
 #           better_than_baseline(actual, predictions)
 #           _SSE(actual, predictions)
 #           _ESS(actual, predictions)
@@ -27,14 +27,17 @@
 ################################################################################
 
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-from sklearn.metrics import mean_squared_error, explained_variance_score
+from sklearn.metrics import explained_variance_score
+
+from _metrics import RegressionMetrics, regression_metrics
+from plotting import density_plot, check_backend
+from instrument import instrumented
 
 ################################################################################
 
-def plot_residuals(actual, predictions):
+@instrumented
+def plot_residuals(actual, predictions, backend: str = 'scatter'):
     '''
         Create a residual plot using the predictions from a regression model 
         and the actual values.
@@ -46,18 +49,31 @@ def plot_residuals(actual, predictions):
     
         predictions: Array
             A numpy array containing the predictions from a regression model.
+
+        backend: str, default 'scatter'
+            Either 'scatter' to draw every point or 'density' to draw the 
+            binned density of the points, which is much faster for large 
+            datasets.
     '''
 
+    import matplotlib.pyplot as plt
+
+    check_backend(backend)
+
     residuals = actual - predictions
     plt.axhline(0, ls=':')
-    plt.scatter(actual, residuals)
+    if backend == 'density':
+        density_plot(actual, residuals)
+    else:
+        plt.scatter(actual, residuals)
     plt.xlabel('Actual')
     plt.ylabel('Residual')
     plt.title('Residuals for yhat')
 
 ################################################################################
 
-def regression_errors(actual, predictions, print_results: bool = True) -> pd.core.series.Series:
+@instrumented
+def regression_errors(actual, predictions, print_results: bool = True, weights = None) -> pd.core.series.Series:
     '''
         Print or return the error metrics for a regression model (SSE, ESS,
         TSS, MSE, and RMSE).
@@ -73,6 +89,9 @@ def regression_errors(actual, predictions, print_results: bool = True) -> pd.cor
         print_results: bool, default True
             If True the metric scores are printed to the console, if False 
             the metric scores are returned.
+
+        weights: Array, default None
+            Optional sample weights.
     
         Returns
         -------
@@ -80,26 +99,23 @@ def regression_errors(actual, predictions, print_results: bool = True) -> pd.cor
             floats containing the metric scores for the baseline model.
     '''
 
+    metrics = regression_metrics(actual, predictions, weights)
+
     if print_results:
         print(f'''
-            sum of squared errors (SSE):     {_SSE(actual, predictions)}
-            explained sum of squares (ESS):  {_ESS(actual, predictions)}
-            total sum of squares (TSS):      {_TSS(actual, predictions)}
-            mean squared error (MSE):        {_MSE(actual, predictions)}
-            root mean squared error (RMSE):  {_RMSE(actual, predictions)}
+            sum of squared errors (SSE):     {metrics.SSE}
+            explained sum of squares (ESS):  {metrics.ESS}
+            total sum of squares (TSS):      {metrics.TSS}
+            mean squared error (MSE):        {metrics.MSE}
+            root mean squared error (RMSE):  {metrics.RMSE}
         ''')
     else:
-        return pd.Series({
-            'SSE' : _SSE(actual, predictions),
-            'ESS' : _ESS(actual, predictions),
-            'TSS' : _TSS(actual, predictions),
-            'MSE' : _MSE(actual, predictions),
-            'RMSE' : _RMSE(actual, predictions)
-        })
+        return metrics
 
 ################################################################################
 
-def baseline_mean_errors(actual, baseline, print_results: bool = True) -> pd.core.series.Series:
+@instrumented
+def baseline_mean_errors(actual, baseline, print_results: bool = True, weights = None) -> pd.core.series.Series:
     '''
         Print or return the baseline error metrics for a regression model (SSE, 
         MSE, and RMSE).
@@ -109,12 +125,16 @@ def baseline_mean_errors(actual, baseline, print_results: bool = True) -> pd.cor
         actual: Series
             A pandas series containing the actual values from a dataset.
 
-        predictions: Array
-            A numpy array containing the predictions from a regression model.
+        baseline: Array | float
+            A numpy array containing the baseline predictions, or the single 
+            baseline value.
 
         print_results: bool, default True
             If True the metric scores are printed to the console, if False 
             the metric scores are returned.
+
+        weights: Array, default None
+            Optional sample weights.
     
         Returns
         -------
@@ -122,21 +142,20 @@ def baseline_mean_errors(actual, baseline, print_results: bool = True) -> pd.cor
             floats containing the metric scores for the baseline model.
     '''
 
+    metrics = regression_metrics(actual, baseline, weights)
+
     if print_results:
         print(f'''
-            Baseline sum of squared errors (SSE):     {_SSE(actual, baseline)}
-            Baseline mean squared error (MSE):        {_MSE(actual, baseline)}
-            Baseline root mean squared error (RMSE):  {_RMSE(actual, baseline)}
+            Baseline sum of squared errors (SSE):     {metrics.SSE}
+            Baseline mean squared error (MSE):        {metrics.MSE}
+            Baseline root mean squared error (RMSE):  {metrics.RMSE}
         ''')
     else:
-        return pd.Series({
-            'SSE' : _SSE(actual, baseline),
-            'MSE' : _MSE(actual, baseline),
-            'RMSE' : _RMSE(actual, baseline)
-        })
+        return metrics[['SSE', 'MSE', 'RMSE']]
 
 ################################################################################
 
+@instrumented
 def better_than_baseline(actual, predictions) -> bool:
     '''
         Returns True if the model's predictions are better than the baseline's 
@@ -155,7 +174,7 @@ def better_than_baseline(actual, predictions) -> bool:
         bool: Whether or not the model performs better than the baseline.
     '''
 
-    baseline = _RMSE(actual, pd.Series([actual.mean()] * len(actual)))
+    baseline = _RMSE(actual, actual.mean())
     return _RMSE(actual, predictions) < baseline
 
 ################################################################################
@@ -177,7 +196,7 @@ def _SSE(actual, predictions) -> float:
         float: The sum of squared errors for a regression model.
     '''
 
-    return mean_squared_error(actual, predictions) * len(actual)
+    return regression_metrics(actual, predictions).SSE
 
 ################################################################################
 
@@ -198,7 +217,7 @@ def _ESS(actual, predictions) -> float:
         float: The explained sum of squares for a regression model.
     '''
 
-    return sum((predictions - actual.mean()) ** 2)
+    return regression_metrics(actual, predictions).ESS
 
 ################################################################################
 
@@ -219,7 +238,7 @@ def _TSS(actual, predictions) -> float:
         float: The total sum of squares score for a regression model.
     '''
 
-    return _SSE(actual, predictions) + _ESS(actual, predictions)
+    return regression_metrics(actual, predictions).TSS
 
 ################################################################################
 
@@ -240,7 +259,7 @@ def _MSE(actual, predictions) -> float:
         float: The mean squared error score for a regression model.
     '''
 
-    return mean_squared_error(actual, predictions)
+    return regression_metrics(actual, predictions).MSE
 
 ################################################################################
 
@@ -261,4 +280,4 @@ def _RMSE(actual, predictions) -> float:
         float: The root mean squared error score for a regression model.
     '''
 
-    return mean_squared_error(actual, predictions, squared = False)
\ No newline at end of file
+    return regression_metrics(actual, predictions).RMSE
\ No newline at end of file
@@ -21,36 +21,38 @@
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from scipy import stats
 
 from preprocessing import remove_outliers
+from plotting import density_plot, stratified_sample, check_backend
 
 ################################################################################
 
-def plot_tax_value_and_logerror(df):
+def plot_tax_value_and_logerror(df, backend = 'scatter'):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    check_backend(backend)
+
     fig, ax = plt.subplots(nrows = 1, ncols = 2, figsize = (14, 4))
     fig.suptitle('There is a wider range of logerror for lower valued properties.')
 
-    sns.scatterplot(
-        data = df,
-        x = 'tax_assessed_value',
-        y = 'logerror',
-        alpha = 0.3,
-        ax = ax[0]
-    )
+    for axis, data in zip(ax, (df, remove_outliers(df, 1.5, ['tax_assessed_value']))):
+        if backend == 'density':
+            density_plot(data.tax_assessed_value, data.logerror, ax = axis)
+        else:
+            sns.scatterplot(
+                data = data,
+                x = 'tax_assessed_value',
+                y = 'logerror',
+                alpha = 0.3,
+                ax = axis
+            )
+
     ax[0].set_title('With Outliers')
     ax[0].set_xticks([0, 10_000_000, 20_000_000])
     ax[0].ticklabel_format(style = 'plain')
 
-    sns.scatterplot(
-        data = remove_outliers(df, 1.5, ['tax_assessed_value']),
-        x = 'tax_assessed_value',
-        y = 'logerror',
-        alpha = 0.3,
-        ax = ax[1]
-    )
     ax[1].set_title('Without Outliers')
     ax[1].set_xticks([0, 250_000, 500_000, 750_000, 1_000_000])
     ax[1].ticklabel_format(style = 'plain')
@@ -60,68 +62,120 @@ def plot_tax_value_and_logerror(df):
 
 ################################################################################
 
-def run_stats_test_for_tax_value(df):
+def stats_test_for_tax_value(df, alpha = 0.05):
     mask = df.tax_assessed_value < 400_000
-    _, p = stats.ttest_ind(df[mask].logerror, df[~mask].logerror, equal_var = False)
+    t, p = stats.ttest_ind(df[mask].logerror, df[~mask].logerror, equal_var = False)
+
+    return {
+        'test' : 'two sample t-test',
+        'null_hypothesis' : 'Mean logerror is the same for properties valued under and over $400,000.',
+        'statistic' : float(t),
+        'p' : float(p),
+        'alpha' : alpha,
+        'reject' : bool(p < alpha)
+    }
 
-    if p < 0.05:
+################################################################################
+
+def run_stats_test_for_tax_value(df):
+    if stats_test_for_tax_value(df)['reject']:
         print('Reject H0')
     else:
         print('Fail to reject H0')
 
 ################################################################################
 
-def plot_zip_code_and_logerror(df):
+def plot_zip_code_and_logerror(df, backend = 'scatter'):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    check_backend(backend)
+
     plt.figure(figsize = (14, 4))
+    data = remove_outliers(df, 1.5, ['zip_code'])
 
-    sns.scatterplot(
-        data = remove_outliers(df, 1.5, ['zip_code']),
-        x = 'zip_code',
-        y = 'logerror',
-        alpha = 0.3
-    )
+    if backend == 'density':
+        density_plot(data.zip_code, data.logerror)
+    else:
+        sns.scatterplot(
+            data = data,
+            x = 'zip_code',
+            y = 'logerror',
+            alpha = 0.3
+        )
 
     plt.title('There are some zip codes with wider ranges of logerror.')
     plt.show()
 
 ################################################################################
 
-def run_stats_test_for_zip_codes(df):
-    alpha = 0.05
-    zip_codes = []
+def stats_test_for_zip_codes(df, alpha = 0.05):
     mean_logerror = df.logerror.mean()
 
-    for zip_code in df.zip_code.unique():
-        mask = df.zip_code == zip_code
-        t, p = stats.ttest_1samp(df[mask].logerror, mean_logerror)
-        
-        if p < alpha:
-            zip_codes.append(zip_code)
+    # One sample t-tests for every zip code at once from the grouped means 
+    # and standard deviations, equivalent to stats.ttest_1samp per zip code.
+    groups = df.groupby('zip_code').logerror.agg(['mean', 'std', 'count'])
+    t = (groups['mean'] - mean_logerror) / (groups['std'] / np.sqrt(groups['count']))
+    p = 2 * stats.t.sf(np.abs(t), groups['count'] - 1)
+
+    return {
+        'test' : 'one sample t-test per zip code',
+        'null_hypothesis' : 'Mean logerror of the zip code equals the overall mean logerror.',
+        'significant_zip_codes' : groups.index[p < alpha].tolist(),
+        'n_significant' : int((p < alpha).sum()),
+        'n_zip_codes' : len(groups),
+        'alpha' : alpha
+    }
 
-    print(f'{len(zip_codes)} / {len(df.zip_code.unique())} zip codes have mean log error significantly different than the overall mean log error.')
+################################################################################
+
+def run_stats_test_for_zip_codes(df):
+    results = stats_test_for_zip_codes(df)
+
+    print(f"{results['n_significant']} / {results['n_zip_codes']} zip codes have mean log error significantly different than the overall mean log error.")
 
 ################################################################################
 
-def plot_square_feet_and_logerror(df):
-    sns.scatterplot(
-        data = df,
-        x = 'square_feet',
-        y = 'logerror',
-        alpha = 0.3
-    )
+def plot_square_feet_and_logerror(df, backend = 'scatter'):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    check_backend(backend)
+
+    if backend == 'density':
+        density_plot(df.square_feet, df.logerror)
+    else:
+        sns.scatterplot(
+            data = df,
+            x = 'square_feet',
+            y = 'logerror',
+            alpha = 0.3
+        )
 
     plt.title('There is a wider range of logerror for smaller properties.')
     plt.show()
 
 ################################################################################
 
-def run_stats_test_for_square_feet(df):
+def stats_test_for_square_feet(df, alpha = 0.05):
     mean_logerror = df.logerror.mean()
     
     mask = df.square_feet < 2000
     t, p = stats.ttest_1samp(df[mask].logerror, mean_logerror)
 
-    if p < 0.05:
+    return {
+        'test' : 'one sample t-test',
+        'null_hypothesis' : 'Mean logerror of properties under 2000 square feet equals the overall mean logerror.',
+        'statistic' : float(t),
+        'p' : float(p),
+        'alpha' : alpha,
+        'reject' : bool(p < alpha)
+    }
+
+################################################################################
+
+def run_stats_test_for_square_feet(df):
+    if stats_test_for_square_feet(df)['reject']:
         print('Reject H0')
     else:
         print('Fail to reject H0')
@@ -129,6 +183,9 @@ def run_stats_test_for_square_feet(df):
 ################################################################################
 
 def plot_property_size_and_property_age(df):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     figure = sns.relplot(
         data = remove_outliers(df, 1.5, ['square_feet', 'lot_size']),
         x = 'square_feet',
@@ -142,28 +199,70 @@ def plot_property_size_and_property_age(df):
 
 ################################################################################
 
-def plot_clusters(df):
-    sns.relplot(
-        data = remove_outliers(df, 1.5, ['square_feet', 'lot_size']),
-        x = 'square_feet',
-        y = 'lot_size',
-        col = 'yearbuilt_binned',
-        hue = 'cluster'
-    )
+def plot_clusters(df, backend = 'scatter', sample_size = 2_000):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    check_backend(backend)
+    data = remove_outliers(df, 1.5, ['square_feet', 'lot_size'])
+
+    if backend == 'scatter':
+        sns.relplot(
+            data = data,
+            x = 'square_feet',
+            y = 'lot_size',
+            col = 'yearbuilt_binned',
+            hue = 'cluster'
+        )
+
+        plt.show()
+        return
+
+    # One density panel per age bin on a shared grid, with a sample of each 
+    # cluster drawn on top to show where the clusters lie.
+    panels = data.yearbuilt_binned.cat.categories if isinstance(data.yearbuilt_binned.dtype, pd.CategoricalDtype) else data.yearbuilt_binned.unique()
+    extent = (data.square_feet.min(), data.square_feet.max(), data.lot_size.min(), data.lot_size.max())
+
+    fig, ax = plt.subplots(nrows = 1, ncols = len(panels), figsize = (5 * len(panels), 5), sharex = True, sharey = True, squeeze = False)
+
+    for axis, panel in zip(ax[0], panels):
+        subset = data[data.yearbuilt_binned == panel]
+        density_plot(
+            subset.square_feet,
+            subset.lot_size,
+            ax = axis,
+            extent = extent,
+            cmap = 'Greys',
+            overlay = stratified_sample(subset, 'cluster', sample_size // len(panels)),
+            hue = 'cluster'
+        )
+        axis.set_title(f'yearbuilt_binned = {panel}')
 
     plt.show()
 
 ################################################################################
 
-def run_stats_test_for_clusters(df):
-    _, p = stats.f_oneway(
+def stats_test_for_clusters(df, alpha = 0.05):
+    f, p = stats.f_oneway(
         df[df.cluster == 0].logerror,
         df[df.cluster == 1].logerror,
         df[df.cluster == 2].logerror,
         df[df.cluster == 3].logerror
     )
 
-    if p < 0.05:
+    return {
+        'test' : 'ANOVA',
+        'null_hypothesis' : 'Mean logerror is the same in every cluster.',
+        'statistic' : float(f),
+        'p' : float(p),
+        'alpha' : alpha,
+        'reject' : bool(p < alpha)
+    }
+
+################################################################################
+
+def run_stats_test_for_clusters(df):
+    if stats_test_for_clusters(df)['reject']:
         print('Reject H0')
     else:
         print('Fail to reject H0')
\ No newline at end of file
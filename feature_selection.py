@@ -0,0 +1,209 @@
+################################################################################
+#
+#
+#
+#       feature_selection.py
+#
+#       Description: This file contains functions for searching feature subsets
+#           for linear regression models. The Gram matrices of the train and
+#           validate datasets are computed once, after which every candidate
+#           subset is fit and scored by solving a small submatrix system
+#           without touching the data again.
+#
+#       Variables:
+#
+#           None
+#
+#       Functions:
+#
+#           search_subsets(train, validate, features, target, method = 'forward', max_features = None, n_jobs = None)
+#           score_subset(train_statistics, validate_statistics, subset)
+#           _gram_statistics(df, features, target)
+#           _forward(train_statistics, validate_statistics, n_features, max_features)
+#           _backward(train_statistics, validate_statistics, n_features, max_features)
+#           _best(train_statistics, validate_statistics, n_features, max_features, n_jobs)
+#           _score_many(subsets)
+#
+#
+################################################################################
+
+import os
+import itertools
+import numpy as np
+import pandas as pd
+
+from streaming import StreamingLinearRegression, solve_normal_equations
+from scheduler import map_jobs
+
+################################################################################
+
+def search_subsets(
+    train: pd.DataFrame,
+    validate: pd.DataFrame,
+    features: list[str],
+    target: str,
+    method: str = 'forward',
+    max_features: int = None,
+    n_jobs: int = None
+) -> pd.DataFrame:
+    '''
+        Search subsets of features for a linear regression and return the
+        train and validate RMSE of each subset that was scored.
+
+        Parameters
+        ----------
+        train: DataFrame
+            The training dataset. Subsets are fit and selected on it.
+
+        validate: DataFrame
+            The validate dataset. It is only used for scoring.
+
+        features: list[str]
+            The candidate features, for example those used in create_models.
+
+        target: str
+            The target variable.
+
+        method: str, default 'forward'
+            One of ('forward', 'backward', 'best'). Forward and backward
+            stepwise add or remove the feature that lowers the training SSE
+            the most at each step. Best scores every subset of up to
+            max_features features in a process pool, which is only practical
+            for roughly 20 candidate features or fewer.
+
+        max_features: int, default None
+            The largest subset to consider. Defaults to all features.
+
+        n_jobs: int, default None
+            The number of worker processes used by the best subset method.
+            If None the number of cores is used.
+
+        Returns
+        -------
+        DataFrame: One row per scored subset with the features, the number
+            of features, RMSE_train, and RMSE_validate, sorted by
+            RMSE_validate.
+    '''
+
+    features = list(features)
+    max_features = min(max_features or len(features), len(features))
+
+    train_statistics = _gram_statistics(train, features, target)
+    validate_statistics = _gram_statistics(validate, features, target)
+
+    if method == 'forward':
+        results = _forward(train_statistics, validate_statistics, len(features), max_features)
+    elif method == 'backward':
+        results = _backward(train_statistics, validate_statistics, len(features), max_features)
+    elif method == 'best':
+        results = _best(train_statistics, validate_statistics, len(features), max_features, n_jobs)
+    else:
+        raise ValueError("method must be one of ('forward', 'backward', 'best').")
+
+    return pd.DataFrame([
+        {
+            'features' : [features[index] for index in subset],
+            'n_features' : len(subset),
+            'RMSE_train' : rmse_train,
+            'RMSE_validate' : rmse_validate
+        }
+        for subset, rmse_train, rmse_validate in results
+    ]).sort_values('RMSE_validate', ignore_index = True)
+
+################################################################################
+
+def score_subset(train_statistics: tuple, validate_statistics: tuple, subset: tuple[int]) -> tuple[float]:
+    '''
+        Fit a linear regression on a subset of the features from the training
+        Gram matrix and return its train and validate RMSE.
+
+        For a coefficient vector b the SSE of a dataset is
+        y'y - 2b'X'y + b'X'Xb, so both scores only need the submatrices of
+        the Gram matrices for the subset and the intercept.
+    '''
+
+    columns = np.array([0, *(index + 1 for index in subset)])
+
+    xtx, xty, yty, n_rows = train_statistics
+    b = solve_normal_equations(xtx[np.ix_(columns, columns)], xty[columns])
+
+    scores = []
+    for xtx, xty, yty, n_rows in (train_statistics, validate_statistics):
+        sse = yty - 2 * b @ xty[columns] + b @ xtx[np.ix_(columns, columns)] @ b
+        scores.append(np.sqrt(max(sse, 0) / n_rows))
+
+    return tuple(scores)
+
+################################################################################
+
+def _gram_statistics(df: pd.DataFrame, features: list[str], target: str) -> tuple:
+    '''
+        Return X'X, X'y, y'y, and the row count of df, where X holds an
+        intercept column followed by the features.
+    '''
+
+    regression = StreamingLinearRegression(features, target).partial_fit(df)
+    return regression.xtx, regression.xty, regression.yty, regression.n_rows
+
+################################################################################
+
+def _forward(train_statistics: tuple, validate_statistics: tuple, n_features: int, max_features: int) -> list[tuple]:
+    selected, results = (), []
+
+    while len(selected) < max_features:
+        candidates = [
+            (selected + (index,), *score_subset(train_statistics, validate_statistics, selected + (index,)))
+            for index in range(n_features) if index not in selected
+        ]
+        best = min(candidates, key = lambda candidate: candidate[1])
+        results.append(best)
+        selected = best[0]
+
+    return results
+
+################################################################################
+
+def _backward(train_statistics: tuple, validate_statistics: tuple, n_features: int, max_features: int) -> list[tuple]:
+    selected = tuple(range(n_features))
+    results = [(selected, *score_subset(train_statistics, validate_statistics, selected))]
+
+    while len(selected) > 1:
+        candidates = [
+            (subset, *score_subset(train_statistics, validate_statistics, subset))
+            for subset in itertools.combinations(selected, len(selected) - 1)
+        ]
+        best = min(candidates, key = lambda candidate: candidate[1])
+        selected = best[0]
+        results.append(best)
+
+    return [result for result in results if len(result[0]) <= max_features]
+
+################################################################################
+
+def _best(train_statistics: tuple, validate_statistics: tuple, n_features: int, max_features: int, n_jobs: int) -> list[tuple]:
+    subsets = [
+        subset
+        for size in range(1, max_features + 1)
+        for subset in itertools.combinations(range(n_features), size)
+    ]
+
+    n_jobs = n_jobs or os.cpu_count()
+    values = {'train' : train_statistics, 'validate' : validate_statistics}
+    if n_jobs == 1:
+        return map_jobs(_score_many, [(subsets,)], values = values)[0]
+
+    # Send the Gram matrices to each worker once and the subsets in chunks.
+    chunk_size = max(len(subsets) // (4 * n_jobs), 1)
+    chunks = [subsets[start:start + chunk_size] for start in range(0, len(subsets), chunk_size)]
+
+    return [result for results in map_jobs(_score_many, [(chunk,) for chunk in chunks], n_jobs, values = values) for result in results]
+
+################################################################################
+
+_worker_state = {}
+
+def _score_many(subsets: list[tuple[int]]) -> list[tuple]:
+    return [
+        (subset, *score_subset(_worker_state['train'], _worker_state['validate'], subset))
+        for subset in subsets
+    ]
@@ -0,0 +1,538 @@
+################################################################################
+#
+#
+#
+#       feature_store.py
+#
+#       Description: This file contains a feature store for scoring single
+#           properties without re-acquiring and re-preparing a batch. The
+#           prepared, scaled, and cluster labeled features are kept keyed by
+#           parcelid in a columnar on disk store. The parcel ids are stored
+#           sorted, so a lookup is a binary search over a memory mapped
+#           array followed by one read per column. The target is not stored.
+#           AcquireZillow drops parcelid, so the store is built from the raw
+#           acquired rows and keys the prepared rows by their parcelid here.
+#
+#           The acquired columns, scaler, and cluster centroids the features
+#           were built with are kept in the manifest, so prepare_new gives
+#           newly acquired parcels the same filtering, scaling, and clusters
+#           as the stored ones before an upsert.
+#
+#           Store layout:
+#
+#               <directory>/<version>/manifest.json
+#               <directory>/<version>/parcelid.npy
+#               <directory>/<version>/<column>.npy
+#
+#           Each write or upsert creates a new version and then removes all
+#           but the previous one, so a FeatureStore opened on the previous
+#           version keeps working while the store is refreshed.
+#
+#       Variables:
+#
+#           FORMAT_VERSION
+#           KEY_COLUMN
+#
+#       Class:
+#
+#           FeatureStore
+#
+#       Functions:
+#
+#           write_store(df, directory, stages = None)
+#           upsert(df, directory)
+#           materialize_features(df, directory, target = 'logerror', k = 4, random_seed = 24)
+#           prepare_new(df, directory, target = 'logerror')
+#           list_versions(directory)
+#           _prepare_parcels(df, columns = None)
+#           _fit_stages(train, k, random_seed)
+#           _apply_stages(df, stages)
+#           _encode(values)
+#           _dtype(description)
+#           _decode(array, dtype)
+#
+#
+################################################################################
+
+import os
+import json
+import shutil
+import datetime
+import numpy as np
+import pandas as pd
+
+from sklearn.cluster import KMeans
+
+from acquire import AcquireZillow
+from clustering import assign_clusters
+from prepare import cluster_columns, drop_missing_values, get_single_unit_properties, complete_preparation
+from preprocessing import split_data
+
+################################################################################
+
+FORMAT_VERSION = 1
+
+# The raw acquired column the store is keyed by.
+KEY_COLUMN = 'parcelid'
+
+################################################################################
+
+class FeatureStore:
+    '''
+        A read only view of one version of a feature store. The parcel ids
+        and columns are memory mapped, so opening a store reads only the
+        manifest and a lookup reads only the rows it returns.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        __len__: Returns int
+        __contains__: Returns bool
+        get: Returns Series
+        get_many: Returns DataFrame
+        to_frame: Returns DataFrame
+    '''
+
+    ################################################################################
+
+    def __init__(self, directory: str, version: str = None) -> None:
+        '''
+            Parameters
+            ----------
+            directory: str
+                The root directory of the store.
+
+            version: str, default None
+                The version to open, for example 'v3'. If None the latest
+                version is opened.
+        '''
+
+        if version is None:
+            versions = list_versions(directory)
+            if not versions:
+                raise FileNotFoundError(f'No feature store was found in {directory}.')
+            version = versions[-1]
+
+        path = os.path.join(directory, version)
+        with open(os.path.join(path, 'manifest.json')) as file:
+            self.manifest = json.load(file)
+
+        self.version = version
+        self.stages = self.manifest['stages']
+        self.index_name = self.manifest['index']
+        self.columns = [column['name'] for column in self.manifest['columns']]
+        self.dtypes = {column['name'] : _dtype(column) for column in self.manifest['columns']}
+
+        self._keys = np.load(os.path.join(path, f'{self.index_name}.npy'), mmap_mode = 'r')
+        self._arrays = {
+            column['name'] : np.load(os.path.join(path, column['file']), mmap_mode = 'r')
+            for column in self.manifest['columns']
+        }
+
+    ################################################################################
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, parcelid) -> bool:
+        return bool(self._positions(np.asarray([parcelid]))[1][0])
+
+    ################################################################################
+
+    def get(self, parcelid) -> pd.Series:
+        '''
+            Return the features of one parcel as an object Series, or raise 
+            a KeyError if it is not in the store.
+        '''
+
+        # A single row is read value by value, which is several times 
+        # faster than building a one row DataFrame.
+        positions, found = self._positions(np.asarray([parcelid], dtype = self._keys.dtype))
+        if not found[0]:
+            raise KeyError(parcelid)
+
+        values = {}
+        for name, dtype in self.dtypes.items():
+            value = self._arrays[name][positions[0]]
+            if isinstance(dtype, pd.CategoricalDtype):
+                value = dtype.categories[value] if value >= 0 else np.nan
+            values[name] = value.item() if isinstance(value, np.generic) else value
+
+        return pd.Series(values, name = parcelid, dtype = object)
+
+    ################################################################################
+
+    def get_many(self, parcelids, errors: str = 'raise') -> pd.DataFrame:
+        '''
+            Return the features of a batch of parcels with one binary search
+            for the whole batch.
+
+            Parameters
+            ----------
+            parcelids: array like
+                The parcel ids to look up.
+
+            errors: str, default 'raise'
+                Either 'raise', to raise a KeyError if any of the parcels is
+                not in the store, or 'ignore', to leave the missing parcels
+                out of the result.
+
+            Returns
+            -------
+            DataFrame: The features of each parcel found, indexed by
+                parcelid in the order of parcelids.
+        '''
+
+        parcelids = np.asarray(parcelids, dtype = self._keys.dtype)
+        positions, found = self._positions(parcelids)
+
+        if not found.all():
+            if errors == 'raise':
+                missing = parcelids[~found]
+                raise KeyError(f'{len(missing)} parcels are not in the store, for example {missing[:5].tolist()}.')
+            parcelids, positions = parcelids[found], positions[found]
+
+        return self._frame(positions, pd.Index(parcelids, name = self.index_name))
+
+    ################################################################################
+
+    def to_frame(self) -> pd.DataFrame:
+        '''
+            Return the whole store as a DataFrame sorted by parcelid.
+        '''
+
+        return self._frame(slice(None), pd.Index(np.asarray(self._keys), name = self.index_name))
+
+    ################################################################################
+
+    def _positions(self, parcelids: np.ndarray) -> tuple[np.ndarray]:
+        '''
+            Return the position of each parcel in the store and whether it
+            was found.
+        '''
+
+        positions = np.searchsorted(self._keys, parcelids)
+        found = positions < len(self._keys)
+        found[found] = self._keys[positions[found]] == parcelids[found]
+
+        return positions, found
+
+    def _frame(self, positions, index: pd.Index) -> pd.DataFrame:
+        return pd.DataFrame({
+            name : _decode(self._arrays[name][positions], dtype)
+            for name, dtype in self.dtypes.items()
+        }, index = index)
+
+################################################################################
+
+def write_store(df: pd.DataFrame, directory: str, stages: dict = None) -> str:
+    '''
+        Write df as a new version of the store, replacing its contents.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The features, indexed by parcelid. If a parcel appears more than
+            once its last row is kept. Numeric, boolean, and categorical
+            columns are supported.
+
+        directory: str
+            The root directory of the store.
+
+        stages: dict, default None
+            The fitted preprocessing stages df was built with, as returned 
+            by _fit_stages. prepare_new applies them to new parcels.
+
+        Returns
+        -------
+        str: The version that was written.
+    '''
+
+    df = df[~df.index.duplicated(keep = 'last')].sort_index()
+
+    versions = list_versions(directory)
+    version = f'v{int(versions[-1][1:]) + 1 if versions else 1}'
+    path = os.path.join(directory, version)
+    temporary_path = path + '.tmp'
+
+    # Remove what is left of a write that was interrupted.
+    shutil.rmtree(temporary_path, ignore_errors = True)
+    os.makedirs(temporary_path)
+
+    index_name = df.index.name or KEY_COLUMN
+    np.save(os.path.join(temporary_path, f'{index_name}.npy'), df.index.to_numpy())
+
+    columns = []
+    for position, name in enumerate(df.columns):
+        array, description = _encode(df[name])
+        description.update(name = name, file = f'column_{position}.npy')
+        np.save(os.path.join(temporary_path, description['file']), array)
+        columns.append(description)
+
+    manifest = {
+        'format_version' : FORMAT_VERSION,
+        'version' : version,
+        'created' : datetime.datetime.now().isoformat(timespec = 'seconds'),
+        'index' : index_name,
+        'n_rows' : len(df),
+        'columns' : columns,
+        'stages' : stages
+    }
+    with open(os.path.join(temporary_path, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent = 4)
+
+    os.replace(temporary_path, path)
+
+    # Keep the previous version for readers that still have it open.
+    for old_version in versions[:-1]:
+        shutil.rmtree(os.path.join(directory, old_version), ignore_errors = True)
+
+    return version
+
+################################################################################
+
+def upsert(df: pd.DataFrame, directory: str) -> str:
+    '''
+        Write a new version of the store with the rows of df added, and the
+        rows of parcels already in the store replaced by those of df. The
+        columns of df must match those of the store, and the features must
+        have been built with the stages of the store, for example by
+        prepare_new. The new version keeps those stages.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The new or changed features, indexed by parcelid.
+
+        directory: str
+            The root directory of the store. If it has no store yet df is
+            written as the first version.
+
+        Returns
+        -------
+        str: The version that was written.
+    '''
+
+    if not list_versions(directory):
+        return write_store(df, directory)
+
+    store = FeatureStore(directory)
+    if list(df.columns) != store.columns:
+        raise ValueError(f'The columns of df do not match the columns of the store: {store.columns}.')
+
+    existing = store.to_frame()
+    kept = existing[~existing.index.isin(df.index)]
+
+    return write_store(pd.concat([kept, df]), directory, store.stages)
+
+################################################################################
+
+def materialize_features(
+    df: pd.DataFrame,
+    directory: str,
+    target: str = 'logerror',
+    k: int = 4,
+    random_seed: int = 24
+) -> str:
+    '''
+        Prepare an acquired DataFrame, fit the scaler and KMeans stages on 
+        its training split as prepare_and_split does, and write the scaled 
+        and cluster labeled features of every parcel to the store along 
+        with the fitted stages.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The raw acquired data, which still has the parcelid column, for
+            example the zillow.csv cache read with pd.read_csv.
+
+        directory: str
+            The root directory of the store.
+
+        target: str, default 'logerror'
+            The target variable, which is left out of the store.
+
+        k: int, default 4
+            The number of clusters.
+
+        random_seed: int, default 24
+            The seed for KMeans.
+
+        Returns
+        -------
+        str: The version that was written.
+    '''
+
+    prepared, columns = _prepare_parcels(df)
+    prepared = prepared.drop(columns = [target])
+
+    # The same training split as prepare_and_split.
+    train, _, _ = split_data(prepared, random_seed = 13)
+    stages = {'acquired_columns' : columns, **_fit_stages(train, k, random_seed)}
+
+    return write_store(_apply_stages(prepared, stages), directory, stages)
+
+################################################################################
+
+def prepare_new(df: pd.DataFrame, directory: str, target: str = 'logerror') -> pd.DataFrame:
+    '''
+        Prepare newly acquired parcels with the stages stored in the latest 
+        version of the store and return their features, ready for upsert.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The newly acquired raw data, with the parcelid column.
+
+        directory: str
+            The root directory of the store.
+
+        target: str, default 'logerror'
+            The target variable, which is left out of the features.
+
+        Returns
+        -------
+        DataFrame: The features of the parcels, with the columns of the 
+            store.
+    '''
+
+    store = FeatureStore(directory)
+    if store.stages is None:
+        raise ValueError(f'The store in {directory} was written without stages.')
+
+    # Only the row filters are applied, against the columns the store was 
+    # built from, so whether a parcel is kept does not depend on the rest 
+    # of the batch.
+    prepared, _ = _prepare_parcels(df, store.stages['acquired_columns'])
+    prepared = prepared.drop(columns = [target], errors = 'ignore')
+
+    return _apply_stages(prepared, store.stages)[store.columns]
+
+################################################################################
+
+def list_versions(directory: str) -> list[str]:
+    '''
+        Return the versions in the store, oldest first.
+    '''
+
+    if not os.path.isdir(directory):
+        return []
+
+    versions = [entry for entry in os.listdir(directory) if entry.startswith('v') and entry[1:].isdigit()]
+    return sorted(versions, key = lambda version: int(version[1:]))
+
+################################################################################
+
+def _prepare_parcels(df: pd.DataFrame, columns: list[str] = None) -> tuple:
+    '''
+        Run the AcquireZillow pre preparation and the steps of 
+        prepare_for_model on raw acquired rows, and return the prepared rows 
+        indexed by parcelid along with the acquired columns they were 
+        prepared from. If columns is None they are the columns kept by 
+        drop_missing_values, as in prepare_for_model, otherwise the given 
+        columns are used and only rows are filtered.
+    '''
+
+    # Positions tie each prepared row back to its parcel, since parcelid is
+    # dropped with the other id columns.
+    df = df.reset_index(drop = True)
+    acquired = AcquireZillow()._pre_preparation(df)
+
+    if columns is None:
+        acquired = drop_missing_values(acquired, prop_required_column = 0.8)
+    else:
+        acquired = acquired.reindex(columns = columns)
+
+    prepared = complete_preparation(get_single_unit_properties(acquired))
+    prepared.index = pd.Index(df[KEY_COLUMN].to_numpy()[prepared.index], name = KEY_COLUMN)
+
+    return prepared, list(acquired.columns)
+
+################################################################################
+
+def _fit_stages(train: pd.DataFrame, k: int, random_seed: int) -> dict:
+    '''
+        Fit a min max scaler to the numeric columns of train and KMeans to 
+        the scaled cluster columns, and return them as JSON serializable 
+        lists.
+    '''
+
+    scaled_columns = [column for column in train.columns if column != 'yearbuilt_binned']
+    values = train[scaled_columns].to_numpy(dtype = np.float64)
+    minimum, maximum = values.min(axis = 0), values.max(axis = 0)
+    span = np.where(maximum > minimum, maximum - minimum, 1.0)
+
+    # The same scaling as MinMaxScaler.
+    scaled = (values - minimum) / span
+    positions = [scaled_columns.index(column) for column in cluster_columns]
+    kmeans = KMeans(n_clusters = k, random_state = random_seed).fit(scaled[:, positions])
+
+    return {
+        'scaled_columns' : scaled_columns,
+        'minimum' : minimum.tolist(),
+        'span' : span.tolist(),
+        'cluster_columns' : list(cluster_columns),
+        'centroids' : kmeans.cluster_centers_.tolist()
+    }
+
+def _apply_stages(df: pd.DataFrame, stages: dict) -> pd.DataFrame:
+    '''
+        Return the scaled features of df with the cluster of each row and the 
+        cluster dummies, named as in prepare_and_split.
+    '''
+
+    features = df.copy()
+    columns = stages['scaled_columns']
+    features[columns] = (features[columns].to_numpy(dtype = np.float64) - stages['minimum']) / stages['span']
+
+    centroids = np.asarray(stages['centroids'])
+    clusters = assign_clusters(features[stages['cluster_columns']], centroids)
+
+    features['cluster'] = pd.Categorical(clusters, categories = range(len(centroids)))
+    for cluster in range(1, len(centroids)):
+        features[f'cluster_{cluster}'] = clusters == cluster
+
+    return features
+
+def _encode(values: pd.Series) -> tuple:
+    '''
+        Return a column as a NumPy array and the description needed to turn
+        it back. Categorical and string columns are stored as category codes.
+    '''
+
+    if not isinstance(values.dtype, pd.CategoricalDtype) and not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values)):
+        values = values.astype('category')
+
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.to_numpy(), {'dtype' : str(values.dtype)}
+
+    categories = values.cat.categories
+    description = {'dtype' : 'category', 'ordered' : bool(values.cat.ordered)}
+    if isinstance(categories, pd.IntervalIndex):
+        description.update(breaks = [*categories.left.tolist(), categories.right[-1].item()], closed = categories.closed)
+    else:
+        description.update(categories = categories.tolist())
+
+    return values.cat.codes.to_numpy(), description
+
+def _dtype(description: dict):
+    '''
+        Return the pandas or NumPy dtype of a column from its description in
+        the manifest.
+    '''
+
+    if description['dtype'] != 'category':
+        return np.dtype(description['dtype'])
+
+    if 'breaks' in description:
+        categories = pd.IntervalIndex.from_breaks(description['breaks'], closed = description['closed'])
+    else:
+        categories = description['categories']
+
+    return pd.CategoricalDtype(categories, ordered = description['ordered'])
+
+def _decode(array: np.ndarray, dtype):
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(np.asarray(array), dtype = dtype)
+
+    return np.array(array, dtype = dtype)
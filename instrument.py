@@ -0,0 +1,252 @@
+################################################################################
+#
+#
+#
+#       instrument.py
+#
+#       Description: This file contains the instrumentation used to find slow
+#           stages of the pipeline. The public functions of the acquisition,
+#           preparation, clustering, modeling, and evaluation modules are
+#           wrapped with the instrumented decorator. While instrumentation is
+#           enabled each call records its wall time, CPU time, peak traced
+#           memory, and the shapes of its inputs and outputs. The records are
+#           kept in memory for summary() and optionally appended to a JSON
+#           lines log. While it is disabled a wrapped function costs one
+#           extra check per call.
+#
+#           Calls made inside worker processes are not recorded.
+#
+#       Variables:
+#
+#           records
+#
+#       Functions:
+#
+#           enable(log_file = None, trace_memory = True)
+#           disable()
+#           clear()
+#           instrumented(function)
+#           stage(name, *inputs)
+#           summary()
+#           _start(name, args)
+#           _finish(frame, result, error = None)
+#           _shapes(values)
+#
+#
+################################################################################
+
+import os
+import json
+import time
+import datetime
+import threading
+import functools
+import contextlib
+import tracemalloc
+import pandas as pd
+
+################################################################################
+
+# The records of every instrumented call since the last clear(), in the order
+# the calls finished.
+records = []
+
+_state = {'enabled' : False, 'log_file' : None, 'trace_memory' : True, 'started_tracing' : False}
+_local = threading.local()
+
+################################################################################
+
+def enable(log_file: str = None, trace_memory: bool = True) -> None:
+    '''
+        Start recording instrumented calls.
+
+        Parameters
+        ----------
+        log_file: str, default None
+            A file each record is appended to as one line of JSON.
+
+        trace_memory: bool, default True
+            If True peak memory is measured with tracemalloc, which slows
+            down code that allocates many small Python objects. If False
+            only times and shapes are recorded.
+    '''
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _state['started_tracing'] = True
+
+    _state.update(enabled = True, log_file = log_file, trace_memory = trace_memory)
+
+################################################################################
+
+def disable() -> None:
+    '''
+        Stop recording instrumented calls. The records are kept.
+    '''
+
+    if _state['started_tracing']:
+        tracemalloc.stop()
+        _state['started_tracing'] = False
+
+    _state.update(enabled = False, log_file = None)
+
+################################################################################
+
+def clear() -> None:
+    '''
+        Remove every record.
+    '''
+
+    records.clear()
+
+################################################################################
+
+def instrumented(function):
+    '''
+        Wrap a function so that its calls are recorded while instrumentation
+        is enabled.
+    '''
+
+    name = f'{function.__module__}.{function.__qualname__}'
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _state['enabled']:
+            return function(*args, **kwargs)
+
+        frame = _start(name, (*args, *kwargs.values()))
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            _finish(frame, None, error)
+            raise
+
+        _finish(frame, result)
+
+        return result
+
+    return wrapper
+
+################################################################################
+
+@contextlib.contextmanager
+def stage(name: str, *inputs):
+    '''
+        Record a block of code as one call named name, for example a cell of
+        a notebook. The shapes of inputs are recorded as its inputs.
+    '''
+
+    if not _state['enabled']:
+        yield
+        return
+
+    frame = _start(name, inputs)
+    try:
+        yield
+    except BaseException as error:
+        _finish(frame, None, error)
+        raise
+
+    _finish(frame, None)
+
+################################################################################
+
+def summary() -> pd.DataFrame:
+    '''
+        Return one row per instrumented function with its number of calls,
+        total and mean wall time, total CPU time, and largest peak memory,
+        sorted by total wall time. Nested calls are counted in their own
+        row and in the rows of the calls that contain them.
+    '''
+
+    columns = ['calls', 'wall_seconds', 'mean_wall_seconds', 'cpu_seconds', 'peak_memory_mb']
+    if not records:
+        return pd.DataFrame(columns = columns)
+
+    df = pd.DataFrame(records)
+
+    return df.groupby('function').agg(
+        calls = ('wall_seconds', 'size'),
+        wall_seconds = ('wall_seconds', 'sum'),
+        mean_wall_seconds = ('wall_seconds', 'mean'),
+        cpu_seconds = ('cpu_seconds', 'sum'),
+        peak_memory_mb = ('peak_memory_mb', 'max')
+    ).sort_values('wall_seconds', ascending = False)
+
+################################################################################
+
+def _start(name: str, args: tuple) -> dict:
+    stack = _local.__dict__.setdefault('stack', [])
+
+    # tracemalloc keeps a single peak, so before resetting it for this call
+    # save the peak reached so far by the enclosing call.
+    tracing = _state['trace_memory'] and tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['observed_peak'] = max(stack[-1]['observed_peak'], peak)
+        tracemalloc.reset_peak()
+    else:
+        current = 0
+
+    frame = {
+        'function' : name,
+        'started' : datetime.datetime.now().isoformat(timespec = 'milliseconds'),
+        'depth' : len(stack),
+        'input_shapes' : _shapes(args),
+        'tracing' : tracing,
+        'start_memory' : current,
+        'observed_peak' : 0,
+        'wall_start' : time.perf_counter(),
+        'cpu_start' : time.process_time()
+    }
+    stack.append(frame)
+
+    return frame
+
+def _finish(frame: dict, result, error: BaseException = None) -> None:
+    wall_seconds = time.perf_counter() - frame['wall_start']
+    cpu_seconds = time.process_time() - frame['cpu_start']
+
+    _local.stack.pop()
+
+    peak_memory_mb = None
+    if frame['tracing'] and tracemalloc.is_tracing():
+        peak = max(tracemalloc.get_traced_memory()[1], frame['observed_peak'])
+        peak_memory_mb = (peak - frame['start_memory']) / 2 ** 20
+
+        # Let the enclosing call see this call's peak.
+        if _local.stack:
+            _local.stack[-1]['observed_peak'] = max(_local.stack[-1]['observed_peak'], peak)
+
+    record = {
+        'function' : frame['function'],
+        'started' : frame['started'],
+        'depth' : frame['depth'],
+        'pid' : os.getpid(),
+        'wall_seconds' : wall_seconds,
+        'cpu_seconds' : cpu_seconds,
+        'peak_memory_mb' : peak_memory_mb,
+        'input_shapes' : frame['input_shapes'],
+        'output_shapes' : _shapes(result if isinstance(result, (tuple, list)) else (result,)),
+        'error' : None if error is None else type(error).__name__
+    }
+    records.append(record)
+
+    if _state['log_file'] is not None:
+        with open(_state['log_file'], 'a') as file:
+            file.write(json.dumps(record) + '\n')
+
+def _shapes(values) -> list[list[int]]:
+    '''
+        Return the (rows, columns) of every DataFrame, Series, or array in
+        values. A Series or 1-D array has one column.
+    '''
+
+    shapes = []
+    for value in values:
+        shape = getattr(value, 'shape', None)
+        if isinstance(shape, tuple) and len(shape) in (1, 2):
+            shapes.append([int(shape[0]), int(shape[1]) if len(shape) == 2 else 1])
+
+    return shapes
@@ -8,27 +8,104 @@
 #
 #       Variables:
 #
-#           variables
+#           estimators
+#           feature_sets
+#           model_labels
+#           sparse_estimators
+#           sparse_features
+#           sparse_model_labels
 #
 #       Functions:
 #
 #           establish_baseline(target)
+#           create_models(df, n_jobs = 1, backend = 'process', return_stats = False, cache = None, sparse = False)
+#           create_cluster_models(df, features = None, target = 'logerror', cluster_column = 'cluster', n_jobs = 1)
+#           evaluate_models(baseline, models, train, validate, target)
+#           evaluate_on_test(model, test, target)
+#           bootstrap_models(baseline, models, df, target, n_resamples = 2_000, confidence = 0.95, n_jobs = 1)
+#           _labels(models)
 #
 #
 #
 ################################################################################
 
+import os
+import numpy as np
 import pandas as pd
 
-from sklearn.linear_model import LinearRegression, LassoLars, TweedieRegressor
+from sklearn.base import clone
+from sklearn.linear_model import LinearRegression, LassoLars, TweedieRegressor, Ridge
 from sklearn.preprocessing import PolynomialFeatures
 from sklearn.pipeline import make_pipeline
-from sklearn.metrics import mean_squared_error
+from threadpoolctl import threadpool_limits
 
-from _model import Model
+from _model import Model, ClusterModel
+from _metrics import regression_metrics
+from bootstrap import bootstrap_rmse
+from scheduler import fit_models, map_jobs
+from sparse_encoding import SparseEncoder
+from instrument import instrumented
 
 ################################################################################
 
+# Unfitted estimators for each model type. Use sklearn's clone to get a fresh 
+# copy before fitting.
+estimators = {
+    'linear_regression' : LinearRegression(),
+    'tweedie_regressor' : TweedieRegressor(),
+    'polynomial_regression' : make_pipeline(PolynomialFeatures(include_bias = False), LinearRegression()),
+    'polynomial_regression_interactions_only' : make_pipeline(PolynomialFeatures(include_bias = False, interaction_only = True), LinearRegression())
+}
+
+# The feature sets each estimator type is fit on. A model's label is the 
+# estimator name followed by the feature set name.
+feature_sets = {
+    'no_clusters' : [
+        'square_feet',
+        'non_average_zip_code',
+        'tax_assessed_value'
+    ],
+    'with_clusters' : [
+        'square_feet',
+        'non_average_zip_code',
+        'tax_assessed_value',
+        'cluster_1',
+        'cluster_2',
+        'cluster_3'
+    ]
+}
+
+# The labels of the models returned by create_models, in order.
+model_labels = [
+    f'{name}_{feature_set}'
+    for feature_set in feature_sets
+    for name in estimators
+]
+
+# Estimators fit on the sparse one hot encoding of zip_code and cluster. 
+# Every zip code gets its own effect, so the ridge penalty keeps the effects 
+# of zip codes with few properties close to zero.
+sparse_estimators = {
+    'sparse_linear_regression' : make_pipeline(SparseEncoder(n_categorical = 2), LinearRegression()),
+    'sparse_ridge' : make_pipeline(SparseEncoder(n_categorical = 2), Ridge()),
+    'sparse_polynomial_ridge' : make_pipeline(SparseEncoder(n_categorical = 2, degree = 2), Ridge())
+}
+
+# The features of the sparse estimators. The categorical features must come 
+# last.
+sparse_features = [
+    'square_feet',
+    'tax_assessed_value',
+    'zip_code',
+    'cluster'
+]
+
+# The labels of the models added by create_models when sparse is True.
+sparse_model_labels = [f'{name}_zip_codes' for name in sparse_estimators]
+
+################################################################################
+
+@instrumented
 def establish_baseline(target: pd.DataFrame) -> pd.Series:
     '''
         Determine whether to use the mean of the target or the median of the 
@@ -45,78 +122,222 @@ def establish_baseline(target: pd.DataFrame) -> pd.Series:
             median and mean of the target variable.
     '''
 
-    baseline = pd.DataFrame({
-        'median' : [target.median()] * target.size,
-        'mean' : [target.mean()] * target.size
-    })
+    values = np.asarray(target, dtype = np.float64).ravel()
+    candidates = {'mean' : values.mean(), 'median' : np.median(values)}
 
-    median_rmse = mean_squared_error(target, baseline["median"], squared = False)
-    mean_rmse = mean_squared_error(target, baseline["mean"], squared = False)
+    # The candidates are scored as constants, so no array of them is built 
+    # until the chosen baseline is returned.
+    name = min(candidates, key = lambda name: regression_metrics(values, candidates[name]).RMSE)
 
-    return baseline['median'] if median_rmse < mean_rmse else baseline['mean']
+    return pd.Series(candidates[name], index = range(values.size), name = name)
 
 ################################################################################
 
-def create_models(df):
-    models = []
-    features = [
-        'square_feet',
-        'non_average_zip_code',
-        'tax_assessed_value'
-    ]
-    target = 'logerror'
+@instrumented
+def create_models(df, n_jobs = 1, backend = 'process', return_stats = False, cache = None, sparse = False):
+    '''
+        Fit each estimator type in estimators on the base features and again 
+        on the base features plus the cluster dummies, and optionally each 
+        estimator in sparse_estimators on the sparse features. The fits are 
+        run concurrently by the training scheduler.
+    
+        Parameters
+        ----------
+        df: DataFrame
+            The training dataset.
 
-    models.append(Model(LinearRegression(), df, features, target))
-    models.append(Model(TweedieRegressor(), df, features, target))
-    models.append(Model(make_pipeline(PolynomialFeatures(include_bias = False), LinearRegression()), df, features, target))
-    models.append(Model(make_pipeline(PolynomialFeatures(include_bias = False, interaction_only = True), LinearRegression()), df, features, target))
+        n_jobs: int, default 1
+            The number of workers. If 1 the models are fit one after another 
+            in the current process. If None the number of cores is used.
 
-    features = [
-        'square_feet',
-        'non_average_zip_code',
-        'tax_assessed_value',
-        'cluster_1',
-        'cluster_2',
-        'cluster_3'
+        backend: str, default 'process'
+            The scheduler backend, either 'process' or 'thread'.
+
+        return_stats: bool, default False
+            If True the per-job timing and memory statistics are returned 
+            along with the models.
+
+        cache: FeatureCache, default None
+            If provided the models share their feature matrices and 
+            polynomial expansions, both while fitting and when making 
+            predictions in evaluate_models.
+
+        sparse: bool, default False
+            If True the models of sparse_estimators are fit on 
+            sparse_features and returned after the eight dense models. df 
+            must contain the cluster column.
+    
+        Returns
+        -------
+        list[Model] | tuple: The fitted models, and the job statistics if 
+            return_stats is True.
+    '''
+
+    target = 'logerror'
+
+    specs = [
+        (clone(estimator), features, target)
+        for features in feature_sets.values()
+        for estimator in estimators.values()
     ]
 
-    models.append(Model(LinearRegression(), df, features, target))
-    models.append(Model(TweedieRegressor(), df, features, target))
-    models.append(Model(make_pipeline(PolynomialFeatures(include_bias = False), LinearRegression()), df, features, target))
-    models.append(Model(make_pipeline(PolynomialFeatures(include_bias = False, interaction_only = True), LinearRegression()), df, features, target))
+    if sparse:
+        specs += [(clone(estimator), sparse_features, target) for estimator in sparse_estimators.values()]
 
-    return models
+    models, stats = fit_models(specs, df, n_jobs, backend, cache)
+
+    return (models, stats) if return_stats else models
 
 ################################################################################
 
+@instrumented
+def create_cluster_models(
+    df: pd.DataFrame,
+    features: list[str] = None,
+    target: str = 'logerror',
+    cluster_column: str = 'cluster',
+    n_jobs: int = 1
+) -> dict[str, ClusterModel]:
+    '''
+        Train one model per cluster for each of the estimator types in 
+        estimators. The (estimator, cluster) fits run concurrently in a 
+        process pool.
+    
+        Parameters
+        ----------
+        df: DataFrame
+            The training dataset. Must contain the features, the target, and 
+            the cluster column.
+
+        features: list[str], default None
+            The features to train on. Defaults to square_feet, 
+            non_average_zip_code, and tax_assessed_value.
+
+        target: str, default 'logerror'
+            The target variable.
+
+        cluster_column: str, default 'cluster'
+            The column holding the cluster of each row.
+
+        n_jobs: int, default 1
+            The number of worker processes. If 1 the models are fit in the 
+            current process. If None the number of cores is used.
+    
+        Returns
+        -------
+        dict[str, ClusterModel]: A ClusterModel for each estimator type, keyed 
+            by the names in estimators with a _per_cluster suffix.
+    '''
+
+    if features is None:
+        features = feature_sets['no_clusters']
+
+    data = df[features + [target, cluster_column]]
+    clusters = sorted(data[cluster_column].unique())
+    jobs = [(name, cluster) for name in estimators for cluster in clusters]
+    n_jobs = min(n_jobs or os.cpu_count(), len(jobs))
+
+    # The training data is sent to each worker once rather than once per fit.
+    values = {'df' : data, 'features' : features, 'target' : target, 'cluster_column' : cluster_column}
+    fitted = map_jobs(_fit_cluster_model, jobs, n_jobs, values = values)
+
+    models = {}
+    for (name, cluster), model in zip(jobs, fitted):
+        models.setdefault(name, {})[cluster] = model
+
+    return {
+        f'{name}_per_cluster' : ClusterModel(cluster_models, cluster_column)
+        for name, cluster_models in models.items()
+    }
+
+################################################################################
+
+_worker_state = {}
+
+def _fit_cluster_model(name, cluster):
+    df = _worker_state['df']
+    train = df[df[_worker_state['cluster_column']] == cluster]
+
+    # Limit each fit to one thread so that the fits do not compete for cores.
+    with threadpool_limits(1):
+        return Model(clone(estimators[name]), train, _worker_state['features'], _worker_state['target'])
+
+################################################################################
+
+@instrumented
 def evaluate_models(baseline, models, train, validate, target):
     results = {
         'baseline' : {
-            'RMSE_train' : mean_squared_error(train[target], baseline, squared = False),
-            'RMSE_validate' : mean_squared_error(validate[target], pd.Series([baseline[0]] * validate.shape[0]), squared = False)
+            'RMSE_train' : regression_metrics(train[target], baseline.iloc[0]).RMSE,
+            'RMSE_validate' : regression_metrics(validate[target], baseline.iloc[0]).RMSE
         }
     }
 
-    labels = [
-        'linear_regression_no_clusters',
-        'tweedie_regressor_no_clusters',
-        'polynomial_regression_no_clusters',
-        'polynomial_regression_interactions_only_no_clusters',
-        'linear_regression_with_clusters',
-        'tweedie_regressor_with_clusters',
-        'polynomial_regression_with_clusters',
-        'polynomial_regression_interactions_only_with_clusters'
-    ]
-
-    for index, label in enumerate(labels):
+    for label, model in zip(_labels(models), models):
         results[label] = {
-            'RMSE_train' : mean_squared_error(train[target], models[index].make_predictions(train), squared = False),
-            'RMSE_validate' : mean_squared_error(validate[target], models[index].make_predictions(validate), squared = False)
+            'RMSE_train' : regression_metrics(train[target], model.make_predictions(train)).RMSE,
+            'RMSE_validate' : regression_metrics(validate[target], model.make_predictions(validate)).RMSE
         }
 
     return pd.DataFrame(results).T
 
 ################################################################################
 
+@instrumented
 def evaluate_on_test(model, test, target):
-    print(f'RMSE_test: {mean_squared_error(test[target], model.make_predictions(test), squared = False)}')
\ No newline at end of file
+    print(f'RMSE_test: {regression_metrics(test[target], model.make_predictions(test)).RMSE}')
+
+################################################################################
+
+@instrumented
+def bootstrap_models(baseline, models, df, target, n_resamples = 2_000, confidence = 0.95, n_jobs = 1):
+    '''
+        Bootstrap confidence intervals for the RMSE of the baseline and the 
+        models from create_models on a dataset, and for the difference 
+        between each model's RMSE and the baseline's.
+    
+        Parameters
+        ----------
+        baseline: Series
+            The baseline from establish_baseline.
+
+        models: list[Model]
+            The models from create_models.
+
+        df: DataFrame
+            The dataset to score on, for example validate.
+
+        target: str
+            The target variable.
+
+        n_resamples: int, default 2_000
+            The number of bootstrap resamples.
+
+        confidence: float, default 0.95
+            The confidence level of the intervals.
+
+        n_jobs: int, default 1
+            The number of worker processes. If 1 the resamples are drawn in 
+            the current process. If None the number of cores is used.
+    
+        Returns
+        -------
+        DataFrame: The RMSE, difference from the baseline, their intervals, 
+            and the share of resamples where each model beat the baseline.
+    '''
+
+    predictions = {'baseline' : baseline.iloc[0]}
+    for label, model in zip(_labels(models), models):
+        predictions[label] = model.make_predictions(df)
+
+    return bootstrap_rmse(df[target], predictions, n_resamples = n_resamples, confidence = confidence, n_jobs = n_jobs)
+
+################################################################################
+
+def _labels(models: list) -> list[str]:
+    '''
+        Return the labels of the models from create_models, with those of 
+        the sparse models if they were fit.
+    '''
+
+    return (model_labels + sparse_model_labels)[:len(models)]
@@ -0,0 +1,262 @@
+################################################################################
+#
+#
+#
+#       model_store.py
+#
+#       Description: This file contains functions for saving fitted Model
+#           objects to a versioned on disk store and loading them back. The
+#           coefficients of linear and polynomial models are saved as .npy
+#           files that are memory mapped on load, so a scoring process can
+#           load a model in milliseconds without importing sklearn.
+#           Loaded models are evaluated by the CompiledModel in _predictor.py.
+#
+#           Store layout:
+#
+#               <directory>/<name>/<version>/manifest.json
+#               <directory>/<name>/<version>/<array>.npy
+#               <directory>/<name>/<version>/model.pkl
+#
+#       Variables:
+#
+#           FORMAT_VERSION
+#
+#       Class:
+#
+#           StoredModel
+#
+#       Functions:
+#
+#           save_model(model, directory, name, metadata = None)
+#           load_model(directory, name, version = None, full = False, verify = False)
+#           list_versions(directory, name)
+#           _describe(estimator)
+#           _fingerprint(manifest, arrays)
+#
+#
+################################################################################
+
+import os
+import json
+import pickle
+import hashlib
+import datetime
+import numpy as np
+
+from _predictor import CompiledModel, compile_model
+
+################################################################################
+
+FORMAT_VERSION = 2
+
+################################################################################
+
+class StoredModel(CompiledModel):
+    '''
+        A CompiledModel loaded from the model store, along with the manifest 
+        it was saved with. Its arrays are memory mapped.
+    '''
+
+    ################################################################################
+
+    def __init__(self, manifest: dict, arrays: dict[str, np.ndarray]) -> None:
+        super().__init__(
+            manifest['features'],
+            manifest['target'],
+            arrays['coef'],
+            arrays['intercept'][0],
+            arrays.get('powers'),
+            manifest['link']
+        )
+
+        self.manifest = manifest
+        self.metadata = manifest['metadata']
+
+################################################################################
+
+def save_model(model, directory: str, name: str, metadata: dict = None) -> str:
+    '''
+        Save a fitted Model as a new version of name in the store.
+
+        The Model is always pickled so that load_model(full = True) can return
+        it unchanged. If the Model can be compiled (see _predictor.py) the
+        arrays of the CompiledModel are also saved as .npy files for fast
+        loading.
+
+        Parameters
+        ----------
+        model: Model
+            A fitted Model.
+
+        directory: str
+            The root directory of the store.
+
+        name: str
+            The name of the model, for example 'polynomial_regression_with_clusters'.
+
+        metadata: dict, default None
+            Any JSON serializable preprocessing information the scoring side
+            needs, such as the scaled columns or the cluster centroids.
+
+        Returns
+        -------
+        str: The version that was written.
+    '''
+
+    versions = list_versions(directory, name)
+    version = f'v{int(versions[-1][1:]) + 1 if versions else 1}'
+    path = os.path.join(directory, name, version)
+    temporary_path = path + '.tmp'
+    os.makedirs(temporary_path)
+
+    try:
+        compiled = compile_model(model)
+        arrays, link = compiled.arrays(), compiled.link
+    except ValueError:
+        arrays, link = {}, None
+
+    manifest = {
+        'format_version' : FORMAT_VERSION,
+        'name' : name,
+        'version' : version,
+        'created' : datetime.datetime.now().isoformat(timespec = 'seconds'),
+        'estimator' : _describe(model.model),
+        'compiled' : bool(arrays),
+        'link' : link,
+        'features' : list(model.features),
+        'target' : model.target,
+        'metadata' : metadata or {},
+        'arrays' : sorted(arrays)
+    }
+    manifest['fingerprint'] = _fingerprint(manifest, arrays)
+
+    for array_name, array in arrays.items():
+        np.save(os.path.join(temporary_path, f'{array_name}.npy'), array)
+
+    # The feature cache is tied to this process and is not saved.
+    cache = getattr(model, 'cache', None)
+    if cache is not None:
+        model.cache = None
+    try:
+        with open(os.path.join(temporary_path, 'model.pkl'), 'wb') as file:
+            pickle.dump(model, file, protocol = pickle.HIGHEST_PROTOCOL)
+    finally:
+        if cache is not None:
+            model.cache = cache
+
+    with open(os.path.join(temporary_path, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent = 4)
+
+    os.replace(temporary_path, path)
+
+    return version
+
+################################################################################
+
+def load_model(directory: str, name: str, version: str = None, full: bool = False, verify: bool = False):
+    '''
+        Load a model from the store.
+
+        Parameters
+        ----------
+        directory: str
+            The root directory of the store.
+
+        name: str
+            The name of the model.
+
+        version: str, default None
+            The version to load, for example 'v3'. If None the latest version
+            is loaded.
+
+        full: bool, default False
+            If True the pickled Model is returned, which requires sklearn.
+            Otherwise a StoredModel, a CompiledModel backed by memory 
+            mapped arrays, is returned.
+
+        verify: bool, default False
+            If True the fingerprint of the arrays is checked against the
+            manifest and a ValueError is raised if they do not match.
+
+        Returns
+        -------
+        StoredModel | Model: The loaded model.
+    '''
+
+    if version is None:
+        versions = list_versions(directory, name)
+        if not versions:
+            raise FileNotFoundError(f'No versions of {name} were found in {directory}.')
+        version = versions[-1]
+
+    path = os.path.join(directory, name, version)
+
+    if full:
+        with open(os.path.join(path, 'model.pkl'), 'rb') as file:
+            return pickle.load(file)
+
+    with open(os.path.join(path, 'manifest.json')) as file:
+        manifest = json.load(file)
+
+    # Version 1 manifests have no compiled flag and may have no powers array.
+    if not manifest.get('compiled', manifest['estimator'] is not None):
+        raise ValueError(f'{name} {version} can only be loaded with full = True.')
+
+    arrays = {
+        array_name : np.load(os.path.join(path, f'{array_name}.npy'), mmap_mode = 'r')
+        for array_name in manifest['arrays']
+    }
+
+    if verify and _fingerprint(manifest, arrays) != manifest['fingerprint']:
+        raise ValueError(f'The arrays of {name} {version} do not match its manifest.')
+
+    return StoredModel(manifest, arrays)
+
+################################################################################
+
+def list_versions(directory: str, name: str) -> list[str]:
+    '''
+        Return the versions of name in the store, oldest first.
+    '''
+
+    path = os.path.join(directory, name)
+    if not os.path.isdir(path):
+        return []
+
+    versions = [entry for entry in os.listdir(path) if entry.startswith('v') and entry[1:].isdigit()]
+    return sorted(versions, key = lambda version: int(version[1:]))
+
+################################################################################
+
+def _describe(estimator) -> str:
+    '''
+        Return a short description of an estimator such as 
+        'PolynomialFeatures -> LinearRegression'.
+    '''
+
+    steps = getattr(estimator, 'steps', None)
+    if steps is None:
+        return type(estimator).__name__
+
+    return ' -> '.join(type(step).__name__ for _, step in steps)
+
+################################################################################
+
+def _fingerprint(manifest: dict, arrays: dict[str, np.ndarray]) -> str:
+    '''
+        Return a sha256 fingerprint of the estimator, features, target, and
+        array contents of a model.
+    '''
+
+    digest = hashlib.sha256(json.dumps([
+        manifest['estimator'],
+        manifest['link'],
+        manifest['features'],
+        manifest['target']
+    ]).encode())
+
+    for array_name in sorted(arrays):
+        digest.update(array_name.encode())
+        digest.update(np.ascontiguousarray(arrays[array_name]).tobytes())
+
+    return digest.hexdigest()
@@ -0,0 +1,200 @@
+################################################################################
+#
+#
+#
+#       plotting.py
+#
+#       Description: This file contains functions for drawing large scatter
+#           plots as density images. Points are binned into a 2-D grid with
+#           NumPy and the grid is drawn as a single raster image, so the time
+#           to draw a plot and the size of the saved figure do not grow with
+#           the number of rows. An optional stratified sample of the points
+#           can be drawn on top, for example to show cluster membership.
+#           Matplotlib and seaborn are only imported when a plot is drawn.
+#
+#       Variables:
+#
+#           plot_backends
+#
+#       Functions:
+#
+#           density_grid(x, y, bins = 200, extent = None)
+#           stratified_sample(df, column = None, n = 2_000, random_seed = 24)
+#           density_plot(x, y, ax = None, bins = 200, extent = None, cmap = 'viridis', overlay = None, hue = None)
+#           check_backend(backend)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+
+################################################################################
+
+# The backends accepted by the plotting functions in explore.py and
+# evaluate.py. 'scatter' draws every point; 'density' draws a binned image.
+plot_backends = ('scatter', 'density')
+
+################################################################################
+
+def density_grid(x, y, bins: int = 200, extent: tuple[float] = None) -> tuple:
+    '''
+        Count the points falling in each cell of a bins x bins grid.
+
+        Parameters
+        ----------
+        x: Series | ndarray
+            The horizontal coordinates. Missing values are dropped.
+
+        y: Series | ndarray
+            The vertical coordinates.
+
+        bins: int, default 200
+            The number of cells along each axis.
+
+        extent: tuple[float], default None
+            The (x_min, x_max, y_min, y_max) of the grid. Defaults to the
+            range of the data.
+
+        Returns
+        -------
+        tuple: The (bins, bins) array of counts indexed [y, x] and the
+            extent of the grid.
+    '''
+
+    x = np.asarray(x, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+
+    mask = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[mask], y[mask]
+
+    if extent is None:
+        extent = (x.min(), x.max(), y.min(), y.max()) if len(x) else (0, 1, 0, 1)
+
+    # Widen a degenerate range so every point lands inside the grid.
+    x_min, x_max, y_min, y_max = extent
+    if x_min == x_max:
+        x_min, x_max = x_min - 0.5, x_max + 0.5
+    if y_min == y_max:
+        y_min, y_max = y_min - 0.5, y_max + 0.5
+    extent = (x_min, x_max, y_min, y_max)
+
+    counts, _, _ = np.histogram2d(y, x, bins = bins, range = [[y_min, y_max], [x_min, x_max]])
+
+    return counts, extent
+
+################################################################################
+
+def stratified_sample(df: pd.DataFrame, column: str = None, n: int = 2_000, random_seed: int = 24) -> pd.DataFrame:
+    '''
+        Return a sample of about n rows. If a column is given, every value of
+        it is represented: each gets a share of n proportional to its size,
+        but at least one row.
+    '''
+
+    if len(df) <= n:
+        return df
+
+    if column is None:
+        return df.sample(n, random_state = random_seed)
+
+    fraction = n / len(df)
+    rng = np.random.default_rng(random_seed)
+
+    positions = [
+        rng.choice(group, max(int(round(len(group) * fraction)), 1), replace = False)
+        for group in df.groupby(column, observed = True).indices.values()
+    ]
+
+    return df.iloc[np.sort(np.concatenate(positions))]
+
+################################################################################
+
+def density_plot(
+    x,
+    y,
+    ax = None,
+    bins: int = 200,
+    extent: tuple[float] = None,
+    cmap: str = 'viridis',
+    overlay: pd.DataFrame = None,
+    hue: str = None
+):
+    '''
+        Draw the density of the points (x, y) as an image on a log color
+        scale, optionally with a sample of points drawn on top.
+
+        Parameters
+        ----------
+        x: Series | ndarray
+            The horizontal coordinates.
+
+        y: Series | ndarray
+            The vertical coordinates.
+
+        ax: Axes, default None
+            The axes to draw on. Defaults to the current axes.
+
+        bins: int, default 200
+            The number of cells along each axis.
+
+        extent: tuple[float], default None
+            The (x_min, x_max, y_min, y_max) of the grid. Defaults to the
+            range of the data.
+
+        cmap: str, default 'viridis'
+            The colormap of the density image.
+
+        overlay: DataFrame, default None
+            Points to draw on top of the image, for example from
+            stratified_sample. Must contain columns named like x and y.
+
+        hue: str, default None
+            The overlay column used to color the overlay points.
+
+        Returns
+        -------
+        Axes: The axes drawn on.
+    '''
+
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.colors import LogNorm
+
+    if ax is None:
+        ax = plt.gca()
+
+    counts, extent = density_grid(x, y, bins, extent)
+
+    ax.imshow(
+        np.ma.masked_equal(counts, 0),
+        origin = 'lower',
+        extent = extent,
+        aspect = 'auto',
+        interpolation = 'nearest',
+        cmap = cmap,
+        norm = LogNorm(vmin = 1, vmax = max(counts.max(), 1))
+    )
+
+    if overlay is not None:
+        sns.scatterplot(
+            data = overlay,
+            x = getattr(x, 'name', None),
+            y = getattr(y, 'name', None),
+            hue = hue,
+            s = 8,
+            alpha = 0.6,
+            linewidth = 0,
+            ax = ax
+        )
+
+    ax.set_xlabel(getattr(x, 'name', None) or '')
+    ax.set_ylabel(getattr(y, 'name', None) or '')
+
+    return ax
+
+################################################################################
+
+def check_backend(backend: str) -> None:
+    if backend not in plot_backends:
+        raise ValueError(f'backend must be one of {plot_backends}.')
@@ -0,0 +1,200 @@
+################################################################################
+#
+#
+#
+#       polars_prepare.py
+#
+#       Description: This file contains a Polars engine for prepare_for_model.
+#           The preparation is expressed as one lazy query over the cached
+#           zillow.csv extract, so Polars can push the column selection and
+#           row filters down into the csv scan and run the query on all
+#           cores. The result is the same DataFrame prepare_for_model
+#           returns. Polars is an optional dependency.
+#
+#       Variables:
+#
+#           None
+#
+#       Functions:
+#
+#           scan_zillow(file_name = 'zillow.csv')
+#           build_query(frame)
+#           prepare_for_model_polars(source = 'zillow.csv')
+#           check_parity(file_name = 'zillow.csv')
+#           _require_polars()
+#           _from_pandas(df)
+#           _to_pandas(df, index)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+from acquire import AcquireZillow, drop_columns
+from prepare import (
+    prepare_for_model,
+    single_unit_property_types,
+    non_average_zip_codes,
+    year_built_bins,
+    renamed_columns,
+    model_columns
+)
+
+################################################################################
+
+def scan_zillow(file_name: str = 'zillow.csv'):
+    '''
+        Return a LazyFrame over a zillow csv cache with the columns dropped by
+        AcquireZillow removed and a _row column holding each row's position
+        in the file, which is the index pandas gives it.
+    '''
+
+    _require_polars()
+
+    # Columns are typed from the first 10,000 rows rather than the default
+    # 100. Typing them from the whole file, as pandas does, costs a full
+    # extra pass over it.
+    frame = pl.scan_csv(file_name, row_index_name = '_row', infer_schema_length = 10_000)
+
+    return frame.drop(drop_columns, strict = False)
+
+################################################################################
+
+def build_query(frame):
+    '''
+        Return the lazy query computing prepare_for_model (without an
+        imputer) over frame, apart from yearbuilt_binned.
+
+        Columns that are less than 80% filled are dropped first, which
+        needs the null count of every column, so the null counts are
+        computed in a first pass over frame. The returned query keeps _row
+        and yearbuilt, which _to_pandas turns into the index and
+        yearbuilt_binned.
+    '''
+
+    _require_polars()
+
+    schema = frame.collect_schema()
+    columns = [column for column in schema.names() if column != '_row']
+    counts = frame.select(pl.len().alias('_rows'), *(pl.col(column).null_count() for column in columns)).collect().row(0, named = True)
+
+    # The thresholds of drop_missing_values(prop_required_column = 0.8)
+    # followed by drop_missing_values(prop_required_row = 1).
+    threshold = round(counts['_rows'] * 0.8)
+    kept = [column for column in columns if counts['_rows'] - counts[column] >= threshold]
+
+    # pandas reads integer columns with missing values as floats.
+    casts = [
+        pl.col(column).cast(pl.Float64)
+        for column in kept
+        if counts[column] > 0 and schema[column].is_integer()
+    ]
+
+    return (
+        frame
+        .select(['_row', *kept])
+        .drop_nulls(kept)
+        .filter(pl.col('propertylandusedesc').is_in(single_unit_property_types))
+        .with_columns(*casts)
+        .with_columns(
+            property_age = 2017 - pl.col('yearbuilt'),
+            non_average_zip_code = pl.col('regionidzip').cast(pl.Float64).is_in(non_average_zip_codes)
+        )
+        .rename(renamed_columns)
+        .select(['_row', 'yearbuilt', *(column for column in model_columns if column != 'yearbuilt_binned')])
+    )
+
+################################################################################
+
+def prepare_for_model_polars(source = 'zillow.csv') -> pd.DataFrame:
+    '''
+        Prepare the zillow data with the Polars engine and return the same
+        DataFrame as prepare_for_model.
+
+        Parameters
+        ----------
+        source: str | DataFrame | LazyFrame, default 'zillow.csv'
+            The path of a zillow csv cache, an acquired pandas DataFrame
+            (as returned by AcquireZillow().get_data()), or a Polars
+            LazyFrame from scan_zillow.
+
+        Returns
+        -------
+        DataFrame: The prepared pandas DataFrame.
+    '''
+
+    _require_polars()
+
+    index = None
+    if isinstance(source, str):
+        frame = scan_zillow(source)
+    elif isinstance(source, pd.DataFrame):
+        frame, index = _from_pandas(source), source.index
+    else:
+        frame = source
+
+    return _to_pandas(build_query(frame).collect(), index)
+
+################################################################################
+
+def check_parity(file_name: str = 'zillow.csv') -> bool:
+    '''
+        Prepare a zillow csv cache with both engines and raise an
+        AssertionError if the results differ. Returns True otherwise.
+    '''
+
+    expected = prepare_for_model(AcquireZillow()._pre_preparation(pd.read_csv(file_name)))
+
+    pd.testing.assert_frame_equal(prepare_for_model_polars(file_name), expected)
+
+    return True
+
+################################################################################
+
+def _require_polars() -> None:
+    if pl is None:
+        raise ImportError('The polars engine requires polars. Install it with pip install polars.')
+
+def _from_pandas(df: pd.DataFrame):
+    '''
+        Convert a pandas DataFrame to a LazyFrame without pyarrow, turning
+        missing values into nulls.
+    '''
+
+    columns = {'_row' : np.arange(len(df))}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            columns[column] = pl.Series(column, values.to_numpy(), nan_to_null = True)
+        else:
+            columns[column] = pl.Series(column, values.astype(object).where(values.notna(), None).tolist())
+
+    return pl.DataFrame(columns).lazy()
+
+def _to_pandas(df, index: pd.Index = None) -> pd.DataFrame:
+    '''
+        Convert the collected query to the pandas DataFrame prepare_for_model
+        returns, adding yearbuilt_binned and the index.
+    '''
+
+    rows = df['_row'].to_numpy().astype(np.int64)
+    data = {column : df[column].to_numpy() for column in df.columns if column not in ('_row', 'yearbuilt')}
+
+    # The bins of pd.cut(yearbuilt, year_built_bins), which are closed on
+    # the right.
+    yearbuilt = df['yearbuilt'].to_numpy()
+    codes = np.searchsorted(year_built_bins, yearbuilt, side = 'left') - 1
+    codes[(codes < 0) | (codes >= len(year_built_bins) - 1)] = -1
+    data['yearbuilt_binned'] = pd.Categorical.from_codes(
+        codes,
+        pd.IntervalIndex.from_breaks(year_built_bins),
+        ordered = True
+    )
+
+    return pd.DataFrame(data, index = rows if index is None else index[rows])[model_columns]
@@ -9,14 +9,23 @@
 #
 #       Variables:
 #
-#           None
+#           single_unit_property_types
+#           non_average_zip_codes
+#           year_built_bins
+#           renamed_columns
+#           model_columns
+#           cluster_columns
 #
 #       Functions:
 #
 #           summarize_column_nulls(df)
 #           summarize_row_nulls(df)
+#           prepare_and_split(df, random_seed = 24, imputer = None, n_cluster_runs = 1)
+#           prepare_for_model(df, imputer = None)
+#           complete_preparation(df, imputer = None)
 #           prepare_zillow(df)
 #           drop_missing_values(df, prop_required_column = 0, prop_required_row = 0)
+#           impute_missing_values(df, imputer)
 #           feature_engineering(df)
 #
 #
@@ -26,13 +35,74 @@ import os
 import pandas as pd
 
 from sklearn.cluster import KMeans
-from sklearn.impute import SimpleImputer
 
 from preprocessing import split_data, scale_data
-from clustering import create_clusters
+from clustering import create_clusters, fit_kmeans_ensemble, assign_clusters
+from spatial import SpatialImputer
+from instrument import instrumented
 
 ################################################################################
 
+# The property land use types counted as single unit properties.
+single_unit_property_types = [
+    'Single Family Residential',
+    'Condominium',
+    'Cluster Home',
+    'Mobile Home',
+    'Manufactured, Modular, Prefabricated Homes',
+    'Residential General',
+    'Townhouse'
+]
+
+# The zip codes whose mean logerror differs significantly from the overall 
+# mean logerror.
+non_average_zip_codes = [
+    96095.0, 96985.0, 96522.0, 96045.0, 96415.0, 96152.0, 96190.0, 96974.0, 
+    96289.0, 96026.0, 96517.0, 96280.0, 96201.0, 96336.0, 96212.0, 95997.0, 
+    96029.0, 96271.0, 96123.0, 97298.0, 97026.0, 96006.0, 96294.0, 96508.0, 
+    96437.0, 96047.0, 96507.0, 96217.0, 96426.0, 96514.0, 95989.0, 96020.0, 
+    96022.0, 96326.0, 96127.0, 96005.0, 96120.0, 96379.0, 96234.0, 95984.0, 
+    96016.0, 96240.0, 96017.0, 96103.0, 97084.0, 96097.0, 96137.0, 96043.0, 
+    96136.0, 96134.0, 96216.0
+]
+
+# The bin edges of yearbuilt_binned.
+year_built_bins = [1800, 1925, 1950, 1975, 2000, 2020]
+
+# The raw columns renamed by prepare_for_model.
+renamed_columns = {
+    'calculatedfinishedsquarefeet' : 'square_feet',
+    'lotsizesquarefeet' : 'lot_size',
+    'taxvaluedollarcnt' : 'tax_assessed_value',
+    'regionidzip' : 'zip_code'
+}
+
+# The columns returned by prepare_for_model.
+model_columns = [
+    'square_feet',
+    'lot_size',
+    'property_age',
+    'non_average_zip_code',
+    'zip_code',
+    'logerror',
+    'bathroomcnt',
+    'bedroomcnt',
+    'tax_assessed_value',
+    'yearbuilt_binned',
+    'latitude',
+    'longitude'
+]
+
+# The columns clustered on by prepare_and_split.
+cluster_columns = [
+    'property_age',
+    'square_feet',
+    'lot_size'
+]
+
+################################################################################
+
+@instrumented
 def summarize_column_nulls(df):
     return pd.concat([
         df.isnull().sum().rename('rows_missing'),
@@ -41,6 +111,7 @@ def summarize_column_nulls(df):
 
 ################################################################################
 
+@instrumented
 def summarize_row_nulls(df):
     return pd.concat([
         df.isnull().sum(axis = 1).rename('columns_missing'),
@@ -49,71 +120,89 @@ def summarize_row_nulls(df):
 
 ################################################################################
 
-def prepare_and_split(df, random_seed = 24):
-    df_copy = prepare_for_model(df)
+@instrumented
+def prepare_and_split(df, random_seed = 24, imputer = None, n_cluster_runs = 1):
+    if imputer is None:
+        train, validate, test = split_data(prepare_for_model(df), random_seed = 13)
+    else:
+        # Split before imputing so the imputer is fit on the training 
+        # properties only and validate and test are filled from them.
+        df_copy = drop_missing_values(df, prop_required_column = 0.8)
+        df_copy = get_single_unit_properties(df_copy)
+
+        train, validate, test = split_data(df_copy, random_seed = 13)
+        imputer.fit(train)
+        train, validate, test = (complete_preparation(split, imputer) for split in (train, validate, test))
 
-    train, validate, test = split_data(df_copy, random_seed = 13)
     train_scaled, validate_scaled, test_scaled = scale_data(train, validate, test, train.drop(columns = ['logerror', 'yearbuilt_binned']).columns)
 
-    columns = [
-        'property_age',
-        'square_feet',
-        'lot_size'
-    ]
+    columns = cluster_columns
     k = 4
-    kmeans = KMeans(n_clusters = k, random_state = random_seed)
-    kmeans.fit(train_scaled[columns])
 
-    train['cluster'] = kmeans.predict(train_scaled[columns])
-    train.cluster = train.cluster.astype('category')
-    train = pd.concat([train, pd.get_dummies(train[['cluster']], drop_first = True)], axis = 1)
-
-    validate['cluster'] = kmeans.predict(validate_scaled[columns]) 
-    validate.cluster = validate.cluster.astype('category')
-    validate = pd.concat([validate, pd.get_dummies(validate[['cluster']], drop_first = True)], axis = 1)
-
-    test['cluster'] = kmeans.predict(test_scaled[columns])
-    test.cluster = test.cluster.astype('category')
-    test = pd.concat([test, pd.get_dummies(test[['cluster']], drop_first = True)], axis = 1)
+    # With more than one run the clusters come from a consensus of KMeans 
+    # models and new data is assigned to the nearest consensus centroid.
+    if n_cluster_runs > 1:
+        train_clusters, _, centroids = fit_kmeans_ensemble(train_scaled[columns], k, n_cluster_runs, random_seed)
+        predict_clusters = lambda X: assign_clusters(X, centroids)
+    else:
+        kmeans = KMeans(n_clusters = k, random_state = random_seed)
+        kmeans.fit(train_scaled[columns])
+        train_clusters = kmeans.predict(train_scaled[columns])
+        predict_clusters = kmeans.predict
+
+    # The categories are fixed to range(k) so every split gets the same 
+    # dummy columns even when a cluster is missing from one of them.
+    clusters = [train_clusters, predict_clusters(validate_scaled[columns]), predict_clusters(test_scaled[columns])]
+    splits = []
+    for split, labels in zip((train, validate, test), clusters):
+        split['cluster'] = pd.Categorical(labels, categories = range(k))
+        splits.append(pd.concat([split, pd.get_dummies(split[['cluster']], drop_first = True)], axis = 1))
+
+    train, validate, test = splits
 
     return train, validate, test
 
 ################################################################################
 
-def prepare_for_model(df):
-    df_copy = df.copy()
-    df_copy = drop_missing_values(df_copy, prop_required_column = 0.8, prop_required_row = 1)
+@instrumented
+def prepare_for_model(df, imputer = None):
+    df_copy = drop_missing_values(df, prop_required_column = 0.8)
+
+    # Only single unit properties are kept, and used as neighbors by the 
+    # imputer.
     df_copy = get_single_unit_properties(df_copy)
 
+    return complete_preparation(df_copy, imputer)
+
+@instrumented
+def complete_preparation(df, imputer = None):
+    '''
+        Finish preparing single unit properties whose sparse columns have 
+        already been dropped: impute, drop the rows that still have missing 
+        values, and build the model columns.
+    '''
+
+    df_copy = df.copy()
+
+    # Fill what we can from the neighboring properties before dropping the
+    # rows that still have missing values.
+    if imputer is not None:
+        df_copy = impute_missing_values(df_copy, imputer)
+
+    df_copy = drop_missing_values(df_copy, prop_required_row = 1)
+
     df_copy['property_age'] = 2017 - df_copy['yearbuilt']
     df_copy = create_zip_code_bins(df_copy)
 
-    bins = [1800, 1925, 1950, 1975, 2000, 2020]
-    df_copy['yearbuilt_binned'] = pd.cut(df_copy['yearbuilt'], bins)
-
-    df_copy = df_copy.rename(columns = {
-        'calculatedfinishedsquarefeet' : 'square_feet',
-        'lotsizesquarefeet' : 'lot_size',
-        'taxvaluedollarcnt' : 'tax_assessed_value',
-        'regionidzip' : 'zip_code'
-    })
-
-    columns_to_keep = [
-        'square_feet',
-        'lot_size',
-        'property_age',
-        'non_average_zip_code',
-        'zip_code',
-        'logerror',
-        'bathroomcnt',
-        'bedroomcnt',
-        'tax_assessed_value',
-        'yearbuilt_binned'
-    ]
-    df_copy = df_copy[columns_to_keep]
+    df_copy['yearbuilt_binned'] = pd.cut(df_copy['yearbuilt'], year_built_bins)
+
+    df_copy = df_copy.rename(columns = renamed_columns)
+
+    df_copy = df_copy[model_columns]
 
     return df_copy
 
+@instrumented
 def prepare_zillow(df):
     df_copy = df.copy()
     df_copy = drop_missing_values(df_copy, prop_required_column = 0.8, prop_required_row = 1)
@@ -123,6 +212,7 @@ def prepare_zillow(df):
 
 ################################################################################
 
+@instrumented
 def drop_missing_values(df, prop_required_column = 0, prop_required_row = 0):
     df = df.dropna(axis = 'columns', thresh = round(df.shape[0] * prop_required_column))
     df = df.dropna(axis = 'index', thresh = round(df.shape[1] * prop_required_row))
@@ -131,22 +221,42 @@ def drop_missing_values(df, prop_required_column = 0, prop_required_row = 0):
 
 ################################################################################
 
+@instrumented
+def impute_missing_values(df: pd.DataFrame, imputer: SpatialImputer) -> pd.DataFrame:
+    '''
+        Fill missing values from the nearest geographic neighbors. If the 
+        imputer has not been fitted yet it is fitted on df, otherwise its 
+        fitted state is reused, which is what we want for scoring batches.
+    
+        Parameters
+        ----------
+        df: DataFrame
+            The zillow DataFrame with the raw column names.
+
+        imputer: SpatialImputer
+            A fitted or unfitted SpatialImputer.
+    
+        Returns
+        -------
+        DataFrame: A copy of df with the missing values filled.
+    '''
+
+    if not hasattr(imputer, 'trees_'):
+        imputer.fit(df)
+
+    return imputer.transform(df)
+
+################################################################################
+
+@instrumented
 def get_single_unit_properties(df):
-    property_types = [
-        'Single Family Residential',
-        'Condominium',
-        'Cluster Home',
-        'Mobile Home',
-        'Manufactured, Modular, Prefabricated Homes',
-        'Residential General',
-        'Townhouse'
-    ]
-    df = df[df.propertylandusedesc.isin(property_types)]
+    df = df[df.propertylandusedesc.isin(single_unit_property_types)]
     
     return df
 
 ################################################################################
 
+@instrumented
 def feature_engineering(df):
     '''
     Feature engineering
@@ -162,19 +272,10 @@ def feature_engineering(df):
 
 ################################################################################
 
+@instrumented
 def create_zip_code_bins(df):
-    zip_codes = [
-        96095.0, 96985.0, 96522.0, 96045.0, 96415.0, 96152.0, 96190.0, 96974.0, 
-        96289.0, 96026.0, 96517.0, 96280.0, 96201.0, 96336.0, 96212.0, 95997.0, 
-        96029.0, 96271.0, 96123.0, 97298.0, 97026.0, 96006.0, 96294.0, 96508.0, 
-        96437.0, 96047.0, 96507.0, 96217.0, 96426.0, 96514.0, 95989.0, 96020.0, 
-        96022.0, 96326.0, 96127.0, 96005.0, 96120.0, 96379.0, 96234.0, 95984.0, 
-        96016.0, 96240.0, 96017.0, 96103.0, 97084.0, 96097.0, 96137.0, 96043.0, 
-        96136.0, 96134.0, 96216.0
-    ]
-
     df_copy = df.copy()
-    df_copy['non_average_zip_code'] = df_copy.regionidzip.isin(zip_codes)
+    df_copy['non_average_zip_code'] = df_copy.regionidzip.isin(non_average_zip_codes)
     df_copy.non_average_zip_code.astype = df_copy.non_average_zip_code.astype('int')
 
     return df_copy
\ No newline at end of file
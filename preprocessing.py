@@ -24,6 +24,8 @@ import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import MinMaxScaler, StandardScaler, RobustScaler
 
+from instrument import instrumented
+
 ################################################################################
 
 scalers = {
@@ -34,6 +36,7 @@ scalers = {
 
 ################################################################################
 
+@instrumented
 def split_data(df: pd.core.frame.DataFrame, random_seed: int = 24, stratify: str = None) -> tuple[
     pd.core.frame.DataFrame,
     pd.core.frame.DataFrame,
@@ -92,6 +95,7 @@ def split_data(df: pd.core.frame.DataFrame, random_seed: int = 24, stratify: str
 
 ################################################################################
 
+@instrumented
 def remove_outliers(df: pd.core.frame.DataFrame, k: float, col_list: list[str]) -> pd.core.frame.DataFrame:
     '''
         Remove outliers from a list of columns in a dataframe 
@@ -132,6 +136,7 @@ def remove_outliers(df: pd.core.frame.DataFrame, k: float, col_list: list[str])
 
 ################################################################################
 
+@instrumented
 def scale_data(
     train: pd.DataFrame,
     validate: pd.DataFrame = None,
@@ -0,0 +1,281 @@
+################################################################################
+#
+#
+#
+#       report.py
+#
+#       Description: This file contains a command line report builder that
+#           produces the figures, statistical tests, and model results of the
+#           final report without running the notebook. The data is acquired
+#           and prepared once, the figures are rendered to files in a process
+#           pool with the non-interactive Agg backend, and the results are
+#           written to a static HTML page and a JSON file.
+#
+#       Variables:
+#
+#           figures
+#           stats_tests
+#
+#       Functions:
+#
+#           _plot_residuals(df, backend = 'scatter')
+#           build_report(df, output_directory = 'report', backend = 'density', n_jobs = None)
+#           render_figures(frames, output_directory, backend = 'density', n_jobs = None)
+#           write_html(results, output_directory)
+#           main()
+#           _use_agg()
+#           _render_figure(name, function, frame, kwargs, path)
+#
+#
+################################################################################
+
+import os
+import json
+import html
+import time
+import argparse
+import warnings
+import pandas as pd
+
+import matplotlib
+
+import explore
+import evaluate
+from prepare import prepare_and_split
+from preprocessing import scale_data, remove_outliers
+from model import establish_baseline, create_models, evaluate_models, model_labels
+from _metrics import regression_metrics
+from scheduler import map_jobs
+
+################################################################################
+
+def _plot_residuals(df: pd.DataFrame, backend: str = 'scatter') -> None:
+    evaluate.plot_residuals(df.actual, df.predicted, backend)
+
+################################################################################
+
+# The report figures as (name, function, frame, accepts a backend). The frame
+# names one of the DataFrames computed once by build_report.
+figures = [
+    ('tax_value_and_logerror', explore.plot_tax_value_and_logerror, 'train', True),
+    ('zip_code_and_logerror', explore.plot_zip_code_and_logerror, 'train', True),
+    ('square_feet_and_logerror', explore.plot_square_feet_and_logerror, 'train', True),
+    ('property_size_and_property_age', explore.plot_property_size_and_property_age, 'train', False),
+    ('clusters', explore.plot_clusters, 'train', True),
+    ('residuals', _plot_residuals, 'residuals', True)
+]
+
+# The report statistical tests, each returning a dictionary of results.
+stats_tests = {
+    'tax_value' : explore.stats_test_for_tax_value,
+    'zip_codes' : explore.stats_test_for_zip_codes,
+    'square_feet' : explore.stats_test_for_square_feet,
+    'clusters' : explore.stats_test_for_clusters
+}
+
+################################################################################
+
+def build_report(
+    df: pd.DataFrame,
+    output_directory: str = 'report',
+    backend: str = 'density',
+    n_jobs: int = None
+) -> dict:
+    '''
+        Build the final report from the acquired data and write it to
+        output_directory as index.html, results.json, and a figures
+        directory.
+
+        Parameters
+        ----------
+        df: DataFrame
+            The acquired zillow data, for example from
+            AcquireZillow().get_data().
+
+        output_directory: str, default 'report'
+            The directory the report is written to.
+
+        backend: str, default 'density'
+            The plotting backend, either 'scatter' or 'density'.
+
+        n_jobs: int, default None
+            The number of worker processes used for the figures and models.
+            If None the number of cores is used.
+
+        Returns
+        -------
+        dict: The report results, as written to results.json.
+    '''
+
+    timings = {}
+
+    start_time = time.perf_counter()
+    train, validate, test = prepare_and_split(df)
+    train_scaled, validate_scaled, test_scaled = scale_data(
+        train,
+        validate,
+        test,
+        train.drop(columns = ['logerror', 'yearbuilt_binned']).columns
+    )
+    timings['prepare'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    baseline = establish_baseline(train['logerror'])
+    models = create_models(remove_outliers(train_scaled, 1.5, ['square_feet', 'tax_assessed_value']), n_jobs = n_jobs)
+    evaluation = evaluate_models(baseline, models, train_scaled, validate_scaled, 'logerror')
+
+    # The model chosen in the final report.
+    chosen = model_labels[5]
+    predictions = models[5].make_predictions(validate_scaled)
+    test_rmse = regression_metrics(test_scaled['logerror'], models[5].make_predictions(test_scaled)).RMSE
+    timings['models'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    frames = {
+        'train' : train,
+        'residuals' : pd.DataFrame({'actual' : validate_scaled['logerror'].to_numpy(), 'predicted' : predictions})
+    }
+    figure_paths = render_figures(frames, output_directory, backend, n_jobs)
+    timings['figures'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    tests = {name : function(train) for name, function in stats_tests.items()}
+    timings['stats_tests'] = time.perf_counter() - start_time
+
+    results = {
+        'rows' : {'train' : len(train), 'validate' : len(validate), 'test' : len(test)},
+        'stats_tests' : tests,
+        'models' : evaluation.reset_index(names = 'model').to_dict(orient = 'records'),
+        'chosen_model' : {'model' : chosen, 'RMSE_test' : float(test_rmse)},
+        'figures' : figure_paths,
+        'timings' : timings
+    }
+
+    with open(os.path.join(output_directory, 'results.json'), 'w') as file:
+        json.dump(results, file, indent = 4, default = str)
+
+    write_html(results, output_directory)
+
+    return results
+
+################################################################################
+
+def render_figures(frames: dict, output_directory: str, backend: str = 'density', n_jobs: int = None) -> dict:
+    '''
+        Render every figure in figures to a png file in a process pool and
+        return the path of each one relative to output_directory. With
+        n_jobs = 1 the figures are rendered in the current process, which
+        keeps its matplotlib backend and figures.
+    '''
+
+    os.makedirs(os.path.join(output_directory, 'figures'), exist_ok = True)
+
+    jobs = [
+        (
+            name,
+            function,
+            frame,
+            {'backend' : backend} if accepts_backend else {},
+            os.path.join(output_directory, 'figures', f'{name}.png')
+        )
+        for name, function, frame, accepts_backend in figures
+    ]
+    n_jobs = min(n_jobs or os.cpu_count(), len(jobs))
+
+    # The frames are sent to each worker once rather than once per figure.
+    map_jobs(_render_figure, jobs, n_jobs, values = {'frames' : frames}, initializer = _use_agg)
+
+    return {name : os.path.join('figures', f'{name}.png') for name, *_ in figures}
+
+################################################################################
+
+def write_html(results: dict, output_directory: str) -> None:
+    '''
+        Write the report results to output_directory/index.html.
+    '''
+
+    sections = ['<h1>Zillow Logerror Report</h1>']
+
+    sections.append('<h2>Exploration</h2>')
+    for name, path in results['figures'].items():
+        sections.append(f'<h3>{html.escape(name)}</h3>\n<img src="{html.escape(path)}" alt="{html.escape(name)}">')
+
+    sections.append('<h2>Statistical Tests</h2>')
+    rows = []
+    for name, test in results['stats_tests'].items():
+        if 'reject' in test:
+            outcome = 'Reject H0' if test['reject'] else 'Fail to reject H0'
+            detail = f"p = {test['p']:.4g}"
+        else:
+            outcome = f"{test['n_significant']} / {test['n_zip_codes']} significant"
+            detail = f"alpha = {test['alpha']}"
+        rows.append({'name' : name, 'test' : test['test'], 'null hypothesis' : test['null_hypothesis'], 'result' : outcome, 'detail' : detail})
+    sections.append(pd.DataFrame(rows).to_html(index = False, escape = True))
+
+    sections.append('<h2>Models</h2>')
+    sections.append(pd.DataFrame(results['models']).to_html(index = False, float_format = '{:.6f}'.format))
+    sections.append(
+        f"<p>RMSE on test for {html.escape(results['chosen_model']['model'])}: "
+        f"{results['chosen_model']['RMSE_test']:.6f}</p>"
+    )
+
+    with open(os.path.join(output_directory, 'index.html'), 'w') as file:
+        file.write('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>Zillow Logerror Report</title></head>\n<body>\n')
+        file.write('\n'.join(sections))
+        file.write('\n</body>\n</html>\n')
+
+################################################################################
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Build the final report without running the notebook.')
+    parser.add_argument('--output-directory', default = 'report', help = 'The directory the report is written to.')
+    parser.add_argument('--data', default = None, help = 'A csv of acquired data to use instead of AcquireZillow.')
+    parser.add_argument('--backend', default = 'density', choices = ('scatter', 'density'), help = 'The plotting backend.')
+    parser.add_argument('--n-jobs', type = int, default = None, help = 'The number of worker processes.')
+    args = parser.parse_args()
+
+    matplotlib.use('Agg')
+
+    if args.data is None:
+        from acquire import AcquireZillow
+        df = AcquireZillow().get_data()
+    else:
+        df = pd.read_csv(args.data)
+
+    results = build_report(df, args.output_directory, args.backend, args.n_jobs)
+
+    for step, seconds in results['timings'].items():
+        print(f'{step:<12} {seconds:8.2f}s')
+    print(f"Report written to {os.path.join(args.output_directory, 'index.html')}")
+
+################################################################################
+
+_worker_state = {}
+
+def _use_agg() -> None:
+    matplotlib.use('Agg')
+
+def _render_figure(name: str, function, frame: str, kwargs: dict, path: str) -> None:
+    import matplotlib.pyplot as plt
+
+    # The plotting functions call plt.show. It is disabled while they run so
+    # that an interactive backend neither displays nor closes the figure
+    # they drew, which is then still the current one.
+    figures_before = set(plt.get_fignums())
+    show, plt.show = plt.show, lambda *args, **kwargs: None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            function(_worker_state['frames'][frame], **kwargs)
+            plt.gcf().savefig(path, bbox_inches = 'tight')
+    finally:
+        plt.show = show
+
+        # Close only the figures drawn here, leaving those of a notebook.
+        for number in set(plt.get_fignums()) - figures_before:
+            plt.close(number)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
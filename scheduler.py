@@ -0,0 +1,277 @@
+################################################################################
+#
+#
+#
+#       scheduler.py
+#
+#       Description: This file contains a training scheduler that fits a list
+#           of models concurrently. With the process backend the training
+#           data is placed in shared memory once and every worker reads it
+#           from there instead of receiving a pickled copy of the DataFrame.
+#           It also contains map_jobs, which the other parallel engines use
+#           to run their jobs either in a process pool or serially.
+#
+#       Variables:
+#
+#           None
+#
+#       Functions:
+#
+#           fit_models(specs, df, n_jobs = None, backend = 'process', cache = None)
+#           share_frame(df, columns)
+#           attach_frame(name, shape, columns, index)
+#           init_worker_state(module, shared = None, values = None, initializer = None)
+#           map_jobs(function, jobs, n_jobs = 1, df = None, columns = None, values = None, initializer = None)
+#           _fit_job(estimator, features, target)
+#
+#
+################################################################################
+
+import os
+import time
+import importlib
+import tracemalloc
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+from threadpoolctl import threadpool_limits
+
+from _model import Model
+from _feature_cache import FeatureCache
+
+################################################################################
+
+def fit_models(
+    specs: list[tuple],
+    df: pd.DataFrame,
+    n_jobs: int = None,
+    backend: str = 'process',
+    cache: FeatureCache = None
+) -> tuple[list[Model], pd.DataFrame]:
+    '''
+        Fit a Model for each (estimator, features, target) spec and return
+        the fitted models in the order of specs along with the timing and
+        memory statistics of each job.
+
+        Parameters
+        ----------
+        specs: list[tuple]
+            A list of (estimator, features, target) tuples. The estimators
+            are fit in place.
+
+        df: DataFrame
+            The training dataset. Every feature and target used by specs must
+            be numeric or boolean.
+
+        n_jobs: int, default None
+            The number of workers. If None the number of cores is used. If 1
+            the models are fit one after another in the current process.
+
+        backend: str, default 'process'
+            Either 'process' or 'thread'. The process backend shares the
+            training data through shared memory. The thread backend shares
+            df directly but does not record peak memory, since tracemalloc
+            cannot separate the allocations of concurrent threads, and its
+            cpu time covers the whole process.
+
+        cache: FeatureCache, default None
+            If provided the models share feature matrices while fitting and 
+            the returned models keep using cache for their predictions. 
+            Each worker process builds its own matrices.
+
+        Returns
+        -------
+        tuple: A list of fitted Models and a DataFrame with one row per job
+            containing the fit time, cpu time, and peak traced memory.
+    '''
+
+    if backend not in ('process', 'thread'):
+        raise ValueError("backend must be either 'process' or 'thread'.")
+
+    n_jobs = min(n_jobs or os.cpu_count(), len(specs))
+    columns = list(dict.fromkeys(
+        column for _, features, target in specs for column in [*features, target]
+    ))
+
+    if backend == 'thread' and n_jobs > 1:
+        init_worker_state(__name__, values = {'df' : df, 'trace_memory' : False, 'threads' : 1, 'cache' : cache})
+        try:
+            with ThreadPoolExecutor(n_jobs) as executor:
+                results = list(executor.map(_fit_job, *zip(*specs)))
+        finally:
+            _worker_state.clear()
+    else:
+        # A cache pickled for a worker process arrives empty, so each worker
+        # builds its own matrices.
+        values = {'trace_memory' : True, 'threads' : None if n_jobs == 1 else 1, 'cache' : cache}
+        results = map_jobs(_fit_job, specs, n_jobs, df, columns, values)
+
+    models = [model for model, _ in results]
+    for model in models:
+        model.cache = cache
+    stats = pd.DataFrame([job_stats for _, job_stats in results])
+
+    return models, stats
+
+################################################################################
+
+def share_frame(df: pd.DataFrame, columns: list[str]) -> tuple:
+    '''
+        Copy the columns of df into a block of shared memory as one column
+        major float64 matrix and return the block along with the information
+        a worker needs to attach to it.
+    '''
+
+    shape = (len(df), len(columns))
+    shm = shared_memory.SharedMemory(create = True, size = max(8 * shape[0] * shape[1], 1))
+
+    matrix = np.ndarray(shape, dtype = np.float64, buffer = shm.buf, order = 'F')
+    matrix[:] = df[columns].to_numpy(dtype = np.float64)
+
+    return shm, (shm.name, shape, columns, df.index)
+
+################################################################################
+
+def attach_frame(name: str, shape: tuple[int], columns: list[str], index: pd.Index) -> tuple:
+    '''
+        Attach to a block created by share_frame and return the block and a
+        DataFrame that views it without copying.
+    '''
+
+    shm = shared_memory.SharedMemory(name = name)
+    matrix = np.ndarray(shape, dtype = np.float64, buffer = shm.buf, order = 'F')
+
+    return shm, pd.DataFrame(matrix, index = index, columns = columns, copy = False)
+
+################################################################################
+
+def init_worker_state(module: str, shared: tuple = None, values: dict = None, initializer = None) -> None:
+    '''
+        Fill the _worker_state dict of module with values, and if shared is
+        given with the block from share_frame and a DataFrame viewing it
+        under 'shm' and 'df'. If initializer is given it is called with no
+        arguments afterward. This is the initializer of the process pools
+        started by map_jobs.
+    '''
+
+    state = importlib.import_module(module)._worker_state
+    state.clear()
+
+    if shared is not None:
+        # Keep a reference to the block so it stays mapped for the life of the worker.
+        state['shm'], state['df'] = attach_frame(*shared)
+
+    state.update(values or {})
+
+    if initializer is not None:
+        initializer()
+
+################################################################################
+
+def map_jobs(
+    function,
+    jobs: list[tuple],
+    n_jobs: int = 1,
+    df: pd.DataFrame = None,
+    columns: list[str] = None,
+    values: dict = None,
+    initializer = None
+) -> list:
+    '''
+        Call function with the arguments of each job and return the results
+        in the order of jobs. The function reads the data common to every
+        job from the _worker_state dict of its module.
+
+        Parameters
+        ----------
+        function: callable
+            A module level function.
+
+        jobs: list[tuple]
+            The arguments of each call.
+
+        n_jobs: int, default 1
+            The number of worker processes. If 1 the jobs run one after
+            another in the current process.
+
+        df: DataFrame, default None
+            If provided it is available to function as _worker_state['df'].
+            With more than one worker its columns are placed in shared
+            memory once and each worker views them as float64.
+
+        columns: list[str], default None
+            The columns of df to share. Defaults to every column.
+
+        values: dict, default None
+            Any other entries of _worker_state. They are sent to each
+            worker once rather than once per job.
+
+        initializer: callable, default None
+            A module level function called with no arguments once in each
+            worker process, for setup that must not touch the current
+            process, such as choosing a matplotlib backend. It is not called
+            when the jobs run in the current process.
+
+        Returns
+        -------
+        list: The result of each job.
+    '''
+
+    values = dict(values or {})
+
+    # The state is cleared afterward so the data is not kept alive by the
+    # module once the jobs are done.
+    if n_jobs == 1:
+        if df is not None:
+            values['df'] = df
+        init_worker_state(function.__module__, values = values)
+        try:
+            return [function(*job) for job in jobs]
+        finally:
+            importlib.import_module(function.__module__)._worker_state.clear()
+
+    shm, shared = share_frame(df, list(columns or df.columns)) if df is not None else (None, None)
+    try:
+        with ProcessPoolExecutor(n_jobs, initializer = init_worker_state, initargs = (function.__module__, shared, values, initializer)) as executor:
+            return list(executor.map(function, *zip(*jobs)))
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+################################################################################
+
+_worker_state = {}
+
+def _fit_job(estimator, features: list[str], target: str) -> tuple:
+    # Leave tracemalloc alone if something else, such as instrument.enable,
+    # is already tracing, since resetting or stopping it would break their
+    # measurements. The job's peak memory is then not recorded.
+    trace_memory = _worker_state['trace_memory'] and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+
+    start_time, start_cpu = time.perf_counter(), time.process_time()
+
+    # When jobs run concurrently each fit is limited to one thread so that
+    # the jobs do not compete for cores.
+    with threadpool_limits(_worker_state['threads']):
+        model = Model(estimator, _worker_state['df'], features, target, _worker_state['cache'])
+
+    job_stats = {
+        'estimator' : type(estimator).__name__ if not hasattr(estimator, 'steps') else ' -> '.join(type(step).__name__ for _, step in estimator.steps),
+        'features' : ', '.join(features),
+        'target' : target,
+        'fit_seconds' : time.perf_counter() - start_time,
+        'cpu_seconds' : time.process_time() - start_cpu,
+        'peak_memory_mb' : np.nan,
+        'pid' : os.getpid()
+    }
+
+    if trace_memory:
+        job_stats['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    return model, job_stats
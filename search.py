@@ -0,0 +1,239 @@
+################################################################################
+#
+#
+#
+#       search.py
+#
+#       Description: This file contains a successive halving hyperparameter
+#           search over Model configurations. Every configuration is trained
+#           on a small sample of the training data, the best fraction moves on
+#           to a larger sample, and so on until the full training set. Trials
+#           run in a process pool and each worker caches the cluster and
+#           polynomial stages shared by its trials.
+#
+#       Variables:
+#
+#           base_features
+#
+#       Functions:
+#
+#           generate_configurations(ks = (2, 3, 4, 5, 6), alphas = (0.01, 0.1, 1.0), degrees = (2, 3))
+#           successive_halving(train, validate, configurations = None, target = 'logerror', min_rows = 2_000, eta = 3, random_seed = 24, n_jobs = None)
+#           _init_worker(train, validate, target, random_seed)
+#           _cluster_stage(k, n_rows)
+#           _run_trial(configuration, n_rows)
+#
+#
+################################################################################
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from sklearn.base import clone
+from sklearn.cluster import KMeans
+from sklearn.metrics import mean_squared_error
+from threadpoolctl import threadpool_limits
+
+from _model import Model
+from _feature_cache import FeatureCache
+from model import estimators, feature_sets
+from preprocessing import scalers
+from prepare import cluster_columns
+
+################################################################################
+
+# The features create_models uses without clusters.
+base_features = feature_sets['no_clusters']
+
+################################################################################
+
+def generate_configurations(
+    ks: tuple[int] = (2, 3, 4, 5, 6),
+    alphas: tuple[float] = (0.01, 0.1, 1.0),
+    degrees: tuple[int] = (2, 3)
+) -> list[dict]:
+    '''
+        Generate Model configurations for every estimator type in
+        model.estimators, with and without cluster dummies for each k.
+
+        A configuration is a dictionary with the estimator name, the sklearn
+        parameters to set on it, and the number of clusters k (None for no
+        clusters).
+
+        The TweedieRegressor is only searched over alpha with power 0, since
+        any other power requires a non negative target and logerror is not.
+
+        Parameters
+        ----------
+        ks: tuple[int], default (2, 3, 4, 5, 6)
+            The numbers of KMeans clusters to try.
+
+        alphas: tuple[float], default (0.01, 0.1, 1.0)
+            The TweedieRegressor regularization strengths to try.
+
+        degrees: tuple[int], default (2, 3)
+            The polynomial degrees to try.
+
+        Returns
+        -------
+        list[dict]: The configurations.
+    '''
+
+    estimator_params = [('linear_regression', {})]
+    estimator_params += [('tweedie_regressor', {'power' : 0, 'alpha' : alpha}) for alpha in alphas]
+    estimator_params += [
+        (name, {'polynomialfeatures__degree' : degree})
+        for name in ('polynomial_regression', 'polynomial_regression_interactions_only')
+        for degree in degrees
+    ]
+
+    return [
+        {'estimator' : name, 'params' : params, 'k' : k}
+        for name, params in estimator_params
+        for k in (None, *ks)
+    ]
+
+################################################################################
+
+def successive_halving(
+    train: pd.DataFrame,
+    validate: pd.DataFrame,
+    configurations: list[dict] = None,
+    target: str = 'logerror',
+    min_rows: int = 2_000,
+    eta: int = 3,
+    random_seed: int = 24,
+    n_jobs: int = None
+) -> pd.DataFrame:
+    '''
+        Run a successive halving search and return every trial ranked by how
+        far it got and then by its validate RMSE.
+
+        Parameters
+        ----------
+        train: DataFrame
+            The prepared training dataset from prepare_for_model and
+            split_data, before scaling and clustering.
+
+        validate: DataFrame
+            The prepared validate dataset. Trials are always scored on all
+            of it.
+
+        configurations: list[dict], default None
+            The configurations to search. Defaults to
+            generate_configurations().
+
+        target: str, default 'logerror'
+            The target variable.
+
+        min_rows: int, default 2_000
+            The number of training rows used in the first rung.
+
+        eta: int, default 3
+            Each rung multiplies the rows by eta and keeps the best 1 / eta
+            of the configurations.
+
+        random_seed: int, default 24
+            The seed used to shuffle the training rows and to fit the
+            clusters. Each rung's sample contains the previous rung's sample.
+
+        n_jobs: int, default None
+            The number of worker processes. If None the number of cores is
+            used.
+
+        Returns
+        -------
+        DataFrame: One row per trial with the configuration, the rung, the
+            number of training rows, RMSE_train, RMSE_validate, and the fit
+            time.
+    '''
+
+    if configurations is None:
+        configurations = generate_configurations()
+
+    train = train.sample(frac = 1, random_state = random_seed)
+    n_jobs = n_jobs or os.cpu_count()
+
+    trials = []
+    candidates = list(range(len(configurations)))
+    n_rows = min(min_rows, len(train))
+    rung = 0
+
+    with ProcessPoolExecutor(n_jobs, initializer = _init_worker, initargs = (train, validate, target, random_seed)) as executor:
+        while True:
+            results = list(executor.map(_run_trial, [configurations[index] for index in candidates], [n_rows] * len(candidates)))
+
+            for index, result in zip(candidates, results):
+                trials.append({'configuration' : index, 'rung' : rung, 'n_rows' : n_rows, **result})
+
+            if n_rows == len(train) or len(candidates) == 1:
+                break
+
+            # Keep the best 1 / eta of the configurations for the next rung.
+            order = np.argsort([result['RMSE_validate'] for result in results])
+            candidates = [candidates[index] for index in order[:max(len(candidates) // eta, 1)]]
+            n_rows = min(n_rows * eta, len(train))
+            rung += 1
+
+    results = pd.DataFrame(trials)
+    results.insert(1, 'estimator', [configurations[index]['estimator'] for index in results.configuration])
+    results.insert(2, 'params', [configurations[index]['params'] for index in results.configuration])
+    results.insert(3, 'k', [configurations[index]['k'] for index in results.configuration])
+
+    return results.sort_values(['rung', 'RMSE_validate'], ascending = [False, True], ignore_index = True)
+
+################################################################################
+
+_worker_state = {}
+
+def _init_worker(train: pd.DataFrame, validate: pd.DataFrame, target: str, random_seed: int) -> None:
+    _worker_state.update(train = train, validate = validate, target = target, random_seed = random_seed, stages = {}, cache = FeatureCache())
+
+def _cluster_stage(k: int, n_rows: int) -> tuple[pd.DataFrame]:
+    '''
+        Return the first n_rows training rows and the validate rows with
+        cluster dummies for k clusters added. The stage is fit once per
+        worker for each (k, n_rows) and shared by every trial that needs it.
+    '''
+
+    key = (k, n_rows)
+    if key in _worker_state['stages']:
+        return _worker_state['stages'][key]
+
+    train = _worker_state['train'].iloc[:n_rows]
+    validate = _worker_state['validate']
+
+    if k is not None:
+        scaler = scalers['MinMaxScaler']().fit(train[cluster_columns])
+        kmeans = KMeans(n_clusters = k, random_state = _worker_state['random_seed']).fit(scaler.transform(train[cluster_columns]))
+
+        dummies = [f'cluster_{cluster}' for cluster in range(1, k)]
+        train, validate = [
+            df.assign(**dict(zip(dummies, (kmeans.predict(scaler.transform(df[cluster_columns]))[:, None] == np.arange(1, k)).T)))
+            for df in (train, validate)
+        ]
+
+    _worker_state['stages'][key] = train, validate
+    return train, validate
+
+def _run_trial(configuration: dict, n_rows: int) -> dict:
+    start_time = time.perf_counter()
+    k = configuration['k']
+    target = _worker_state['target']
+
+    features = base_features + ([f'cluster_{cluster}' for cluster in range(1, k)] if k is not None else [])
+    estimator = clone(estimators[configuration['estimator']]).set_params(**configuration['params'])
+
+    # Limit each trial to one thread so that the trials do not compete for cores.
+    with threadpool_limits(1):
+        train, validate = _cluster_stage(k, n_rows)
+        model = Model(estimator, train, features, target, _worker_state['cache'])
+
+        return {
+            'RMSE_train' : np.sqrt(mean_squared_error(train[target], model.make_predictions(train))),
+            'RMSE_validate' : np.sqrt(mean_squared_error(validate[target], model.make_predictions(validate))),
+            'fit_seconds' : time.perf_counter() - start_time
+        }
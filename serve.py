@@ -0,0 +1,355 @@
+################################################################################
+#
+#
+#
+#       serve.py
+#
+#       Description: This file contains a local scoring service for a model
+#           from the model store. Concurrent requests are gathered into
+#           micro batches that are scored with one vectorized predict call.
+#           The service speaks a minimal HTTP/1.1 over TCP or a Unix socket
+#           and only depends on the standard library and NumPy.
+#
+#           Endpoints:
+#
+#               POST /predict   {"instances": [{"square_feet": 1500, ...}, ...]}
+#                               or {"instances": [[1500, ...], ...]}
+#               GET  /metrics   Throughput, batch, and latency metrics
+#
+#           Usage:
+#
+#               python serve.py --store models --name linear_regression_with_clusters
+#
+#       Class:
+#
+#           MicroBatcher
+#
+#       Functions:
+#
+#           parse_instances(body, features)
+#           handle_connection(reader, writer, batcher)
+#           write_response(writer, status, payload, close = False)
+#           serve(model, host = '127.0.0.1', port = 8080, unix_socket = None, max_batch_size = 256, max_latency_ms = 5)
+#           main()
+#
+#
+################################################################################
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import collections
+import numpy as np
+
+from model_store import load_model
+
+################################################################################
+
+class MicroBatcher:
+    '''
+        Collects the rows of concurrent requests and scores them together. A
+        batch is scored as soon as it holds max_batch_size rows or the first
+        request in it has waited max_latency_ms, whichever comes first.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        predict: Returns ndarray
+        run: Returns None
+        metrics: Returns dict
+    '''
+
+    ################################################################################
+
+    def __init__(self, model, max_batch_size: int = 256, max_latency_ms: float = 5, window: int = 10_000) -> None:
+        '''
+            Parameters
+            ----------
+            model: StoredModel
+                A model with a predict method that accepts a 2-D array.
+
+            max_batch_size: int, default 256
+                The largest number of rows scored in one call.
+
+            max_latency_ms: float, default 5
+                The longest time in milliseconds a request waits for other
+                requests to join its batch.
+
+            window: int, default 10_000
+                The number of most recent request latencies kept for the
+                percentile metrics.
+        '''
+
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+
+        self._queue = asyncio.Queue()
+        self._latencies = collections.deque(maxlen = window)
+        self._batch_sizes = collections.deque(maxlen = window)
+        self._started = time.perf_counter()
+        self._rows = 0
+        self._requests = 0
+
+    ################################################################################
+
+    async def predict(self, X: np.ndarray) -> np.ndarray:
+        '''
+            Queue the rows of one request and wait for their predictions.
+        '''
+
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((X, future))
+
+        predictions = await future
+        self._latencies.append(time.perf_counter() - start)
+
+        return predictions
+
+    ################################################################################
+
+    async def run(self) -> None:
+        '''
+            Score batches from the queue forever.
+        '''
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_latency
+
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            self._score(batch)
+
+    ################################################################################
+
+    def metrics(self) -> dict:
+        '''
+            Return the throughput, batch size, and p50/p99 latency metrics.
+        '''
+
+        elapsed = time.perf_counter() - self._started
+        latencies = np.array(self._latencies) * 1000
+
+        return {
+            'requests' : self._requests,
+            'rows' : self._rows,
+            'uptime_seconds' : elapsed,
+            'rows_per_second' : self._rows / elapsed if elapsed else 0.0,
+            'requests_per_second' : self._requests / elapsed if elapsed else 0.0,
+            'mean_batch_size' : float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+            'latency_p50_ms' : float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'latency_p99_ms' : float(np.percentile(latencies, 99)) if len(latencies) else None
+        }
+
+    ################################################################################
+
+    def _score(self, batch: list[tuple]) -> None:
+        sizes = [len(X) for X, _ in batch]
+
+        try:
+            predictions = self.model.predict(np.concatenate([X for X, _ in batch]))
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (_, future), rows in zip(batch, np.split(predictions, np.cumsum(sizes)[:-1])):
+            if not future.done():
+                future.set_result(rows)
+
+        self._rows += sum(sizes)
+        self._requests += len(batch)
+        self._batch_sizes.append(sum(sizes))
+
+################################################################################
+
+def parse_instances(body: bytes, features: list[str]) -> np.ndarray:
+    '''
+        Convert a /predict request body to a (n, len(features)) array. The
+        instances may be objects keyed by feature name or lists of values in
+        the order of features. A ValueError is raised if any instance does 
+        not have exactly one value per feature.
+    '''
+
+    instances = json.loads(body)['instances']
+
+    if instances and isinstance(instances[0], dict):
+        instances = [[instance[feature] for feature in features] for instance in instances]
+
+    X = np.array(instances, dtype = np.float64)
+    if X.size == 0:
+        return X.reshape(0, len(features))
+
+    if X.ndim != 2 or X.shape[1] != len(features):
+        raise ValueError(f'Each instance must have the {len(features)} features {features}.')
+
+    return X
+
+################################################################################
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, batcher: MicroBatcher) -> None:
+    '''
+        Serve the HTTP requests of one connection until the client closes it.
+    '''
+
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+
+            try:
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+            except ValueError as error:
+                # The rest of the stream cannot be split into requests after 
+                # a malformed one, so the connection is closed.
+                await write_response(writer, '400 Bad Request', {'error' : repr(error)}, close = True)
+                break
+
+            try:
+                if method == 'POST' and path == '/predict':
+                    predictions = await batcher.predict(parse_instances(body, batcher.model.features))
+                    status, payload = '200 OK', {'predictions' : predictions.tolist()}
+                elif method == 'GET' and path == '/metrics':
+                    status, payload = '200 OK', batcher.metrics()
+                else:
+                    status, payload = '404 Not Found', {'error' : f'{method} {path} is not supported.'}
+            except (KeyError, ValueError, TypeError) as error:
+                status, payload = '400 Bad Request', {'error' : repr(error)}
+            except Exception as error:
+                status, payload = '500 Internal Server Error', {'error' : repr(error)}
+
+            close = headers.get('connection', '').lower() == 'close'
+            await write_response(writer, status, payload, close)
+
+            if close:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+################################################################################
+
+async def write_response(writer: asyncio.StreamWriter, status: str, payload: dict, close: bool = False) -> None:
+    '''
+        Write one JSON response to the connection.
+    '''
+
+    response = json.dumps(payload).encode()
+
+    writer.write(
+        f'HTTP/1.1 {status}\r\n'
+        f'Content-Type: application/json\r\n'
+        f'Content-Length: {len(response)}\r\n'
+        f'Connection: {"close" if close else "keep-alive"}\r\n\r\n'.encode('latin-1') + response
+    )
+    await writer.drain()
+
+################################################################################
+
+async def serve(
+    model,
+    host: str = '127.0.0.1',
+    port: int = 8080,
+    unix_socket: str = None,
+    max_batch_size: int = 256,
+    max_latency_ms: float = 5
+) -> None:
+    '''
+        Serve model until the process is stopped.
+
+        Parameters
+        ----------
+        model: StoredModel
+            A model with features and a predict method that accepts a 2-D
+            array, such as the result of model_store.load_model.
+
+        host: str, default '127.0.0.1'
+            The host to listen on.
+
+        port: int, default 8080
+            The port to listen on.
+
+        unix_socket: str, default None
+            If provided listen on this Unix socket path instead of host/port.
+
+        max_batch_size: int, default 256
+            The largest number of rows scored in one call.
+
+        max_latency_ms: float, default 5
+            The longest time in milliseconds a request waits for a batch.
+    '''
+
+    batcher = MicroBatcher(model, max_batch_size, max_latency_ms)
+    batch_task = asyncio.create_task(batcher.run())
+
+    handler = lambda reader, writer: handle_connection(reader, writer, batcher)
+    if unix_socket is not None:
+        server = await asyncio.start_unix_server(handler, path = unix_socket)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+################################################################################
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Serve a model from the model store.')
+    parser.add_argument('--store', required = True, help = 'The root directory of the model store.')
+    parser.add_argument('--name', required = True, help = 'The name of the model to serve.')
+    parser.add_argument('--version', default = None, help = 'The version to serve. Defaults to the latest.')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080)
+    parser.add_argument('--unix-socket', default = None)
+    parser.add_argument('--max-batch-size', type = int, default = 256)
+    parser.add_argument('--max-latency-ms', type = float, default = 5)
+    args = parser.parse_args()
+
+    model = load_model(args.store, args.name, args.version)
+    print(f'Serving {args.name} {model.manifest["version"]}', file = sys.stderr)
+
+    try:
+        asyncio.run(serve(
+            model,
+            args.host,
+            args.port,
+            args.unix_socket,
+            args.max_batch_size,
+            args.max_latency_ms
+        ))
+    except KeyboardInterrupt:
+        pass
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
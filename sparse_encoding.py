@@ -0,0 +1,204 @@
+################################################################################
+#
+#
+#
+#       sparse_encoding.py
+#
+#       Description: This file contains a sparse one hot encoding of the
+#           categorical features of the zillow dataset. A dense one hot
+#           encoding of zip_code has a float64 column for each of the
+#           several hundred zip codes, so it needs several hundred times the
+#           memory of the zip_code column itself. The encoding here is a CSR
+#           matrix that stores one value per categorical feature per row,
+#           which the linear estimators in sklearn can fit on directly.
+#
+#       Variables:
+#
+#           None
+#
+#       Class:
+#
+#           SparseEncoder
+#
+#       Functions:
+#
+#           one_hot_csr(values, categories)
+#           dense_one_hot_megabytes(df, columns)
+#           csr_megabytes(matrix)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.preprocessing import PolynomialFeatures
+
+################################################################################
+
+def one_hot_csr(values: np.ndarray, categories: np.ndarray) -> sparse.csr_matrix:
+    '''
+        Return the one hot encoding of values as a CSR matrix with a column
+        for each of the sorted categories. Rows whose value is not one of
+        the categories are all zero.
+
+        Parameters
+        ----------
+        values: ndarray
+            The values to encode.
+
+        categories: ndarray
+            The sorted unique categories.
+
+        Returns
+        -------
+        csr_matrix: A (len(values), len(categories)) matrix of ones and
+            zeros.
+    '''
+
+    values = np.asarray(values, dtype = np.float64)
+    codes = np.searchsorted(categories, values)
+    known = codes < len(categories)
+    known[known] = categories[codes[known]] == values[known]
+
+    # Each row has at most one value, so the row pointers are the running
+    # count of known rows and no sorting is needed.
+    indptr = np.concatenate([[0], np.cumsum(known)])
+
+    return sparse.csr_matrix(
+        (np.ones(known.sum()), codes[known], indptr),
+        shape = (len(values), len(categories))
+    )
+
+################################################################################
+
+def dense_one_hot_megabytes(df: pd.DataFrame, columns: list[str]) -> float:
+    '''
+        Return the megabytes a dense float64 one hot encoding of the columns
+        of df would take, for comparison with csr_megabytes.
+    '''
+
+    return sum(len(df) * df[column].nunique() * 8 for column in columns) / 2 ** 20
+
+def csr_megabytes(matrix: sparse.csr_matrix) -> float:
+    '''
+        Return the megabytes taken by the arrays of a CSR matrix.
+    '''
+
+    return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2 ** 20
+
+################################################################################
+
+class SparseEncoder(BaseEstimator, TransformerMixin):
+    '''
+        Turns a feature matrix whose last columns are categorical into a CSR
+        matrix of the numeric columns, optionally expanded into polynomial
+        terms, followed by the one hot encoding of each categorical column.
+        The categories are learned in fit, and categories first seen in
+        transform are encoded as all zeros.
+
+        The numeric columns are min max scaled with the range seen in fit, 
+        so they sit on the same scale as the 0/1 one hot columns. Unscaled 
+        values such as tax_assessed_value leave the sparse least squares 
+        solvers too ill conditioned to fit the category effects.
+
+        The columns are taken by position, so the encoder works the same on
+        a DataFrame, on the float64 matrices of the training scheduler, and
+        on the matrices of a FeatureCache.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        fit: Returns SparseEncoder
+        transform: Returns csr_matrix
+    '''
+
+    ################################################################################
+
+    def __init__(self, n_categorical: int = 1, degree: int = 1) -> None:
+        '''
+            Parameters
+            ----------
+            n_categorical: int, default 1
+                The number of columns at the end of the feature matrix to
+                one hot encode.
+
+            degree: int, default 1
+                The degree of the polynomial expansion of the numeric
+                columns. The categorical columns are not expanded, so each
+                category shifts the prediction by a constant.
+        '''
+
+        self.n_categorical = n_categorical
+        self.degree = degree
+
+    ################################################################################
+
+    def fit(self, X, y = None) -> 'SparseEncoder':
+        '''
+            Learn the categories of each categorical column and the range of
+            each numeric column, and fit the polynomial expansion of the
+            numeric columns.
+
+            Parameters
+            ----------
+            X: DataFrame | ndarray
+                The feature matrix, with the categorical columns last.
+
+            Returns
+            -------
+            SparseEncoder: The fitted instance.
+        '''
+
+        numeric, categorical = self._split(X)
+
+        self.categories_ = [np.unique(column) for column in categorical.T]
+
+        self.minimum_ = numeric.min(axis = 0) if len(numeric) else np.zeros(numeric.shape[1])
+        span = (numeric.max(axis = 0) if len(numeric) else self.minimum_) - self.minimum_
+        self.span_ = np.where(span > 0, span, 1.0)
+        numeric = (numeric - self.minimum_) / self.span_
+
+        self.polynomial_ = None
+        if self.degree > 1:
+            self.polynomial_ = PolynomialFeatures(self.degree, include_bias = False).fit(numeric)
+
+        return self
+
+    ################################################################################
+
+    def transform(self, X) -> sparse.csr_matrix:
+        '''
+            Return the CSR encoding of X.
+
+            Parameters
+            ----------
+            X: DataFrame | ndarray
+                The feature matrix, with the categorical columns last.
+
+            Returns
+            -------
+            csr_matrix: The scaled numeric columns followed by the one hot
+                columns of each categorical column.
+        '''
+
+        numeric, categorical = self._split(X)
+        numeric = (numeric - self.minimum_) / self.span_
+
+        if self.polynomial_ is not None:
+            numeric = self.polynomial_.transform(numeric)
+
+        blocks = [sparse.csr_matrix(numeric)]
+        blocks += [one_hot_csr(column, categories) for column, categories in zip(categorical.T, self.categories_)]
+
+        return sparse.hstack(blocks, format = 'csr')
+
+    ################################################################################
+
+    def _split(self, X) -> tuple[np.ndarray]:
+        X = np.asarray(X, dtype = np.float64)
+        split = X.shape[1] - self.n_categorical
+
+        return X[:, :split], X[:, split:]
@@ -0,0 +1,492 @@
+################################################################################
+#
+#
+#
+#       spatial.py
+#
+#       Description: This file contains functions and classes used for building
+#           geospatial features from the latitude and longitude of a property.
+#           Neighbors are found with a haversine BallTree that is built once
+#           over the training properties and queried in batches.
+#
+#       Variables:
+#
+#           EARTH_RADIUS_KM
+#           impute_strategies
+#
+#       Class:
+#
+#           NeighborFeatures
+#           SpatialImputer
+#
+#       Functions:
+#
+#           get_coordinates(df, latitude = 'latitude', longitude = 'longitude', coordinate_scale = 1e6)
+#           build_ball_tree(coordinates)
+#           add_neighbor_features(train, validate = None, test = None, target = 'logerror', k = 10, radius_km = None)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from sklearn.neighbors import BallTree
+
+################################################################################
+
+EARTH_RADIUS_KM = 6371.0088
+
+impute_strategies = {
+    'mean' : lambda values: values.mean(axis = 1),
+    'median' : lambda values: np.median(values, axis = 1),
+    'mode' : lambda values: stats.mode(values, axis = 1, keepdims = False).mode
+}
+
+################################################################################
+
+def get_coordinates(
+    df: pd.DataFrame,
+    latitude: str = 'latitude',
+    longitude: str = 'longitude',
+    coordinate_scale: float = 1e6
+) -> np.ndarray:
+    '''
+        Return the latitude and longitude of each row as a contiguous array
+        of radians, the form expected by a haversine BallTree.
+
+        Parameters
+        ----------
+        df: DataFrame
+            A pandas DataFrame containing latitude and longitude columns.
+
+        latitude: str, default 'latitude'
+            The name of the latitude column.
+
+        longitude: str, default 'longitude'
+            The name of the longitude column.
+
+        coordinate_scale: float, default 1e6
+            The value the stored coordinates must be divided by to obtain
+            degrees. The zillow database stores coordinates as integer
+            micro degrees.
+
+        Returns
+        -------
+        ndarray: A (n, 2) array of latitude and longitude in radians.
+    '''
+
+    degrees = df[[latitude, longitude]].to_numpy(dtype = np.float64) / coordinate_scale
+    return np.ascontiguousarray(np.radians(degrees))
+
+################################################################################
+
+def build_ball_tree(coordinates: np.ndarray) -> BallTree:
+    '''
+        Build a haversine BallTree over an array of coordinates in radians.
+
+        Parameters
+        ----------
+        coordinates: ndarray
+            A (n, 2) array of latitude and longitude in radians.
+
+        Returns
+        -------
+        BallTree: A fitted sklearn BallTree using the haversine metric.
+    '''
+
+    return BallTree(coordinates, metric = 'haversine')
+
+################################################################################
+
+class NeighborFeatures:
+    '''
+        Computes aggregates of a training column (logerror by default) over
+        the geographic neighbors of each property. The BallTree is built
+        once in fit and every call to transform is answered with a single
+        batched query against it.
+
+        When a batch contains the training rows themselves (exclude_self =
+        True) each row is removed from its own neighborhood so that the
+        feature never contains the row's own target value.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        fit: Returns NeighborFeatures
+        transform: Returns DataFrame
+        fit_transform: Returns DataFrame
+    '''
+
+    ################################################################################
+
+    def __init__(
+        self,
+        target: str = 'logerror',
+        k: int = 10,
+        radius_km: float = None,
+        latitude: str = 'latitude',
+        longitude: str = 'longitude',
+        coordinate_scale: float = 1e6,
+        prefix: str = 'neighbor'
+    ) -> None:
+        '''
+            Parameters
+            ----------
+            target: str, default 'logerror'
+                The training column to aggregate over each neighborhood.
+
+            k: int, default 10
+                The number of nearest neighbors to aggregate. Ignored if
+                radius_km is provided.
+
+            radius_km: float, default None
+                If provided every training property within this many
+                kilometers is used instead of the k nearest neighbors.
+
+            latitude: str, default 'latitude'
+                The name of the latitude column.
+
+            longitude: str, default 'longitude'
+                The name of the longitude column.
+
+            coordinate_scale: float, default 1e6
+                The value the stored coordinates must be divided by to
+                obtain degrees.
+
+            prefix: str, default 'neighbor'
+                The prefix used when naming the output columns.
+        '''
+
+        self.target = target
+        self.k = k
+        self.radius_km = radius_km
+        self.latitude = latitude
+        self.longitude = longitude
+        self.coordinate_scale = coordinate_scale
+        self.prefix = prefix
+
+    ################################################################################
+
+    def fit(self, train: pd.DataFrame) -> 'NeighborFeatures':
+        '''
+            Build the BallTree over the training properties and store the
+            target values that will be aggregated.
+
+            Parameters
+            ----------
+            train: DataFrame
+                The training dataset. Must contain the coordinate columns and
+                the target column.
+
+            Returns
+            -------
+            NeighborFeatures: The fitted instance.
+        '''
+
+        self.tree_ = build_ball_tree(self._coordinates(train))
+        self.values_ = train[self.target].to_numpy(dtype = np.float64)
+        self.n_train_ = len(self.values_)
+
+        return self
+
+    ################################################################################
+
+    def transform(self, df: pd.DataFrame, exclude_self: bool = False) -> pd.DataFrame:
+        '''
+            Compute the neighborhood mean, variance, and count of the target
+            for every row of a batch.
+
+            Parameters
+            ----------
+            df: DataFrame
+                A batch of properties containing the coordinate columns.
+
+            exclude_self: bool, default False
+                Set to True when df is the training dataset passed to fit,
+                row for row, so that each row is excluded from its own
+                neighborhood.
+
+            Returns
+            -------
+            DataFrame: A DataFrame with the same index as df containing the
+                neighborhood features.
+        '''
+
+        if exclude_self and len(df) != self.n_train_:
+            raise ValueError('exclude_self requires the same rows that were passed to fit.')
+
+        coordinates = self._coordinates(df)
+
+        if self.radius_km is None:
+            mean, variance, count = self._knn_aggregates(coordinates, exclude_self)
+        else:
+            mean, variance, count = self._radius_aggregates(coordinates, exclude_self)
+
+        return pd.DataFrame({
+            f'{self.prefix}_{self.target}_mean' : mean,
+            f'{self.prefix}_{self.target}_var' : variance,
+            f'{self.prefix}_count' : count
+        }, index = df.index)
+
+    ################################################################################
+
+    def fit_transform(self, train: pd.DataFrame) -> pd.DataFrame:
+        '''
+            Fit on the training dataset and return its leakage safe
+            neighborhood features.
+        '''
+
+        return self.fit(train).transform(train, exclude_self = True)
+
+    ################################################################################
+
+    def _coordinates(self, df: pd.DataFrame) -> np.ndarray:
+        return get_coordinates(df, self.latitude, self.longitude, self.coordinate_scale)
+
+    ################################################################################
+
+    def _knn_aggregates(self, coordinates: np.ndarray, exclude_self: bool) -> tuple[np.ndarray]:
+        k = min(self.k + exclude_self, self.n_train_)
+        indices = self.tree_.query(coordinates, k = k, return_distance = False)
+
+        if exclude_self:
+            # Move each row's own index to the end of its neighbor list and
+            # drop the last column. If a row was not among its own neighbors
+            # (duplicate coordinates) the farthest neighbor is dropped instead.
+            is_self = indices == np.arange(len(indices))[:, None]
+            is_self[~is_self.any(axis = 1), -1] = True
+            order = np.argsort(is_self, axis = 1, kind = 'stable')
+            indices = np.take_along_axis(indices, order, axis = 1)[:, :-1]
+
+        values = self.values_[indices]
+        count = np.full(len(values), values.shape[1])
+
+        return values.mean(axis = 1), values.var(axis = 1), count
+
+    ################################################################################
+
+    def _radius_aggregates(self, coordinates: np.ndarray, exclude_self: bool) -> tuple[np.ndarray]:
+        indices = self.tree_.query_radius(coordinates, r = self.radius_km / EARTH_RADIUS_KM)
+
+        # Flatten the ragged neighbor lists so the sums can be computed with
+        # one bincount instead of a python loop over the rows.
+        count = np.fromiter((len(i) for i in indices), dtype = np.int64, count = len(indices))
+        rows = np.repeat(np.arange(len(indices)), count)
+        values = self.values_[np.concatenate(indices)] if count.sum() else np.empty(0)
+
+        total = np.bincount(rows, weights = values, minlength = len(indices))
+        total_squares = np.bincount(rows, weights = values ** 2, minlength = len(indices))
+
+        if exclude_self:
+            # Every training row is inside its own radius.
+            total = total - self.values_
+            total_squares = total_squares - self.values_ ** 2
+            count = count - 1
+
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            mean = total / count
+            variance = np.maximum(total_squares / count - mean ** 2, 0)
+
+        return mean, variance, count
+
+################################################################################
+
+class SpatialImputer:
+    '''
+        Fills missing values of a property from its nearest geographic 
+        neighbors that have a value for the same column. One BallTree is 
+        built per column in fit, over the rows where that column is present, 
+        and the fitted trees can be reused to impute any later batch.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        fit: Returns SpatialImputer
+        transform: Returns DataFrame
+        fit_transform: Returns DataFrame
+    '''
+
+    ################################################################################
+
+    def __init__(
+        self,
+        columns: dict[str, str] = None,
+        k: int = 5,
+        latitude: str = 'latitude',
+        longitude: str = 'longitude',
+        coordinate_scale: float = 1e6
+    ) -> None:
+        '''
+            Parameters
+            ----------
+            columns: dict[str, str], default None
+                A dictionary mapping each column to impute to the strategy 
+                used to combine the neighbor values. Possible strategies are 
+                ('mean', 'median', 'mode'). By default the size, lot size, 
+                year built, tax value, room count, and zip code columns of 
+                the zillow dataset are imputed.
+
+            k: int, default 5
+                The number of nearest neighbors to combine.
+
+            latitude: str, default 'latitude'
+                The name of the latitude column.
+
+            longitude: str, default 'longitude'
+                The name of the longitude column.
+
+            coordinate_scale: float, default 1e6
+                The value the stored coordinates must be divided by to 
+                obtain degrees.
+        '''
+
+        if columns is None:
+            columns = {
+                'calculatedfinishedsquarefeet' : 'mean',
+                'lotsizesquarefeet' : 'mean',
+                'yearbuilt' : 'median',
+                'taxvaluedollarcnt' : 'mean',
+                'bathroomcnt' : 'median',
+                'bedroomcnt' : 'median',
+                'regionidzip' : 'mode'
+            }
+
+        self.columns = columns
+        self.k = k
+        self.latitude = latitude
+        self.longitude = longitude
+        self.coordinate_scale = coordinate_scale
+
+    ################################################################################
+
+    def fit(self, df: pd.DataFrame) -> 'SpatialImputer':
+        '''
+            Build a BallTree for each column over the rows where the column 
+            is present. Columns that are not in df are skipped.
+
+            Parameters
+            ----------
+            df: DataFrame
+                A pandas DataFrame containing the coordinate columns.
+
+            Returns
+            -------
+            SpatialImputer: The fitted instance.
+        '''
+
+        coordinates = get_coordinates(df, self.latitude, self.longitude, self.coordinate_scale)
+
+        self.trees_ = {}
+        self.values_ = {}
+        for column in self.columns:
+            if column not in df.columns:
+                continue
+
+            present = df[column].notna().to_numpy()
+            if present.any():
+                self.trees_[column] = build_ball_tree(coordinates[present])
+                self.values_[column] = df[column].to_numpy()[present]
+
+        return self
+
+    ################################################################################
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        '''
+            Return a copy of df with the missing values of each fitted column 
+            filled from the nearest neighbors. All of the missing rows of a 
+            column are answered with one batched query.
+
+            Parameters
+            ----------
+            df: DataFrame
+                A pandas DataFrame containing the coordinate columns.
+
+            Returns
+            -------
+            DataFrame: A copy of df with the missing values filled.
+        '''
+
+        df_copy = df.copy()
+        coordinates = None
+
+        for column, tree in self.trees_.items():
+            if column not in df_copy.columns:
+                continue
+
+            missing = df_copy[column].isna().to_numpy()
+            if not missing.any():
+                continue
+
+            if coordinates is None:
+                coordinates = get_coordinates(df_copy, self.latitude, self.longitude, self.coordinate_scale)
+
+            k = min(self.k, len(self.values_[column]))
+            indices = tree.query(coordinates[missing], k = k, return_distance = False)
+            filled = impute_strategies[self.columns[column]](self.values_[column][indices])
+
+            df_copy.loc[missing, column] = filled
+
+        return df_copy
+
+    ################################################################################
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        '''
+            Fit on df and return a copy of df with the missing values filled.
+        '''
+
+        return self.fit(df).transform(df)
+
+################################################################################
+
+def add_neighbor_features(
+    train: pd.DataFrame,
+    validate: pd.DataFrame = None,
+    test: pd.DataFrame = None,
+    target: str = 'logerror',
+    k: int = 10,
+    radius_km: float = None
+) -> tuple[pd.DataFrame]:
+    '''
+        Fit a NeighborFeatures stage on the training dataset and append the
+        neighborhood features to train, validate, and test. The training
+        rows are excluded from their own neighborhoods.
+
+        Parameters
+        ----------
+        train: DataFrame
+            The training dataset for a machine learning problem.
+
+        validate: DataFrame, default None
+            The out of sample validate dataset for a machine learning problem.
+
+        test: DataFrame, default None
+            The out of sample test dataset for a machine learning problem.
+
+        target: str, default 'logerror'
+            The training column to aggregate over each neighborhood.
+
+        k: int, default 10
+            The number of nearest neighbors to aggregate.
+
+        radius_km: float, default None
+            If provided all neighbors within this radius are used instead of
+            the k nearest neighbors.
+
+        Returns
+        -------
+        tuple(DataFrame): The datasets that were passed in with the
+            neighborhood features appended.
+    '''
+
+    neighbors = NeighborFeatures(target = target, k = k, radius_km = radius_km)
+
+    results = [pd.concat([train, neighbors.fit_transform(train)], axis = 1)]
+    for df in (validate, test):
+        if df is not None:
+            results.append(pd.concat([df, neighbors.transform(df)], axis = 1))
+
+    return tuple(results)
@@ -0,0 +1,301 @@
+################################################################################
+#
+#
+#
+#       streaming.py
+#
+#       Description: This file contains a linear regression trainer that makes
+#           a single pass over the data in chunks. Each chunk only adds to the
+#           sufficient statistics X'X and X'y, so memory grows with the square
+#           of the number of terms rather than with the number of rows.
+#
+#       Class:
+#
+#           StreamingLinearRegression
+#
+#       Functions:
+#
+#           read_chunks(file_name, chunksize = 100_000, prepare = None)
+#           fit_streaming(chunks, features, target, degree = 1, interaction_only = False, n_jobs = 1)
+#           solve_normal_equations(xtx, xty)
+#           polynomial_powers(n_features, degree = 1, interaction_only = False)
+#           _accumulate_chunk(features, target, powers, chunk)
+#           _add_statistics(regression, statistics)
+#
+#
+################################################################################
+
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy import linalg
+
+from _predictor import CompiledModel
+
+################################################################################
+
+class StreamingLinearRegression:
+    '''
+        An ordinary least squares regression fit from the sufficient
+        statistics of its data. Chunks are expanded into polynomial terms as
+        they arrive and added to X'X and X'y with an intercept column, and
+        two instances fit on different chunks can be merged.
+
+        Instance Methods
+        ----------------
+        __init__: Returns None
+        partial_fit: Returns StreamingLinearRegression
+        merge: Returns StreamingLinearRegression
+        solve: Returns StreamingLinearRegression
+        to_compiled: Returns CompiledModel
+        make_predictions: Returns ndarray
+    '''
+
+    ################################################################################
+
+    def __init__(self, features: list[str], target: str, degree: int = 1, interaction_only: bool = False) -> None:
+        '''
+            Parameters
+            ----------
+            features: list[str]
+                The features to fit on.
+
+            target: str
+                The target variable.
+
+            degree: int, default 1
+                The degree of the polynomial expansion of the features. A
+                degree of 1 fits a plain linear regression.
+
+            interaction_only: bool, default False
+                If True only products of distinct features are used, as in
+                PolynomialFeatures.
+        '''
+
+        self.features = list(features)
+        self.target = target
+        self.powers = polynomial_powers(len(features), degree, interaction_only)
+
+        n_terms = len(self.powers) + 1
+        self.xtx = np.zeros((n_terms, n_terms))
+        self.xty = np.zeros(n_terms)
+        self.yty = 0.0
+        self.n_rows = 0
+
+    ################################################################################
+
+    def partial_fit(self, chunk: pd.DataFrame) -> 'StreamingLinearRegression':
+        '''
+            Add a chunk of rows to the sufficient statistics.
+        '''
+
+        _add_statistics(self, _accumulate_chunk(self.features, self.target, self.powers, chunk))
+
+        return self
+
+    ################################################################################
+
+    def merge(self, other: 'StreamingLinearRegression') -> 'StreamingLinearRegression':
+        '''
+            Add the sufficient statistics of another instance fit with the
+            same features, target, and expansion.
+        '''
+
+        if other.features != self.features or not np.array_equal(other.powers, self.powers):
+            raise ValueError('Only instances with the same features and expansion can be merged.')
+
+        _add_statistics(self, (other.xtx, other.xty, other.yty, other.n_rows))
+
+        return self
+
+    ################################################################################
+
+    def solve(self) -> 'StreamingLinearRegression':
+        '''
+            Solve the normal equations for the intercept and coefficients.
+        '''
+
+        if self.n_rows == 0:
+            raise ValueError('No rows have been added.')
+
+        solution = solve_normal_equations(self.xtx, self.xty)
+        self.intercept_ = solution[0]
+        self.coef_ = solution[1:]
+
+        # The training SSE follows from the statistics as y'y - 2b'X'y + b'X'Xb.
+        sse = self.yty - 2 * solution @ self.xty + solution @ self.xtx @ solution
+        self.rmse_ = np.sqrt(max(sse, 0) / self.n_rows)
+
+        return self
+
+    ################################################################################
+
+    def to_compiled(self) -> CompiledModel:
+        '''
+            Return a CompiledModel evaluating the solved regression.
+        '''
+
+        return CompiledModel(self.features, self.target, self.coef_, self.intercept_, self.powers)
+
+    ################################################################################
+
+    def make_predictions(self, df: pd.DataFrame) -> np.ndarray:
+        return self.to_compiled().make_predictions(df)
+
+################################################################################
+
+def solve_normal_equations(xtx: np.ndarray, xty: np.ndarray) -> np.ndarray:
+    '''
+        Solve X'X b = X'y for b.
+
+        The system is solved with a Cholesky decomposition after scaling
+        each term to unit diagonal, which keeps it well conditioned when
+        the features have very different scales (for example tax value
+        and a 0/1 flag). If the matrix is singular, for example when a 
+        dummy column is constant, a rank revealing QR least squares 
+        solve is used instead.
+    '''
+
+    diagonal = np.sqrt(np.diag(xtx))
+    diagonal[diagonal == 0] = 1
+    scaled_xtx = xtx / np.outer(diagonal, diagonal)
+    scaled_xty = xty / diagonal
+
+    try:
+        solution = linalg.cho_solve(linalg.cho_factor(scaled_xtx), scaled_xty)
+    except linalg.LinAlgError:
+        solution = linalg.lstsq(scaled_xtx, scaled_xty, lapack_driver = 'gelsy')[0]
+
+    return solution / diagonal
+
+################################################################################
+
+def polynomial_powers(n_features: int, degree: int = 1, interaction_only: bool = False) -> np.ndarray:
+    '''
+        Return the (n_terms, n_features) exponents of the polynomial terms in
+        the same order as sklearn's PolynomialFeatures(include_bias = False).
+    '''
+
+    combine = itertools.combinations if interaction_only else itertools.combinations_with_replacement
+
+    powers = []
+    for d in range(1, degree + 1):
+        for combination in combine(range(n_features), d):
+            powers.append(np.bincount(combination, minlength = n_features))
+
+    return np.array(powers, dtype = np.int64)
+
+################################################################################
+
+def read_chunks(file_name: str, chunksize: int = 100_000, prepare = None):
+    '''
+        Yield the rows of a csv cache in chunks, optionally passing each
+        chunk through a preparation function first.
+
+        Parameters
+        ----------
+        file_name: str
+            The csv file, for example the zillow.csv acquisition cache.
+
+        chunksize: int, default 100_000
+            The number of rows in each chunk.
+
+        prepare: callable, default None
+            A function applied to each chunk. It must only use row-wise
+            operations; column thresholds computed per chunk (such as those
+            in prepare.drop_missing_values) would differ between chunks.
+    '''
+
+    for chunk in pd.read_csv(file_name, chunksize = chunksize):
+        yield chunk if prepare is None else prepare(chunk)
+
+################################################################################
+
+def fit_streaming(
+    chunks,
+    features: list[str],
+    target: str,
+    degree: int = 1,
+    interaction_only: bool = False,
+    n_jobs: int = 1
+) -> StreamingLinearRegression:
+    '''
+        Fit a StreamingLinearRegression in one pass over an iterable of
+        DataFrame chunks.
+
+        Parameters
+        ----------
+        chunks: iterable[DataFrame]
+            The training data in chunks, for example from read_chunks.
+
+        features: list[str]
+            The features to fit on.
+
+        target: str
+            The target variable.
+
+        degree: int, default 1
+            The degree of the polynomial expansion of the features.
+
+        interaction_only: bool, default False
+            If True only products of distinct features are used.
+
+        n_jobs: int, default 1
+            The number of worker processes accumulating chunks. If None the
+            number of cores is used. Each worker returns only its statistics.
+
+        Returns
+        -------
+        StreamingLinearRegression: The solved regression.
+    '''
+
+    regression = StreamingLinearRegression(features, target, degree, interaction_only)
+    n_jobs = n_jobs or os.cpu_count()
+
+    if n_jobs == 1:
+        for chunk in chunks:
+            regression.partial_fit(chunk)
+    else:
+        with ProcessPoolExecutor(n_jobs) as executor:
+            pending = []
+            for chunk in chunks:
+                pending.append(executor.submit(_accumulate_chunk, regression.features, target, regression.powers, chunk))
+
+                # Keep at most two chunks per worker in flight so the pass
+                # never holds much more than n_jobs chunks in memory.
+                while len(pending) > 2 * n_jobs:
+                    _add_statistics(regression, pending.pop(0).result())
+
+            for future in pending:
+                _add_statistics(regression, future.result())
+
+    return regression.solve()
+
+################################################################################
+
+def _accumulate_chunk(features: list[str], target: str, powers: np.ndarray, chunk: pd.DataFrame) -> tuple:
+    '''
+        Return X'X, X'y, y'y, and the row count of one chunk, where X holds an
+        intercept column followed by the polynomial terms. Rows with a
+        missing feature or target are skipped.
+    '''
+
+    data = chunk[features + [target]].to_numpy(dtype = np.float64)
+    data = data[~np.isnan(data).any(axis = 1)]
+    X, y = data[:, :-1], data[:, -1]
+
+    terms = np.empty((len(X), len(powers) + 1))
+    terms[:, 0] = 1
+    for index, row in enumerate(powers, start = 1):
+        terms[:, index] = np.prod(X ** row, axis = 1)
+
+    return terms.T @ terms, terms.T @ y, y @ y, len(y)
+
+def _add_statistics(regression: StreamingLinearRegression, statistics: tuple) -> None:
+    xtx, xty, yty, n_rows = statistics
+    regression.xtx += xtx
+    regression.xty += xty
+    regression.yty += yty
+    regression.n_rows += n_rows
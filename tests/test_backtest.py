@@ -0,0 +1,94 @@
+################################################################################
+#
+#
+#
+#       test_backtest.py
+#
+#       Description: This file contains tests of the backtesting engine on a
+#           small synthetic dataset spanning six months.
+#
+#       Functions:
+#
+#           data()
+#           test_windows_train_on_earlier_months(data)
+#           test_baseline_matches_establish_baseline(data)
+#           test_serial_and_parallel_results_match(data)
+#           test_duplicated_date_index_is_rejected(data)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn.linear_model import LinearRegression
+
+from backtest import make_windows, backtest
+from model import establish_baseline
+
+################################################################################
+
+@pytest.fixture(scope = 'module')
+def data():
+    '''
+        A prepared dataset and the transaction date of each row.
+    '''
+
+    rng = np.random.default_rng(24)
+    n_rows = 1_200
+
+    df = pd.DataFrame({
+        'square_feet' : rng.uniform(500, 4_000, n_rows),
+        'lot_size' : rng.uniform(1_000, 20_000, n_rows),
+        'property_age' : rng.integers(1, 100, n_rows).astype(float),
+        'non_average_zip_code' : rng.random(n_rows) < 0.1,
+        'tax_assessed_value' : rng.uniform(1e5, 1e6, n_rows)
+    })
+    df['logerror'] = 1e-5 * df.square_feet + rng.normal(0, 0.05, n_rows)
+    dates = pd.Series(pd.Timestamp('2017-01-01') + pd.to_timedelta(rng.integers(0, 181, n_rows), unit = 'D'))
+
+    return df, dates
+
+################################################################################
+
+def test_windows_train_on_earlier_months(data):
+    _, dates = data
+    months = dates.dt.to_period('M').to_numpy()
+
+    order, windows = make_windows(dates, 'rolling', train_months = 2)
+
+    assert len(windows) == 4
+    for window in windows:
+        start, split, end = window['rows']
+        np.testing.assert_array_equal(order[start:split], window['train'])
+        assert months[window['train']].max() < months[window['test']].min()
+        assert len(np.unique(months[window['train']])) == 2
+
+def test_baseline_matches_establish_baseline(data):
+    df, dates = data
+    specs = [('linear_regression', LinearRegression(), ['square_feet'])]
+
+    summary, results = backtest(df, dates, specs)
+    _, windows = make_windows(dates)
+
+    y = df.logerror.to_numpy()
+    for window, (_, row) in zip(windows, summary.iterrows()):
+        baseline = establish_baseline(y[window['train']]).iloc[0]
+        assert row.baseline == pytest.approx(np.sqrt(np.mean((y[window['test']] - baseline) ** 2)))
+
+    assert (summary.linear_regression < summary.baseline).all()
+
+def test_serial_and_parallel_results_match(data):
+    df, dates = data
+
+    serial, _ = backtest(df, dates, n_jobs = 1)
+    parallel, _ = backtest(df, dates, n_jobs = 2)
+
+    pd.testing.assert_frame_equal(serial, parallel)
+
+def test_duplicated_date_index_is_rejected(data):
+    df, dates = data
+
+    with pytest.raises(ValueError):
+        backtest(df, dates.set_axis(np.zeros(len(dates), dtype = int)))
@@ -0,0 +1,82 @@
+################################################################################
+#
+#
+#
+#       test_bootstrap.py
+#
+#       Description: This file contains tests of the bootstrap engine against
+#           direct computations on synthetic predictions.
+#
+#       Functions:
+#
+#           data()
+#           test_resample_counts()
+#           test_point_rmse_matches_direct_computation(data)
+#           test_results_do_not_depend_on_n_jobs(data)
+#           test_better_model_beats_baseline(data)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bootstrap import bootstrap_rmse, resample_counts
+
+################################################################################
+
+@pytest.fixture(scope = 'module')
+def data():
+    '''
+        Actual values and the predictions of a constant baseline, a good
+        model, and a poor model.
+    '''
+
+    rng = np.random.default_rng(24)
+    actual = rng.normal(0, 0.1, 2_000)
+
+    predictions = {
+        'baseline' : 0.0,
+        'good' : actual + rng.normal(0, 0.02, 2_000),
+        'poor' : rng.normal(0, 0.1, 2_000)
+    }
+
+    return actual, predictions
+
+################################################################################
+
+def test_resample_counts():
+    counts = resample_counts(1_000, 20, np.random.default_rng(24))
+
+    assert counts.shape == (20, 1_000)
+    assert counts.dtype == np.float64
+    np.testing.assert_array_equal(counts.sum(axis = 1), 1_000)
+
+def test_point_rmse_matches_direct_computation(data):
+    actual, predictions = data
+
+    results = bootstrap_rmse(actual, predictions, n_resamples = 200)
+
+    for label, prediction in predictions.items():
+        expected = np.sqrt(np.mean((actual - prediction) ** 2))
+        assert results.loc[label, 'RMSE'] == pytest.approx(expected)
+        assert results.loc[label, 'RMSE_lower'] <= expected <= results.loc[label, 'RMSE_upper']
+
+def test_results_do_not_depend_on_n_jobs(data):
+    actual, predictions = data
+
+    serial = bootstrap_rmse(actual, predictions, n_resamples = 200, block_size = 50, n_jobs = 1)
+    parallel = bootstrap_rmse(actual, predictions, n_resamples = 200, block_size = 50, n_jobs = 2)
+
+    pd.testing.assert_frame_equal(serial, parallel)
+
+def test_better_model_beats_baseline(data):
+    actual, predictions = data
+
+    # A budget of one resample per block exercises the block sizing.
+    results = bootstrap_rmse(actual, predictions, n_resamples = 50, block_memory_mb = 8 * 2_000 / 2 ** 20)
+
+    assert results.loc['good', 'p_better'] == 1.0
+    assert results.loc['good', 'difference_upper'] < 0
+    assert results.loc['poor', 'difference_lower'] > 0
@@ -0,0 +1,82 @@
+################################################################################
+#
+#
+#
+#       test_cross_validation.py
+#
+#       Description: This file contains tests that the cross validation
+#           engine scores each fold as a direct fit on that fold's scaled
+#           training rows would.
+#
+#       Functions:
+#
+#           df()
+#           test_fold_rmse_matches_direct_fit(df)
+#           test_baseline_matches_establish_baseline(df)
+#           test_serial_and_parallel_results_match(df)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn.linear_model import Ridge
+from sklearn.preprocessing import MinMaxScaler
+
+from cross_validation import make_folds, cross_validate
+from model import establish_baseline
+
+################################################################################
+
+@pytest.fixture(scope = 'module')
+def df():
+    '''
+        A prepared, unscaled dataset.
+    '''
+
+    rng = np.random.default_rng(24)
+    n_rows = 1_000
+
+    df = pd.DataFrame({
+        'square_feet' : rng.uniform(500, 4_000, n_rows),
+        'lot_size' : rng.uniform(1_000, 20_000, n_rows),
+        'property_age' : rng.integers(1, 100, n_rows).astype(float),
+        'non_average_zip_code' : rng.random(n_rows) < 0.1,
+        'tax_assessed_value' : rng.uniform(1e5, 1e6, n_rows)
+    })
+    df['logerror'] = 1e-5 * df.square_feet + rng.normal(0, 0.05, n_rows)
+
+    return df
+
+################################################################################
+
+def test_fold_rmse_matches_direct_fit(df):
+    # Ridge is not scale invariant, so it only matches on scaled features.
+    features = ['square_feet', 'tax_assessed_value']
+    _, results = cross_validate(df, [('ridge', Ridge(alpha = 1.0), features)], n_folds = 3)
+
+    for fold, (train_index, test_index) in enumerate(make_folds(len(df), 3)):
+        train, test = df.iloc[train_index], df.iloc[test_index]
+        scaler = MinMaxScaler().fit(train[features])
+        model = Ridge(alpha = 1.0).fit(scaler.transform(train[features]), train.logerror)
+        expected = np.sqrt(np.mean((test.logerror - model.predict(scaler.transform(test[features]))) ** 2))
+
+        actual = results[(results.model == 'ridge') & (results.fold == fold)].RMSE.item()
+        assert actual == pytest.approx(expected)
+
+def test_baseline_matches_establish_baseline(df):
+    _, results = cross_validate(df, [('ridge', Ridge(), ['square_feet'])], n_folds = 3)
+
+    y = df.logerror.to_numpy()
+    for fold, (train_index, test_index) in enumerate(make_folds(len(df), 3)):
+        baseline = establish_baseline(y[train_index]).iloc[0]
+        actual = results[(results.model == 'baseline') & (results.fold == fold)].RMSE.item()
+        assert actual == pytest.approx(np.sqrt(np.mean((y[test_index] - baseline) ** 2)))
+
+def test_serial_and_parallel_results_match(df):
+    serial, _ = cross_validate(df, n_folds = 3, n_jobs = 1)
+    parallel, _ = cross_validate(df, n_folds = 3, n_jobs = 2)
+
+    pd.testing.assert_frame_equal(serial, parallel)
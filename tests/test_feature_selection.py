@@ -0,0 +1,95 @@
+################################################################################
+#
+#
+#
+#       test_feature_selection.py
+#
+#       Description: This file contains tests that the Gram matrix subset
+#           scores match direct linear regression fits and that the searches
+#           select the informative features.
+#
+#       Functions:
+#
+#           data()
+#           test_score_subset_matches_direct_fit(data, subset)
+#           test_stepwise_searches_select_informative_features(data, method)
+#           test_best_subsets_do_not_depend_on_n_jobs(data)
+#           test_unknown_method_is_rejected(data)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn.linear_model import LinearRegression
+
+from feature_selection import search_subsets, score_subset, _gram_statistics
+
+################################################################################
+
+features = ['square_feet', 'lot_size', 'property_age', 'tax_assessed_value', 'noise']
+
+@pytest.fixture(scope = 'module')
+def data():
+    '''
+        Train and validate datasets whose target depends on square_feet and
+        property_age only.
+    '''
+
+    rng = np.random.default_rng(24)
+    n_rows = 3_000
+
+    df = pd.DataFrame({
+        'square_feet' : rng.uniform(500, 4_000, n_rows),
+        'lot_size' : rng.uniform(1_000, 20_000, n_rows),
+        'property_age' : rng.integers(1, 100, n_rows).astype(float),
+        'tax_assessed_value' : rng.uniform(1e5, 1e6, n_rows),
+        'noise' : rng.normal(0, 1, n_rows)
+    })
+    df['logerror'] = 2e-5 * df.square_feet - 1e-3 * df.property_age + rng.normal(0, 0.02, n_rows)
+
+    return df.iloc[:2_000], df.iloc[2_000:]
+
+################################################################################
+
+@pytest.mark.parametrize('subset', [(0,), (1, 3), (0, 2, 4), (0, 1, 2, 3, 4)])
+def test_score_subset_matches_direct_fit(data, subset):
+    train, validate = data
+    columns = [features[index] for index in subset]
+
+    rmse_train, rmse_validate = score_subset(
+        _gram_statistics(train, features, 'logerror'),
+        _gram_statistics(validate, features, 'logerror'),
+        subset
+    )
+
+    model = LinearRegression().fit(train[columns], train.logerror)
+    for rmse, df in ((rmse_train, train), (rmse_validate, validate)):
+        assert rmse == pytest.approx(np.sqrt(np.mean((df.logerror - model.predict(df[columns])) ** 2)), rel = 1e-6)
+
+@pytest.mark.parametrize('method', ['forward', 'backward', 'best'])
+def test_stepwise_searches_select_informative_features(data, method):
+    train, validate = data
+
+    results = search_subsets(train, validate, features, 'logerror', method = method, n_jobs = 1)
+    two_features = results[results.n_features == 2].sort_values('RMSE_train').iloc[0]
+
+    assert sorted(two_features.features) == ['property_age', 'square_feet']
+    assert results.RMSE_validate.is_monotonic_increasing
+
+def test_best_subsets_do_not_depend_on_n_jobs(data):
+    train, validate = data
+
+    serial = search_subsets(train, validate, features, 'logerror', method = 'best', max_features = 3, n_jobs = 1)
+    parallel = search_subsets(train, validate, features, 'logerror', method = 'best', max_features = 3, n_jobs = 2)
+
+    assert len(serial) == 5 + 10 + 10
+    pd.testing.assert_frame_equal(serial, parallel)
+
+def test_unknown_method_is_rejected(data):
+    train, validate = data
+
+    with pytest.raises(ValueError):
+        search_subsets(train, validate, features, 'logerror', method = 'exhaustive')
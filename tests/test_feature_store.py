@@ -0,0 +1,92 @@
+################################################################################
+#
+#
+#
+#       test_feature_store.py
+#
+#       Description: This file contains tests of the feature store on
+#           synthetic data in which some parcels were acquired twice.
+#
+#       Functions:
+#
+#           raw()
+#           directory(raw, tmp_path_factory)
+#           store(directory)
+#           test_one_row_per_parcel(raw, store)
+#           test_last_acquired_row_is_kept(raw, store)
+#           test_small_batch_matches_store(raw, directory, store)
+#
+#
+################################################################################
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from synthetic import make_zillow
+from feature_store import FeatureStore, materialize_features, prepare_new
+
+################################################################################
+
+@pytest.fixture(scope = 'module')
+def raw():
+    '''
+        Synthetic raw Zillow data in which one parcel in ten appears twice,
+        the second time with a higher tax assessed value.
+    '''
+
+    df = make_zillow(5_000, random_seed = 7)
+    duplicates = df.iloc[::10].assign(taxvaluedollarcnt = lambda df: df.taxvaluedollarcnt + 1_000)
+
+    return pd.concat([df, duplicates], ignore_index = True)
+
+@pytest.fixture(scope = 'module')
+def directory(raw, tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('store'))
+    materialize_features(raw, directory)
+
+    return directory
+
+@pytest.fixture(scope = 'module')
+def store(directory):
+    return FeatureStore(directory)
+
+################################################################################
+
+def test_one_row_per_parcel(raw, store):
+    keys = store.to_frame().index
+
+    assert keys.is_unique
+    assert keys.isin(raw.parcelid).all()
+    assert len(store) > len(raw) // 2
+
+def test_last_acquired_row_is_kept(raw, store):
+    stages = store.stages
+    position = stages['scaled_columns'].index('tax_assessed_value')
+
+    duplicated = raw[raw.parcelid.duplicated(keep = False)]
+    latest = duplicated.drop_duplicates('parcelid', keep = 'last').set_index('parcelid').taxvaluedollarcnt
+
+    found = store.get_many(latest.index, errors = 'ignore')
+    expected = (latest.loc[found.index] - stages['minimum'][position]) / stages['span'][position]
+
+    assert len(found) > 0
+    np.testing.assert_allclose(found.tax_assessed_value.astype(float), expected.to_numpy())
+
+def test_small_batch_matches_store(raw, directory, store):
+    # Four stored parcels with a garage count and one without, so the
+    # sparse garagecarcnt column is 80% filled in the batch though it is
+    # dropped from the full data.
+    single = raw[~raw.parcelid.duplicated(keep = False) & raw.parcelid.isin(store.to_frame().index)]
+    batch = pd.concat([single[single.garagecarcnt.notna()].head(4), single[single.garagecarcnt.isna()].head(1)])
+
+    prepared = prepare_new(batch, directory)
+    expected = store.get_many(batch.parcelid)
+
+    assert list(prepared.index) == list(batch.parcelid)
+    pd.testing.assert_frame_equal(prepared, expected, check_dtype = False, check_categorical = False)
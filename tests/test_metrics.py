@@ -0,0 +1,77 @@
+################################################################################
+#
+#
+#
+#       test_metrics.py
+#
+#       Description: This file contains tests that RegressionMetrics matches
+#           a direct computation of the regression error metrics, including
+#           for constant predictions of large values and merged batches.
+#
+#       Functions:
+#
+#           direct_metrics(actual, predictions, weights = None)
+#           test_array_predictions(weights)
+#           test_constant_prediction(weights)
+#           test_constant_prediction_with_large_offset()
+#           test_merged_batches_match_one_pass()
+#
+#
+################################################################################
+
+import numpy as np
+import pytest
+
+from _metrics import RegressionMetrics, regression_metrics
+
+################################################################################
+
+rng = np.random.default_rng(24)
+actual = rng.normal(0.01, 0.1, 5_000)
+predictions = actual + rng.normal(0, 0.05, 5_000)
+sample_weights = rng.uniform(0.5, 2, 5_000)
+
+################################################################################
+
+def direct_metrics(actual, predictions, weights = None) -> dict:
+    weights = np.ones(len(actual)) if weights is None else weights
+    predictions = np.broadcast_to(predictions, actual.shape)
+    mean = np.average(actual, weights = weights)
+
+    sse = weights @ (actual - predictions) ** 2
+    ess = weights @ (predictions - mean) ** 2
+
+    return {'SSE' : sse, 'ESS' : ess, 'TSS' : sse + ess, 'MSE' : sse / weights.sum()}
+
+################################################################################
+
+@pytest.mark.parametrize('weights', [None, sample_weights])
+def test_array_predictions(weights):
+    result = regression_metrics(actual, predictions, weights)
+
+    for name, value in direct_metrics(actual, predictions, weights).items():
+        assert result[name] == pytest.approx(value, rel = 1e-10)
+
+@pytest.mark.parametrize('weights', [None, sample_weights])
+def test_constant_prediction(weights):
+    result = regression_metrics(actual, 0.02, weights)
+
+    for name, value in direct_metrics(actual, 0.02, weights).items():
+        assert result[name] == pytest.approx(value, rel = 1e-10, abs = 1e-12)
+
+def test_constant_prediction_with_large_offset():
+    large = 1e7 + rng.normal(0, 1, 100_000)
+
+    result = regression_metrics(large, 1e7)
+
+    assert result.MSE == pytest.approx(np.mean((large - 1e7) ** 2), rel = 1e-8)
+
+def test_merged_batches_match_one_pass():
+    metrics = RegressionMetrics()
+    for start in range(0, len(actual), 1_000):
+        batch = RegressionMetrics().update(actual[start:start + 1_000], predictions[start:start + 1_000])
+        metrics.merge(batch)
+
+    expected = regression_metrics(actual, predictions)
+
+    np.testing.assert_allclose(metrics.result().to_numpy(), expected.to_numpy(), rtol = 1e-10)
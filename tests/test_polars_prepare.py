@@ -0,0 +1,64 @@
+################################################################################
+#
+#
+#
+#       test_polars_prepare.py
+#
+#       Description: This file contains tests that the Polars engine returns
+#           the same DataFrame as prepare_for_model, for a csv cache and for
+#           an acquired pandas DataFrame, on synthetic data that includes
+#           parcels acquired more than once.
+#
+#       Functions:
+#
+#           raw()
+#           test_csv_source_matches_pandas(raw, tmp_path)
+#           test_dataframe_source_matches_pandas(raw)
+#
+#
+################################################################################
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('polars')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from synthetic import make_zillow
+from acquire import AcquireZillow
+from prepare import prepare_for_model
+from polars_prepare import prepare_for_model_polars, check_parity
+
+################################################################################
+
+@pytest.fixture(scope = 'module')
+def raw():
+    '''
+        Synthetic raw Zillow data in which one parcel in ten appears twice.
+    '''
+
+    df = make_zillow(5_000)
+    duplicates = df.iloc[::10].assign(logerror = lambda df: df.logerror + 1)
+
+    return pd.concat([df, duplicates], ignore_index = True)
+
+################################################################################
+
+def test_csv_source_matches_pandas(raw, tmp_path):
+    file_name = os.path.join(tmp_path, 'zillow.csv')
+    raw.to_csv(file_name, index = False)
+
+    assert check_parity(file_name)
+
+def test_dataframe_source_matches_pandas(raw):
+    acquired = AcquireZillow()._pre_preparation(raw)
+
+    expected = prepare_for_model(acquired)
+
+    # Parcels acquired twice keep a row each under their own position.
+    assert expected.index.is_unique
+    pd.testing.assert_frame_equal(prepare_for_model_polars(acquired), expected)
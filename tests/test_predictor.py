@@ -0,0 +1,82 @@
+################################################################################
+#
+#
+#
+#       test_predictor.py
+#
+#       Description: This file contains tests that the CompiledModel built by
+#           compile_model gives the same predictions as the sklearn estimator
+#           of every create_models model and of a log link TweedieRegressor.
+#
+#       Functions:
+#
+#           train()
+#           test_compiled_predictions_match_sklearn(train, name, feature_set)
+#           test_compiled_log_link_matches_sklearn(train)
+#           test_unsupported_estimator_is_rejected(train)
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn.base import clone
+from sklearn.linear_model import TweedieRegressor
+
+from _model import Model
+from _predictor import compile_model
+from model import estimators, feature_sets
+
+################################################################################
+
+@pytest.fixture(scope = 'module')
+def train():
+    '''
+        A scaled training set with the features of create_models.
+    '''
+
+    rng = np.random.default_rng(24)
+    n_rows = 2_000
+    clusters = rng.integers(0, 4, n_rows)
+
+    df = pd.DataFrame({
+        'square_feet' : rng.random(n_rows),
+        'non_average_zip_code' : rng.random(n_rows) < 0.1,
+        'tax_assessed_value' : rng.random(n_rows),
+        'cluster_1' : clusters == 1,
+        'cluster_2' : clusters == 2,
+        'cluster_3' : clusters == 3
+    })
+    df['logerror'] = 0.02 * df.square_feet - 0.01 * df.tax_assessed_value ** 2 + rng.normal(0, 0.05, n_rows)
+
+    return df
+
+################################################################################
+
+@pytest.mark.parametrize('feature_set', list(feature_sets))
+@pytest.mark.parametrize('name', list(estimators))
+def test_compiled_predictions_match_sklearn(train, name, feature_set):
+    model = Model(clone(estimators[name]), train, feature_sets[feature_set], 'logerror')
+
+    compiled = compile_model(model)
+
+    assert np.allclose(compiled.make_predictions(train), model.make_predictions(train))
+
+def test_compiled_log_link_matches_sklearn(train):
+    # A log link needs a positive target.
+    train = train.assign(logerror = np.exp(train.logerror))
+    model = Model(TweedieRegressor(power = 1, link = 'log'), train, feature_sets['with_clusters'], 'logerror')
+
+    compiled = compile_model(model)
+
+    assert compiled.link == 'log'
+    assert np.allclose(compiled.make_predictions(train), model.make_predictions(train))
+
+def test_unsupported_estimator_is_rejected(train):
+    model = Model(clone(estimators['linear_regression']), train, feature_sets['no_clusters'], 'logerror')
+    model.model = object()
+
+    with pytest.raises(ValueError):
+        compile_model(model)
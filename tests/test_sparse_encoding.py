@@ -0,0 +1,77 @@
+################################################################################
+#
+#
+#
+#       test_sparse_encoding.py
+#
+#       Description: This file contains tests of the sparse one hot encoding
+#           and of the sparse estimators fit on unscaled features.
+#
+#       Functions:
+#
+#           data()
+#           test_unknown_categories_are_all_zero()
+#           test_numeric_columns_are_scaled(data)
+#           test_zip_code_effects_match_dense_fit(data)
+#
+#
+################################################################################
+
+import numpy as np
+import pytest
+
+from sklearn.base import clone
+
+from model import sparse_estimators
+from sparse_encoding import SparseEncoder, one_hot_csr
+
+################################################################################
+
+@pytest.fixture(scope = 'module')
+def data():
+    '''
+        Unscaled square_feet, tax_assessed_value, zip_code, and cluster
+        columns, and a target with a separate effect for each zip code.
+    '''
+
+    rng = np.random.default_rng(24)
+    n_rows = 20_000
+
+    zip_codes = rng.integers(0, 300, n_rows)
+    effects = rng.normal(0, 0.05, 300)
+    square_feet = rng.uniform(500, 4_000, n_rows)
+    tax_assessed_value = rng.uniform(1e5, 1e6, n_rows)
+
+    X = np.column_stack([square_feet, tax_assessed_value, 96_000 + zip_codes, rng.integers(0, 4, n_rows)]).astype(float)
+    y = 1e-5 * square_feet + 2e-8 * tax_assessed_value + effects[zip_codes] + rng.normal(0, 0.02, n_rows)
+
+    return X, y
+
+################################################################################
+
+def test_unknown_categories_are_all_zero():
+    matrix = one_hot_csr(np.array([3.0, 5.0, 4.0, 1.0]), np.array([1.0, 3.0, 5.0]))
+
+    np.testing.assert_array_equal(matrix.toarray(), [[0, 1, 0], [0, 0, 1], [0, 0, 0], [1, 0, 0]])
+
+def test_numeric_columns_are_scaled(data):
+    X, _ = data
+    numeric = SparseEncoder(n_categorical = 2).fit(X).transform(X).toarray()[:, :2]
+
+    np.testing.assert_allclose(numeric.min(axis = 0), 0)
+    np.testing.assert_allclose(numeric.max(axis = 0), 1)
+
+def test_zip_code_effects_match_dense_fit(data):
+    X, y = data
+    pipeline = clone(sparse_estimators['sparse_linear_regression']).fit(X, y)
+
+    design = np.column_stack([np.ones(len(X)), pipeline[0].transform(X).toarray()])
+    coefficients, *_ = np.linalg.lstsq(design, y, rcond = None)
+
+    # The one hot columns of each feature sum to the intercept column, so
+    # the zip code effects are only defined up to a constant.
+    zip_effects = pipeline[-1].coef_[2:302]
+    np.testing.assert_allclose(np.diff(zip_effects), np.diff(coefficients[3:303]), atol = 1e-4)
+
+    rmse = np.sqrt(np.mean((pipeline.predict(X) - y) ** 2))
+    assert rmse == pytest.approx(np.sqrt(np.mean((design @ coefficients - y) ** 2)), rel = 1e-4)
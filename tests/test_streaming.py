@@ -0,0 +1,108 @@
+################################################################################
+#
+#
+#
+#       test_streaming.py
+#
+#       Description: This file contains tests that the streaming linear
+#           regression matches a direct least squares fit, however its rows
+#           are split into chunks.
+#
+#       Functions:
+#
+#           df()
+#           design_matrix(df, features, degree)
+#           test_polynomial_powers_match_sklearn(degree, interaction_only)
+#           test_solution_matches_lstsq(df, degree)
+#           test_chunked_fits_match_one_pass(df)
+#           test_rows_with_missing_values_are_skipped(df)
+#           test_merge_rejects_different_expansion()
+#
+#
+################################################################################
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn.preprocessing import PolynomialFeatures
+
+from streaming import StreamingLinearRegression, fit_streaming, polynomial_powers
+
+################################################################################
+
+features = ['square_feet', 'tax_assessed_value', 'non_average_zip_code']
+
+@pytest.fixture(scope = 'module')
+def df():
+    '''
+        Features on very different scales and a target depending on each.
+    '''
+
+    rng = np.random.default_rng(24)
+    n_rows = 5_000
+
+    df = pd.DataFrame({
+        'square_feet' : rng.uniform(500, 4_000, n_rows),
+        'tax_assessed_value' : rng.uniform(1e5, 1e6, n_rows),
+        'non_average_zip_code' : (rng.random(n_rows) < 0.1).astype(float)
+    })
+    df['logerror'] = 1e-5 * df.square_feet + 2e-8 * df.tax_assessed_value + 0.05 * df.non_average_zip_code + rng.normal(0, 0.02, n_rows)
+
+    return df
+
+def design_matrix(df: pd.DataFrame, features: list[str], degree: int) -> np.ndarray:
+    terms = PolynomialFeatures(degree, include_bias = False).fit_transform(df[features])
+    return np.column_stack([np.ones(len(df)), terms])
+
+################################################################################
+
+@pytest.mark.parametrize('degree', [1, 2, 3])
+@pytest.mark.parametrize('interaction_only', [False, True])
+def test_polynomial_powers_match_sklearn(degree, interaction_only):
+    expected = PolynomialFeatures(degree, interaction_only = interaction_only, include_bias = False).fit(np.zeros((1, 3))).powers_
+
+    np.testing.assert_array_equal(polynomial_powers(3, degree, interaction_only), expected)
+
+@pytest.mark.parametrize('degree', [1, 2])
+def test_solution_matches_lstsq(df, degree):
+    regression = StreamingLinearRegression(features, 'logerror', degree).partial_fit(df).solve()
+
+    # The squared terms span twelve orders of magnitude, so the columns are
+    # scaled to unit norm before the direct fit as well.
+    design = design_matrix(df, features, degree)
+    norms = np.linalg.norm(design, axis = 0)
+    coefficients, *_ = np.linalg.lstsq(design / norms, df.logerror, rcond = None)
+    predictions = design / norms @ coefficients
+
+    assert regression.rmse_ == pytest.approx(np.sqrt(np.mean((predictions - df.logerror) ** 2)), rel = 1e-6)
+    np.testing.assert_allclose(regression.make_predictions(df), predictions, atol = 1e-6)
+
+def test_chunked_fits_match_one_pass(df):
+    one_pass = StreamingLinearRegression(features, 'logerror').partial_fit(df).solve()
+    chunks = [df.iloc[start:start + 1_200] for start in range(0, len(df), 1_200)]
+
+    merged = StreamingLinearRegression(features, 'logerror')
+    for chunk in chunks:
+        merged.merge(StreamingLinearRegression(features, 'logerror').partial_fit(chunk))
+    merged.solve()
+
+    for regression in (merged, fit_streaming(chunks, features, 'logerror'), fit_streaming(chunks, features, 'logerror', n_jobs = 2)):
+        assert regression.n_rows == len(df)
+        np.testing.assert_allclose(regression.coef_, one_pass.coef_, rtol = 1e-8)
+        assert regression.intercept_ == pytest.approx(one_pass.intercept_, rel = 1e-8)
+
+def test_rows_with_missing_values_are_skipped(df):
+    missing = df.copy()
+    missing.loc[::7, 'square_feet'] = np.nan
+    missing.loc[::11, 'logerror'] = np.nan
+
+    regression = StreamingLinearRegression(features, 'logerror').partial_fit(missing).solve()
+    expected = StreamingLinearRegression(features, 'logerror').partial_fit(missing.dropna()).solve()
+
+    assert regression.n_rows == len(missing.dropna())
+    np.testing.assert_allclose(regression.coef_, expected.coef_)
+
+def test_merge_rejects_different_expansion():
+    with pytest.raises(ValueError):
+        StreamingLinearRegression(features, 'logerror').merge(StreamingLinearRegression(features, 'logerror', degree = 2))